@@ -0,0 +1,11 @@
+"""
+AI Audio Pipeline: speech-to-text, AWS Bedrock replies and text-to-speech
+The web server is in audio_pipeline.server; app.py and the other app_*.py
+scripts are entry points to it
+"""
+
+from .config import PipelineConfig
+from .core import AudioPipeline
+from .stages import SpeechToText, LanguageModel, TextToSpeech, FallbackReply
+
+__all__ = ['PipelineConfig', 'AudioPipeline', 'SpeechToText', 'LanguageModel', 'TextToSpeech', 'FallbackReply']
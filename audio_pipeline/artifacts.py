@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Append-only artifact store for processed requests
+Each voice turn (transcript, reply text, stage timings and optionally the
+decoded audio) is appended to segmented log files by a background writer,
+indexed in memory by request id and audio hash, compacted periodically and
+trimmed to a size budget. Used for replay, cache warming and offline
+analysis; plain files, no database.
+"""
+
+import os
+import json
+import time
+import zlib
+import queue
+import struct
+import hashlib
+import threading
+import logging
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'ART1'
+# magic, metadata length, audio length, CRC-32 of metadata + audio
+RECORD = struct.Struct('<4sIII')
+SEGMENT_SUFFIX = '.seg'
+AUDIO_DTYPE = np.dtype('<f4')
+
+
+def audio_hash(audio):
+    """Content hash of mono float32 PCM, used to find repeats of the same clip"""
+    pcm = np.ascontiguousarray(audio, dtype=AUDIO_DTYPE)
+    return hashlib.blake2b(memoryview(pcm).cast('B'), digest_size=16).hexdigest()
+
+
+class _Location:
+    __slots__ = ('segment', 'offset', 'meta_len', 'audio_len')
+
+    def __init__(self, segment, offset, meta_len, audio_len):
+        self.segment = segment
+        self.offset = offset
+        self.meta_len = meta_len
+        self.audio_len = audio_len
+
+    @property
+    def size(self):
+        return RECORD.size + self.meta_len + self.audio_len
+
+
+class ArtifactStore:
+    """Segmented append-only record log with an in-memory index
+
+    record() only enqueues; the writer thread appends, rotates segments at
+    ARTIFACT_SEGMENT_MB, compacts sealed segments every
+    ARTIFACT_COMPACT_INTERVAL seconds (dropping superseded records and
+    repeated audio) and deletes the oldest segments beyond ARTIFACT_MAX_MB.
+
+    Settings:
+      ARTIFACT_STORE              record requests (true/false, off by default)
+      ARTIFACT_DIR                directory for the segment files
+      ARTIFACT_AUDIO              also keep the decoded 16 kHz audio
+      ARTIFACT_SEGMENT_MB         segment size before rotating
+      ARTIFACT_MAX_MB             total size kept; oldest segments go first
+      ARTIFACT_COMPACT_INTERVAL   seconds between compactions
+    """
+
+    def __init__(self, directory, segment_bytes=64 << 20, max_bytes=1 << 30, store_audio=False,
+                 compact_interval=3600, queue_size=256, read_only=False):
+        self.directory = Path(directory)
+        self.read_only = read_only
+        if not read_only:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.store_audio = store_audio
+        self.compact_interval = compact_interval
+        self._lock = threading.Lock()
+        # request id -> _Location of its newest record
+        self._index = {}
+        # audio hash -> request ids, oldest first
+        self._by_hash = {}
+        self._sizes = {}
+        self._active = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._last_compaction = time.monotonic()
+        self._load()
+        # Readers (e.g. the replay tool) may open a directory a server is
+        # still writing to, so they never append, truncate or compact
+        if not read_only:
+            self._writer = threading.Thread(target=self._run, name="artifact-writer", daemon=True)
+            self._writer.start()
+
+    @staticmethod
+    def enabled():
+        return os.getenv('ARTIFACT_STORE', 'false').lower() == 'true'
+
+    @classmethod
+    def from_env(cls, default_dir='artifacts'):
+        return cls(
+            os.getenv('ARTIFACT_DIR', default_dir),
+            segment_bytes=int(float(os.getenv('ARTIFACT_SEGMENT_MB', '64')) * (1 << 20)),
+            max_bytes=int(float(os.getenv('ARTIFACT_MAX_MB', '1024')) * (1 << 20)),
+            store_audio=os.getenv('ARTIFACT_AUDIO', 'false').lower() == 'true',
+            compact_interval=float(os.getenv('ARTIFACT_COMPACT_INTERVAL', '3600')),
+        )
+
+    def __len__(self):
+        with self._lock:
+            return len(self._index)
+
+    def record(self, request_id, meta, audio=None):
+        """Queue one request's artifacts; never blocks the request
+
+        `audio` (mono float32 at meta["sample_rate"]) is hashed by the writer
+        and kept only with ARTIFACT_AUDIO=true.
+        """
+        if self.read_only:
+            raise RuntimeError("Artifact store is open read-only")
+        meta = dict(meta, request_id=request_id, recorded_at=meta.get("recorded_at", time.time()))
+        try:
+            self._queue.put_nowait((meta, audio))
+        except queue.Full:
+            logger.warning(f"Artifact writer is behind; dropped record {request_id}")
+
+    def get(self, request_id, with_audio=False):
+        """(meta, audio or None) for `request_id`, or None if unknown"""
+        # A compaction may move the record between lookup and read; retry once
+        for _ in range(2):
+            with self._lock:
+                location = self._index.get(request_id)
+            if location is None:
+                return None
+            try:
+                meta, audio = self._read(location, with_audio)
+            except (FileNotFoundError, ValueError):
+                continue
+            if meta.get("request_id") == request_id:
+                return meta, audio
+        return None
+
+    def has_audio(self, request_id):
+        with self._lock:
+            location = self._index.get(request_id)
+            return location is not None and location.audio_len > 0
+
+    def find_audio(self, digest):
+        """Request ids whose audio hashed to `digest`, newest last"""
+        with self._lock:
+            return list(self._by_hash.get(digest, ()))
+
+    def records(self, with_audio=False):
+        """Yield (meta, audio) for every live record, oldest first"""
+        with self._lock:
+            locations = sorted(self._index.values(), key=lambda l: (l.segment, l.offset))
+        for location in locations:
+            try:
+                yield self._read(location, with_audio)
+            except (FileNotFoundError, ValueError):
+                # Removed or moved by retention/compaction while iterating
+                continue
+
+    def flush(self, timeout=None):
+        """Wait until every queued record is on disk"""
+        done = threading.Event()
+        self._queue.put((None, done))
+        return done.wait(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {"records": len(self._index), "segments": len(self._sizes),
+                    "bytes": sum(self._sizes.values()), "audio": self.store_audio}
+
+    def _path(self, segment):
+        return self.directory / f"{segment:08d}{SEGMENT_SUFFIX}"
+
+    def _segments(self):
+        return sorted(int(p.stem) for p in self.directory.glob(f"*{SEGMENT_SUFFIX}") if p.stem.isdigit())
+
+    def _scan(self, segment):
+        """Yield (meta, location) for each complete, intact record in a segment"""
+        path = self._path(segment)
+        end = path.stat().st_size
+        with open(path, 'rb') as f:
+            offset = 0
+            while offset + RECORD.size <= end:
+                magic, meta_len, audio_len, crc = RECORD.unpack(f.read(RECORD.size))
+                location = _Location(segment, offset, meta_len, audio_len)
+                if magic != MAGIC or offset + location.size > end:
+                    break
+                body = f.read(meta_len + audio_len)
+                if zlib.crc32(body) != crc:
+                    logger.warning(f"Bad checksum in {path.name} at byte {offset}")
+                    break
+                try:
+                    meta = json.loads(body[:meta_len])
+                except ValueError as e:
+                    logger.warning(f"Unreadable metadata in {path.name} at byte {offset}: {e}")
+                    break
+                yield meta, location
+                offset += location.size
+        if offset < end and not self.read_only:
+            # A torn write at the tail (crash mid-append) or a corrupt
+            # record; drop it and everything after it
+            logger.warning(f"Truncating {end - offset} trailing byte(s) of {path.name}")
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+
+    def _load(self):
+        """Rebuild the index from the segment files"""
+        for segment in self._segments():
+            for meta, location in self._scan(segment):
+                self._add(meta, location)
+            self._sizes[segment] = self._path(segment).stat().st_size
+        if self._sizes:
+            logger.info(f"Artifact store: {len(self._index)} record(s) in {len(self._sizes)} segment(s)")
+
+    def _add(self, meta, location):
+        request_id = meta["request_id"]
+        self._index[request_id] = location
+        digest = meta.get("audio_hash")
+        if digest:
+            ids = self._by_hash.setdefault(digest, [])
+            if request_id in ids:
+                ids.remove(request_id)
+            ids.append(request_id)
+
+    def _read(self, location, with_audio):
+        with open(self._path(location.segment), 'rb') as f:
+            f.seek(location.offset)
+            data = f.read(location.size)
+        if len(data) < location.size:
+            raise ValueError(f"Short artifact record in segment {location.segment}")
+        magic, meta_len, audio_len, crc = RECORD.unpack_from(data)
+        body = memoryview(data)[RECORD.size:]
+        if magic != MAGIC or zlib.crc32(body) != crc:
+            raise ValueError(f"Corrupt artifact record in segment {location.segment}")
+        meta = json.loads(bytes(body[:meta_len]))
+        audio = None
+        if with_audio and audio_len:
+            audio = np.frombuffer(data, dtype=AUDIO_DTYPE, offset=RECORD.size + meta_len).copy()
+        return meta, audio
+
+    @staticmethod
+    def _encode(meta, pcm):
+        body = json.dumps(meta, separators=(',', ':')).encode() + (pcm or b'')
+        meta_len = len(body) - len(pcm or b'')
+        return RECORD.pack(MAGIC, meta_len, len(pcm or b''), zlib.crc32(body)) + body, meta_len
+
+    def _run(self):
+        while True:
+            try:
+                meta, payload = self._queue.get(timeout=min(60.0, self.compact_interval))
+            except queue.Empty:
+                meta = payload = None
+            try:
+                if meta is not None:
+                    self._append(meta, self._audio_bytes(meta, payload))
+                elif isinstance(payload, threading.Event):
+                    self._sync()
+                    payload.set()
+                if time.monotonic() - self._last_compaction >= self.compact_interval:
+                    self._last_compaction = time.monotonic()
+                    self.compact()
+            except Exception as e:
+                logger.error(f"Artifact store error: {e}")
+
+    def _audio_bytes(self, meta, audio):
+        """Hash the clip into `meta`; its PCM bytes if audio is kept"""
+        if audio is None:
+            return None
+        meta["audio_hash"] = audio_hash(audio)
+        meta["duration_s"] = round(len(audio) / meta.get("sample_rate", 16000), 3)
+        if not self.store_audio:
+            return None
+        return np.ascontiguousarray(audio, dtype=AUDIO_DTYPE).tobytes()
+
+    def _open_active(self):
+        segments = self._segments()
+        segment = segments[-1] if segments else 1
+        if segments and self._sizes.get(segment, 0) >= self.segment_bytes:
+            segment += 1
+        self._active = (segment, open(self._path(segment), 'ab'))
+        self._sizes.setdefault(segment, 0)
+
+    def _append(self, meta, pcm):
+        if self._active is None:
+            self._open_active()
+        segment, f = self._active
+        data, meta_len = self._encode(meta, pcm)
+        offset = self._sizes[segment]
+        f.write(data)
+        # Readers open the file themselves, so flush before indexing
+        f.flush()
+        with self._lock:
+            self._add(meta, _Location(segment, offset, meta_len, len(pcm or b'')))
+            self._sizes[segment] = offset + len(data)
+        if self._sizes[segment] >= self.segment_bytes:
+            self._rotate()
+
+    def _sync(self):
+        if self._active is not None:
+            os.fsync(self._active[1].fileno())
+
+    def _rotate(self):
+        segment, f = self._active
+        os.fsync(f.fileno())
+        f.close()
+        self._active = (segment + 1, open(self._path(segment + 1), 'ab'))
+        with self._lock:
+            self._sizes[segment + 1] = 0
+        self._enforce_retention()
+
+    def _enforce_retention(self):
+        """Delete the oldest sealed segments while over ARTIFACT_MAX_MB"""
+        active = self._active[0] if self._active else None
+        while True:
+            with self._lock:
+                total = sum(self._sizes.values())
+                sealed = [s for s in sorted(self._sizes) if s != active]
+                if total <= self.max_bytes or not sealed:
+                    return
+                oldest = sealed[0]
+                for request_id, location in list(self._index.items()):
+                    if location.segment == oldest:
+                        self._index.pop(request_id)
+                for digest in list(self._by_hash):
+                    self._by_hash[digest] = [r for r in self._by_hash[digest] if r in self._index]
+                    if not self._by_hash[digest]:
+                        del self._by_hash[digest]
+                del self._sizes[oldest]
+            self._path(oldest).unlink(missing_ok=True)
+            logger.info(f"Artifact retention removed segment {oldest}")
+
+    def compact(self):
+        """Rewrite sealed segments without superseded records or repeated audio
+
+        A record survives only if it is its request id's newest; audio is
+        kept only on the newest record of each audio hash. Consecutive small
+        segments are merged, and the result keeps the first one's number so
+        retention still removes the oldest data first.
+        """
+        active = self._active[0] if self._active else None
+        with self._lock:
+            sealed = [s for s in sorted(self._sizes) if s != active]
+            newest_audio = {digest: ids[-1] for digest, ids in self._by_hash.items()}
+            hashes = {request_id: digest for digest, ids in self._by_hash.items() for request_id in ids}
+            # Bytes each sealed segment would keep after compaction
+            live = dict.fromkeys(sealed, 0)
+            for request_id, location in self._index.items():
+                if location.segment in live:
+                    size = location.size
+                    if location.audio_len and newest_audio.get(hashes.get(request_id)) != request_id:
+                        size -= location.audio_len
+                    live[location.segment] += size
+            sizes = {segment: self._sizes[segment] for segment in sealed}
+
+        # Merge neighbours while the result still fits in one segment
+        groups, group = [], []
+        for segment in sealed:
+            if group and sum(live[s] for s in group) + live[segment] > self.segment_bytes:
+                groups.append(group)
+                group = []
+            group.append(segment)
+        if group:
+            groups.append(group)
+
+        reclaimed = 0
+        for group in groups:
+            if len(group) == 1 and live[group[0]] == sizes[group[0]]:
+                continue
+            reclaimed += self._compact_group(group, newest_audio)
+        if reclaimed:
+            logger.info(f"Artifact compaction reclaimed {reclaimed / (1 << 20):.1f} MB")
+        self._enforce_retention()
+
+    def _compact_group(self, group, newest_audio):
+        target = group[0]
+        tmp = self._path(target).with_suffix('.compact')
+        kept = []
+        before = sum(self._sizes.get(s, 0) for s in group)
+        with open(tmp, 'wb') as out:
+            offset = 0
+            for segment in group:
+                for meta, location in self._scan(segment):
+                    with self._lock:
+                        current = self._index.get(meta["request_id"])
+                    if current is None or (current.segment, current.offset) != (segment, location.offset):
+                        continue
+                    _, audio = self._read(location, with_audio=True)
+                    pcm = None
+                    if audio is not None and newest_audio.get(meta.get("audio_hash")) == meta["request_id"]:
+                        pcm = audio.tobytes()
+                    data, meta_len = self._encode(meta, pcm)
+                    out.write(data)
+                    kept.append((meta, location, _Location(target, offset, meta_len, len(pcm or b''))))
+                    offset += len(data)
+            out.flush()
+            os.fsync(out.fileno())
+        with self._lock:
+            for meta, old, new in kept:
+                current = self._index.get(meta["request_id"])
+                if current is not None and (current.segment, current.offset) == (old.segment, old.offset):
+                    self._index[meta["request_id"]] = new
+            os.replace(tmp, self._path(target))
+            for segment in group[1:]:
+                self._sizes.pop(segment, None)
+            self._sizes[target] = offset
+            if not offset:
+                del self._sizes[target]
+        for segment in group[1:] if offset else group:
+            self._path(segment).unlink(missing_ok=True)
+        return before - offset
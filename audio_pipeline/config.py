@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Configuration for the AI Audio Pipeline
+One place that reads the pipeline's settings; entry points may supply
+different defaults, but an environment variable (or .env entry) always wins
+"""
+
+import os
+
+# Sent once per request as a cached system block instead of being wrapped
+# around every user message
+DEFAULT_SYSTEM_PROMPT = (
+    "You are a helpful voice assistant. Respond to the user in a conversational "
+    "and helpful manner. Keep your responses concise but informative, since they "
+    "will be read aloud."
+)
+
+
+def _bool(value):
+    return str(value).lower() == 'true'
+
+
+class PipelineConfig:
+    """Pipeline settings, one attribute per environment variable
+
+    Tuning knobs owned by a single helper module (conversation budget,
+    TTS chunking, compile buckets, ...) are still read by that module;
+    .env.example documents them all.
+    """
+
+    # attribute: (environment variable, default, parser)
+    FIELDS = {
+        'stt_backend': ('STT_BACKEND', 'whisper', str),
+        'stt_socket': ('STT_SOCKET', '/tmp/hf-audio-stt.sock', str),
+        'whisper_model': ('WHISPER_MODEL', 'openai/whisper-base', str),
+        'whisper_shared_weights': ('WHISPER_SHARED_WEIGHTS', 'true', _bool),
+        'fast_mel_features': ('FAST_MEL_FEATURES', 'true', _bool),
+        'llm_backend': ('LLM_BACKEND', 'bedrock', str),
+        'bedrock_model_id': ('BEDROCK_MODEL_ID', 'us.anthropic.claude-3-5-sonnet-20241022-v2:0', str),
+        'aws_region': ('AWS_REGION', 'us-east-1', str),
+        'bedrock_prompt_caching': ('BEDROCK_PROMPT_CACHING', 'true', _bool),
+        'max_tokens': ('LLM_MAX_TOKENS', '300', int),
+        'temperature': ('LLM_TEMPERATURE', '0.7', float),
+        'system_prompt': ('SYSTEM_PROMPT', DEFAULT_SYSTEM_PROMPT, str),
+        'tts_engine': ('TTS_ENGINE', 'gtts', str),
+        'redis_url': ('REDIS_URL', '', str),
+    }
+
+    def __init__(self, **values):
+        unknown = set(values) - set(self.FIELDS)
+        if unknown:
+            raise TypeError(f"Unknown pipeline setting(s): {', '.join(sorted(unknown))}")
+        for name, (_, default, parse) in self.FIELDS.items():
+            value = values.get(name, default)
+            setattr(self, name, parse(value) if isinstance(value, str) else value)
+
+    @classmethod
+    def from_env(cls, **defaults):
+        """Settings from the environment, falling back to `defaults` then built-ins"""
+        values = dict(defaults)
+        for name, (env_var, _, _) in cls.FIELDS.items():
+            if os.getenv(env_var) is not None:
+                values[name] = os.getenv(env_var)
+        return cls(**values)
+
+    # Left out of as_dict(): long, or may carry credentials
+    PRIVATE = ('system_prompt', 'redis_url')
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS if name not in self.PRIVATE}
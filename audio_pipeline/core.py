@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+The AI Audio Pipeline
+Speech-to-text, reply generation and text-to-speech, each a pluggable stage
+"""
+
+import logging
+
+from conversation import ConversationStore, RedisConversationStore
+from cpu_layout import CpuLayout
+from tts_engines import pcm_to_wav
+from tracing import tracer
+from .config import PipelineConfig
+from .stages import FallbackReply
+
+logger = logging.getLogger(__name__)
+
+
+class AudioPipeline:
+    """Runs a voice turn through the STT, LLM and TTS stages
+
+    Stages default to the STT_BACKEND stage (local Whisper or queue
+    workers), the LLM_BACKEND stage and the TTS_ENGINE engine; pass `stt`,
+    `llm` or `tts` to use other implementations of the interfaces in
+    stages.py.
+    """
+
+    def __init__(self, config=None, stt=None, llm=None, tts=None):
+        self.config = config or PipelineConfig.from_env()
+        # Front ends whose STT runs in worker processes never load torch
+        self.device = None
+        self.cpu_layout = None
+        if self.config.stt_backend.lower() == 'whisper':
+            import torch
+
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+            logger.info(f"Using device: {self.device}")
+
+            # Partition host cores across workers and pin torch's thread pools
+            self.cpu_layout = CpuLayout.detect()
+            self.cpu_layout.apply(torch)
+
+        # Per-session conversation history for multi-turn requests, shared
+        # through Redis when several front ends serve the same users
+        if self.config.redis_url:
+            from .distributed import redis_client
+            self.conversations = RedisConversationStore(redis_client(self.config.redis_url))
+        else:
+            self.conversations = ConversationStore()
+
+        logger.info("Loading local AI models...")
+        if stt is None:
+            from .stt import create_stt
+            stt = create_stt(self.config, self.device, self.conversations)
+        self.stt = stt
+
+        if tts is None:
+            from .tts import ChunkedTTS
+            tts = ChunkedTTS(self.config)
+        self.tts = tts
+        logger.info("Local models loaded successfully!")
+
+        if llm is None:
+            from .llm import create_llm
+            llm = create_llm(self.config, self.conversations)
+        self.llm = llm
+
+    @property
+    def aws_available(self):
+        """True when replies come from the language model, not canned text"""
+        return self.llm.available
+
+    @property
+    def tts_available(self):
+        return self.tts.available
+
+    @property
+    def tts_engine(self):
+        return getattr(self.tts, 'engine', None)
+
+    @property
+    def compiled_whisper(self):
+        return getattr(self.stt, 'compiled_whisper', None)
+
+    def audio_buffer(self, samples):
+        """Array for decoded 16 kHz mono audio that transcribe() takes without copying"""
+        return self.stt.buffer(samples)
+
+    def transcribe(self, audio_data, sample_rate=16000, session_id=None, timestamps=None, confidence=False):
+        """Transcribe audio; returns {"text", "language"} plus requested details"""
+        with tracer.span("stt", backend=self.stt.name, audio_s=round(len(audio_data) / sample_rate, 2)) as span:
+            result = self.stt.transcribe(audio_data, sample_rate, session_id, timestamps, confidence)
+            span.set("language", result.get("language"))
+            return result
+
+    def transcribe_audio(self, audio_data, sample_rate=16000, session_id=None):
+        """Convert audio to text using Whisper"""
+        return self.transcribe(audio_data, sample_rate, session_id)["text"]
+
+    def generate_response(self, text, session_id=None, record=True):
+        """Generate AI response using AWS Bedrock or fallback to simple response
+
+        With record=False the turn is not added to the session history;
+        speculative calls use this and call record_turn() once accepted.
+        """
+        with tracer.span("llm", backend=self.llm.name) as span:
+            try:
+                return self.llm.generate(text, session_id, record)
+            except Exception as e:
+                logger.error(f"Response generation error: {e}")
+                span.record_error(e)
+                return FallbackReply("I'm sorry, I couldn't process that request at the moment.")
+
+    def record_turn(self, session_id, text, response):
+        """Add a completed exchange to the session history"""
+        self.llm.record_turn(session_id, text, response)
+
+    def reply_language(self, language, response_text=None):
+        """TTS language for `response_text`, a reply to speech in `language`"""
+        # Canned fallback replies are always English, including those used
+        # when a Bedrock call fails
+        if not self.aws_available or not language or isinstance(response_text, FallbackReply):
+            return 'en'
+        return language
+
+    def speech_chunks(self, text, lang='en'):
+        """Yield (pcm, sample_rate) pieces of the reply in playback order"""
+        with tracer.span("tts", engine=self.tts.name, lang=lang, chars=len(text)):
+            yield from self.tts.speech_chunks(text, lang)
+
+    def text_to_speech(self, text, lang='en'):
+        """Convert text to WAV audio using the configured TTS engine"""
+        try:
+            if not self.tts_available:
+                logger.warning("TTS not available")
+                return None
+
+            # Engines return raw PCM; wrap it as WAV for the browser
+            with tracer.span("tts", engine=self.tts.name, lang=lang, chars=len(text)):
+                pcm, sample_rate = self.tts.synthesize(text, lang)
+            return pcm_to_wav(pcm, sample_rate)
+
+        except Exception as e:
+            logger.error(f"TTS error: {e}")
+            return None
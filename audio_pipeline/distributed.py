@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Distributed mode
+Front ends push transcription jobs onto a shared Redis list and any number
+of STT worker processes (stt_worker.py) pop and run them, so web servers
+hold no models and scale out independently of Whisper
+"""
+
+import os
+import json
+import time
+import uuid
+import struct
+import socket
+import logging
+
+import numpy as np
+
+from tracing import tracer, CLIENT
+from .stt import WorkerSTT
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE = "stt:jobs"
+RESULT_PREFIX = "stt:result:"
+WORKER_PREFIX = "stt:worker:"
+# Workers refresh their key this often and it expires after HEARTBEAT_TTL
+HEARTBEAT_TTL = 30
+HEARTBEAT_INTERVAL = 10
+
+
+def redis_client(url):
+    """Binary-safe client for REDIS_URL"""
+    import redis
+    return redis.Redis.from_url(url)
+
+
+def encode_job(header, audio):
+    """One job message: header length, JSON header, then float32 mono PCM
+
+    The PCM is sent as raw bytes rather than base64 inside the JSON.
+    """
+    header = json.dumps(header).encode()
+    pcm = np.ascontiguousarray(audio, dtype=np.float32).tobytes()
+    return struct.pack('!I', len(header)) + header + pcm
+
+
+def decode_job(payload):
+    (length,) = struct.unpack_from('!I', payload)
+    header = json.loads(payload[4:4 + length])
+    audio = np.frombuffer(payload, dtype=np.float32, offset=4 + length)
+    return header, audio
+
+
+class RemoteSTT(WorkerSTT):
+    """Speech-to-text run by STT workers behind the shared job queue
+
+    Settings:
+      STT_QUEUE_TIMEOUT   seconds to wait for a worker before giving up
+    """
+
+    name = "queue"
+
+    def __init__(self, config, sessions=None, client=None):
+        super().__init__(sessions)
+        self.client = client or redis_client(config.redis_url)
+        self.timeout = float(os.getenv('STT_QUEUE_TIMEOUT', '60'))
+        self.client.ping()
+        logger.info(f"Transcription jobs go to Redis; {self.worker_count()} STT worker(s) online")
+
+    def worker_count(self):
+        return sum(1 for _ in self.client.scan_iter(match=f"{WORKER_PREFIX}*"))
+
+    def as_dict(self):
+        try:
+            workers = self.worker_count()
+        except Exception as e:
+            logger.warning(f"Could not count STT workers: {e}")
+            workers = None
+        return {"name": self.name, "workers": workers}
+
+    def run_job(self, audio, sample_rate, language, timestamps, confidence):
+        job_id = uuid.uuid4().hex
+        with tracer.span("stt.queue", kind=CLIENT, job_id=job_id) as span:
+            header = {"id": job_id, "sample_rate": sample_rate, "language": language,
+                      "timestamps": timestamps, "confidence": confidence,
+                      # Workers drop jobs nobody is waiting for any more
+                      "deadline": time.time() + self.timeout,
+                      # The worker's spans join this request's trace
+                      "traceparent": span.traceparent}
+            try:
+                self.client.lpush(JOB_QUEUE, encode_job(header, audio))
+                reply = self.client.blpop(RESULT_PREFIX + job_id, timeout=self.timeout)
+            except Exception as e:
+                logger.error(f"Transcription queue error: {e}")
+                span.record_error(e)
+                return {"text": "", "language": None}
+            if reply is None:
+                logger.error(f"No STT worker answered job {job_id} within {self.timeout:.0f}s")
+                span.set("timed_out", True)
+                return {"text": "", "language": None}
+            return json.loads(reply[1])
+
+
+class STTWorker:
+    """Pops jobs from the shared queue and transcribes them with a local stage"""
+
+    def __init__(self, stt, client):
+        self.stt = stt
+        self.client = client
+        self.worker_key = f"{WORKER_PREFIX}{socket.gethostname()}:{os.getpid()}"
+        self.result_ttl = int(float(os.getenv('STT_QUEUE_TIMEOUT', '60'))) + HEARTBEAT_TTL
+        self.running = False
+
+    def heartbeat(self):
+        self.client.set(self.worker_key, self.stt.name, ex=HEARTBEAT_TTL)
+
+    def handle(self, payload):
+        """Run one job message and push its result for the waiting front end"""
+        header, audio = decode_job(payload)
+        if time.time() > header.get("deadline", float('inf')):
+            logger.warning(f"Dropping expired job {header['id']}")
+            return None
+        with tracer.start_trace("stt.worker", header.get("traceparent"), job_id=header["id"],
+                                worker=self.worker_key, audio_s=round(len(audio) / header["sample_rate"], 2)):
+            result = self.stt.transcribe(audio, header["sample_rate"], None, header.get("timestamps"),
+                                         header.get("confidence", False), language=header.get("language"))
+        key = RESULT_PREFIX + header["id"]
+        pipe = self.client.pipeline()
+        pipe.rpush(key, json.dumps(result))
+        # Results the front end gave up on expire on their own
+        pipe.expire(key, self.result_ttl)
+        pipe.execute()
+        return result
+
+    def run(self):
+        logger.info(f"STT worker {self.worker_key} waiting for jobs on {JOB_QUEUE}")
+        self.running = True
+        try:
+            while self.running:
+                self.heartbeat()
+                item = self.client.brpop(JOB_QUEUE, timeout=HEARTBEAT_INTERVAL)
+                if item is None:
+                    continue
+                try:
+                    self.handle(item[1])
+                except Exception as e:
+                    logger.error(f"STT job failed: {e}")
+        finally:
+            self.client.delete(self.worker_key)
+
+    def stop(self):
+        self.running = False
+
+
+def run_stt_worker(config):
+    """Load Whisper and serve the shared job queue until stopped"""
+    from .stt import load_worker_whisper
+
+    if not config.redis_url:
+        raise ValueError("REDIS_URL is required to run an STT worker")
+    worker = STTWorker(load_worker_whisper(config), redis_client(config.redis_url))
+    worker.run()
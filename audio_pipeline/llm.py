@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Reply generation stages
+AWS Bedrock Claude with per-session history and prompt caching, and the
+canned rule-based replies used when Bedrock is unavailable
+"""
+
+import os
+import json
+import logging
+
+from fallback_responses import fallback_response
+from tracing import tracer, CLIENT
+from .stages import LanguageModel, FallbackReply
+
+logger = logging.getLogger(__name__)
+
+
+class FallbackLLM(LanguageModel):
+    """Simple rule-based replies; their audio is pre-rendered by FallbackAudioCache"""
+
+    name = "fallback"
+    available = False
+
+    def generate(self, text, session_id=None, record=True):
+        return FallbackReply(fallback_response(text))
+
+
+class BedrockLLM(LanguageModel):
+    """Claude on AWS Bedrock, falling back to canned replies on errors"""
+
+    name = "bedrock"
+
+    def __init__(self, config, conversations):
+        self.config = config
+        self.conversations = conversations
+        self.fallback = FallbackLLM()
+        self.available = False
+        self.use_bearer_token = False
+        self.setup_aws_client()
+
+    def setup_aws_client(self):
+        """Initialize AWS Bedrock client for text generation"""
+        import boto3
+        from botocore.exceptions import NoCredentialsError
+
+        try:
+            # Check for bearer token (alternative auth method)
+            bearer_token = os.getenv('AWS_BEARER_TOKEN_BEDROCK')
+
+            if bearer_token:
+                logger.info("🔐 Using AWS Bearer Token for authentication")
+                # For bearer token, we need to set up custom headers
+                # This requires a different approach with boto3
+                self.bedrock_client = boto3.client('bedrock-runtime', region_name=self.config.aws_region)
+                # We'll handle the bearer token in the request headers
+                self.use_bearer_token = True
+                self.bearer_token = bearer_token
+            else:
+                logger.info("🔑 Using standard AWS credentials")
+                # Initialize Bedrock client with standard credentials
+                self.bedrock_client = boto3.client('bedrock-runtime', region_name=self.config.aws_region)
+                self.use_bearer_token = False
+
+            # Test connection
+            self.test_aws_connection()
+            self.available = True
+            logger.info("✅ AWS Bedrock client initialized successfully!")
+
+        except NoCredentialsError:
+            logger.warning("❌ AWS credentials not found. Please configure AWS credentials.")
+            logger.warning("   You can set up credentials using:")
+            logger.warning("   1. AWS CLI: aws configure")
+            logger.warning("   2. Environment variables: AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY")
+            logger.warning("   3. IAM roles (if running on EC2)")
+            self.available = False
+
+        except Exception as e:
+            logger.warning(f"❌ AWS Bedrock initialization failed: {e}")
+            logger.warning("   Falling back to simple response generation")
+            self.available = False
+
+    def test_aws_connection(self):
+        """Test AWS Bedrock connection with a minimal request to the configured model"""
+        try:
+            self.bedrock_client.invoke_model(
+                modelId=self.config.bedrock_model_id,
+                body=json.dumps({
+                    "anthropic_version": "bedrock-2023-05-31",
+                    "messages": [
+                        {
+                            "role": "user",
+                            "content": "Hello, can you respond?"
+                        }
+                    ],
+                    "max_tokens": 10,
+                    "temperature": self.config.temperature
+                })
+            )
+            logger.info("AWS Bedrock connection test successful")
+        except Exception as e:
+            logger.warning(f"AWS Bedrock connection test failed: {e}")
+            raise e
+
+    def build_body(self, text, session_id=None):
+        """Build the Claude request body, including session history if any"""
+        system = [{"type": "text", "text": self.config.system_prompt}]
+        if self.config.bedrock_prompt_caching:
+            # The system prompt never changes, so it's the stable cache prefix
+            system[0]["cache_control"] = {"type": "ephemeral"}
+
+        messages = []
+        content = text
+        if session_id:
+            summary, history = self.conversations.history(session_id)
+            messages = [dict(m) for m in history]
+            if messages and self.config.bedrock_prompt_caching:
+                # Cache everything up to the last completed turn as well
+                last = messages[-1]
+                last["content"] = [{"type": "text", "text": last["content"], "cache_control": {"type": "ephemeral"}}]
+            if summary:
+                # The summary changes whenever history is truncated, so it goes
+                # after the last cache breakpoint, with the new turn
+                content = [{"type": "text", "text": f"Summary of the earlier conversation:\n{summary}"},
+                           {"type": "text", "text": text}]
+        messages.append({"role": "user", "content": content})
+
+        return json.dumps({
+            "anthropic_version": "bedrock-2023-05-31",
+            "system": system,
+            "messages": messages,
+            "max_tokens": self.config.max_tokens,
+            "temperature": self.config.temperature
+        })
+
+    def generate(self, text, session_id=None, record=True):
+        """Generate a reply with Bedrock, or a canned one if it's unavailable"""
+        if not self.available:
+            return self.fallback.generate(text)
+        try:
+            body = self.build_body(text, session_id)
+
+            with tracer.span("bedrock.invoke_model", kind=CLIENT, model=self.config.bedrock_model_id,
+                             region=self.config.aws_region) as span:
+                if self.use_bearer_token:
+                    # Use direct HTTP request with bearer token
+                    assistant_response = self.invoke_with_bearer_token(body)
+                else:
+                    response = self.bedrock_client.invoke_model(
+                        modelId=self.config.bedrock_model_id,
+                        body=body
+                    )
+                    span.set("aws.request_id", response.get('ResponseMetadata', {}).get('RequestId'))
+                    response_body_raw = response['body'].read()
+                    logger.info(f"Raw AWS response: {response_body_raw}")
+
+                    # Parse the Claude response
+                    response_body = json.loads(response_body_raw)
+                    logger.info(f"Parsed AWS response: {response_body}")
+                    assistant_response = response_body['content'][0]['text']
+                    usage = response_body.get('usage', {})
+                    for key in ('input_tokens', 'output_tokens', 'cache_read_input_tokens'):
+                        span.set(key, usage.get(key))
+
+            assistant_response = assistant_response.strip()
+            if session_id and record:
+                self.conversations.append_turn(session_id, text, assistant_response)
+
+            logger.info("AWS Bedrock response generated successfully")
+            return assistant_response
+
+        except Exception as e:
+            logger.error(f"AWS Bedrock error: {e}")
+            # Fallback to simple response
+            return self.fallback.generate(text)
+
+    def record_turn(self, session_id, text, response):
+        if session_id and self.available and not isinstance(response, FallbackReply):
+            self.conversations.append_turn(session_id, text, response)
+
+    def invoke_with_bearer_token(self, body):
+        """Make direct HTTP request to Bedrock using bearer token"""
+        import requests
+
+        url = (f"https://bedrock-runtime.{self.config.aws_region}.amazonaws.com"
+               f"/model/{self.config.bedrock_model_id}/invoke")
+
+        headers = {
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {self.bearer_token}',
+            'Accept': 'application/json'
+        }
+
+        try:
+            response = requests.post(url, headers=headers, data=body, timeout=30)
+            response.raise_for_status()
+
+            response_data = response.json()
+            return response_data['content'][0]['text']
+
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Bearer token request failed: {e}")
+            raise e
+
+
+# Reply stages selectable with LLM_BACKEND
+LLM_BACKENDS = {
+    'bedrock': BedrockLLM,
+    'fallback': lambda config, conversations: FallbackLLM(),
+}
+
+
+def create_llm(config, conversations):
+    """Create the stage selected by config.llm_backend"""
+    name = config.llm_backend.lower()
+    if name not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM backend '{name}'. Choose from: {', '.join(LLM_BACKENDS)}")
+    return LLM_BACKENDS[name](config, conversations)
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Memory accounting and admission control
+Each request reserves its expected footprint (upload plus decoded audio)
+against a process-wide budget before it is decoded, then charges the
+buffers it actually holds stage by stage. Requests that would overrun
+the budget wait for others to finish or are turned away, instead of
+several long uploads growing the process until it is OOM-killed.
+"""
+
+import os
+import time
+import struct
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+MB = 1 << 20
+# Decoded float32 bytes per second of 16 kHz mono audio
+BYTES_PER_SECOND = 16000 * 4
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None if unknown"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or None if unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+def wav_frames(header):
+    """(frames, sample_rate) from the start of a PCM WAV, or None"""
+    if len(header) < 12 or header[0:4] != b'RIFF' or header[8:12] != b'WAVE':
+        return None
+    frame_bytes = rate = None
+    pos = 12
+    while pos + 8 <= len(header):
+        chunk_id = header[pos:pos + 4]
+        size = struct.unpack_from('<I', header, pos + 4)[0]
+        if chunk_id == b'fmt ' and pos + 24 <= len(header):
+            _, channels, rate, _, _, bits = struct.unpack_from('<HHIIHH', header, pos + 8)
+            frame_bytes = max(1, channels * bits // 8)
+        elif chunk_id == b'data':
+            if frame_bytes is None or size in (0, 0xFFFFFFFF):
+                return None
+            return size // frame_bytes, rate
+        pos += 8 + size + (size & 1)
+    return None
+
+
+class _StageStats:
+    __slots__ = ('count', 'held_total', 'held_max', 'rss_total', 'rss_max')
+
+    def __init__(self):
+        self.count = 0
+        self.held_total = self.held_max = 0
+        self.rss_total = self.rss_max = 0
+
+    def add(self, held, rss_delta):
+        self.count += 1
+        self.held_total += held
+        self.held_max = max(self.held_max, held)
+        if rss_delta is not None:
+            self.rss_total += rss_delta
+            self.rss_max = max(self.rss_max, rss_delta)
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "held_mb_mean": round(self.held_total / self.count / MB, 2),
+            "held_mb_max": round(self.held_max / MB, 2),
+            "rss_growth_mb_mean": round(self.rss_total / self.count / MB, 2),
+            "rss_growth_mb_max": round(self.rss_max / MB, 2),
+        }
+
+
+class RequestMemory:
+    """One admitted request's reservation and the buffers it holds
+
+    Until the first buffer is charged the request is accounted at its
+    estimate; after that at what it holds plus the fixed per-request
+    allowance for model activations.
+    """
+
+    def __init__(self, budget, request_id, estimate):
+        self.budget = budget
+        self.request_id = request_id
+        self.estimate = estimate
+        self.started = time.monotonic()
+        self.buffers = {}
+        self.stage = "admitted"
+        self.peak = estimate
+        self._last_rss = current_rss()
+        self._charged = False
+        self.released = False
+
+    @property
+    def accounted(self):
+        if not self._charged:
+            return self.estimate
+        return sum(self.buffers.values()) + self.budget.request_overhead
+
+    def charge(self, name, nbytes):
+        """Record that buffer `name` now holds `nbytes` (0 once it's dropped)"""
+        with self.budget._cond:
+            self._charged = True
+            if nbytes:
+                self.buffers[name] = nbytes
+            else:
+                self.buffers.pop(name, None)
+            self.peak = max(self.peak, self.accounted)
+            self.budget._cond.notify_all()
+
+    def mark(self, stage):
+        """End of `stage`: records what the request holds and how RSS moved"""
+        rss = current_rss()
+        delta = rss - self._last_rss if rss is not None and self._last_rss is not None else None
+        self._last_rss = rss
+        self.stage = stage
+        self.budget._record_stage(stage, sum(self.buffers.values()), delta)
+
+    def release(self):
+        self.budget._release(self)
+
+    def as_dict(self):
+        return {
+            "request_id": self.request_id,
+            "stage": self.stage,
+            "age_s": round(time.monotonic() - self.started, 2),
+            "accounted_mb": round(self.accounted / MB, 2),
+            "buffers_mb": {name: round(nbytes / MB, 2) for name, nbytes in self.buffers.items()},
+        }
+
+
+class MemoryBudget:
+    """Process-wide admission control on the memory requests may hold
+
+    Settings:
+        MEMORY_BUDGET_MB: memory all in-flight requests may hold together;
+            0 (default) only accounts without limiting
+        MEMORY_ADMISSION_TIMEOUT: seconds a request waits for room before a 503
+        MEMORY_REQUEST_OVERHEAD_MB: allowance per request for features and
+            activations beyond its audio buffers
+        MEMORY_COMPRESSED_EXPANSION: decoded/uploaded size ratio assumed for
+            compressed uploads (Opus at 16 kbit/s decodes to 32x its size)
+        MEMORY_STREAM_SECONDS: recording length reserved for a Socket.IO stream
+    """
+
+    def __init__(self, limit=0, admission_timeout=10.0, request_overhead=16 * MB, compressed_expansion=32.0,
+                 stream_seconds=60.0):
+        self.limit = limit
+        self.admission_timeout = admission_timeout
+        self.request_overhead = request_overhead
+        self.compressed_expansion = compressed_expansion
+        self.stream_seconds = stream_seconds
+        self._cond = threading.Condition()
+        self._requests = {}
+        self._stages = {}
+        self.admitted = 0
+        self.rejected = 0
+        self.peak_accounted = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            limit=int(float(os.getenv('MEMORY_BUDGET_MB', '0')) * MB),
+            admission_timeout=float(os.getenv('MEMORY_ADMISSION_TIMEOUT', '10')),
+            request_overhead=int(float(os.getenv('MEMORY_REQUEST_OVERHEAD_MB', '16')) * MB),
+            compressed_expansion=float(os.getenv('MEMORY_COMPRESSED_EXPANSION', '32')),
+            stream_seconds=float(os.getenv('MEMORY_STREAM_SECONDS', '60')),
+        )
+
+    def estimate_upload(self, stream, sample_rate=None):
+        """Bytes a spooled upload is expected to need: itself plus its decoded audio
+
+        WAV headers give the exact length; anything else is assumed to
+        expand by MEMORY_COMPRESSED_EXPANSION.
+        """
+        position = stream.tell()
+        header = stream.read(4096)
+        size = stream.seek(0, os.SEEK_END) - position
+        stream.seek(position)
+        wav = wav_frames(header)
+        if wav is not None:
+            frames, rate = wav
+            decoded = frames * 4
+            if sample_rate and rate and rate != sample_rate:
+                # The file's own rate is decoded first, then resampled
+                decoded += frames * sample_rate // rate * 4
+        else:
+            decoded = int(size * self.compressed_expansion)
+        return size + decoded + self.request_overhead
+
+    def estimate_stream(self):
+        """Bytes a streamed recording is expected to need (MEMORY_STREAM_SECONDS of audio)"""
+        return int(self.stream_seconds * BYTES_PER_SECOND) + self.request_overhead
+
+    def admit(self, request_id, estimate, timeout=None):
+        """A RequestMemory once `estimate` fits the budget, or None on timeout
+
+        A request is always admitted when nothing else is in flight, so one
+        oversized upload can't wait forever.
+        """
+        timeout = self.admission_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.limit and self._requests and self._accounted() + estimate > self.limit:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected += 1
+                    logger.warning(f"Memory budget full ({self._accounted() / MB:.0f}/{self.limit / MB:.0f} MB); "
+                                   f"turned away request {request_id} needing {estimate / MB:.0f} MB")
+                    return None
+                self._cond.wait(remaining)
+            request = RequestMemory(self, request_id, estimate)
+            self._requests[id(request)] = request
+            self.admitted += 1
+            self.peak_accounted = max(self.peak_accounted, self._accounted())
+            return request
+
+    def _accounted(self):
+        return sum(request.accounted for request in self._requests.values())
+
+    def _release(self, request):
+        with self._cond:
+            if request.released:
+                return
+            request.released = True
+            self._requests.pop(id(request), None)
+            self._cond.notify_all()
+
+    def _record_stage(self, stage, held, rss_delta):
+        with self._cond:
+            self._stages.setdefault(stage, _StageStats()).add(held, rss_delta)
+            self.peak_accounted = max(self.peak_accounted, self._accounted())
+
+    def as_dict(self, detail=False):
+        rss, peak = current_rss(), peak_rss()
+        with self._cond:
+            report = {
+                "budget_mb": round(self.limit / MB, 1) if self.limit else None,
+                "accounted_mb": round(self._accounted() / MB, 2),
+                "peak_accounted_mb": round(self.peak_accounted / MB, 2),
+                "in_flight": len(self._requests),
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "rss_mb": round(rss / MB, 1) if rss is not None else None,
+                "peak_rss_mb": round(peak / MB, 1) if peak is not None else None,
+            }
+            if detail:
+                report["stages"] = {stage: stats.as_dict() for stage, stats in self._stages.items()}
+                report["requests"] = [request.as_dict() for request in self._requests.values()]
+        return report
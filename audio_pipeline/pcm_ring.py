@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Shared-memory ring buffer for PCM handed to STT worker processes
+The web process decodes (or copies) each clip into a slot once; the worker
+maps the same segment and reads the samples in place, so only a slot
+reference crosses the socket
+"""
+
+import os
+import uuid
+import weakref
+import threading
+import logging
+from collections import OrderedDict
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PCM_DTYPE = np.dtype('<f4')
+# Slots start on cache-line boundaries
+ALIGN = 64
+
+
+class PcmSlot:
+    """One allocation in the ring; reusable once its reference count drops to 0"""
+
+    __slots__ = ('ring', 'offset', 'nbytes', 'refs')
+
+    def __init__(self, ring, offset, nbytes):
+        self.ring = ring
+        self.offset = offset
+        self.nbytes = nbytes
+        self.refs = 1
+
+    def retain(self):
+        with self.ring._lock:
+            self.refs += 1
+
+    def release(self):
+        # Space is reclaimed by the next allocate(); finalizers may run
+        # during garbage collection, so this only touches the count
+        with self.ring._lock:
+            self.refs -= 1
+
+
+class PcmRing:
+    """Ring of variable-size, reference-counted PCM slots in shared memory
+
+    Slots are handed out in ring order and reclaimed from the oldest end,
+    so a slot still in use holds back the space behind it until released.
+    allocate() returns None when the ring is full and callers fall back to
+    sending the samples inline.
+    """
+
+    def __init__(self, size, name=None):
+        self.size = size
+        self.shm = shared_memory.SharedMemory(
+            create=True, size=size, name=name or f"hfaudio-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        )
+        self.name = self.shm.name
+        self._base = np.frombuffer(self.shm.buf, dtype=np.uint8).ctypes.data
+        self._lock = threading.RLock()
+        # offset -> PcmSlot, oldest first
+        self._slots = OrderedDict()
+        self._head = 0
+
+    def __len__(self):
+        """Slots still referenced"""
+        with self._lock:
+            return sum(1 for slot in self._slots.values() if slot.refs > 0)
+
+    def allocate(self, samples):
+        """A float32 array of `samples` backed by a new slot, or None if full
+
+        The array holds the slot's first reference and gives it up when it
+        (and every view of it) is garbage collected.
+        """
+        nbytes = max(ALIGN, -(-samples * PCM_DTYPE.itemsize // ALIGN) * ALIGN)
+        with self._lock:
+            offset = self._free_offset(nbytes)
+            if offset is None:
+                return None
+            slot = PcmSlot(self, offset, nbytes)
+            self._slots[offset] = slot
+            self._head = offset + nbytes
+        array = np.ndarray(samples, dtype=PCM_DTYPE, buffer=self.shm.buf, offset=offset)
+        weakref.finalize(array, slot.release)
+        return array
+
+    def find(self, array):
+        """(slot, byte offset) when `array` already lives in this ring, else None"""
+        if not isinstance(array, np.ndarray) or array.dtype != PCM_DTYPE or not array.flags.c_contiguous:
+            return None
+        offset = array.__array_interface__['data'][0] - self._base
+        if not 0 <= offset < self.size:
+            return None
+        with self._lock:
+            for slot in list(self._slots.values()):
+                if slot.offset <= offset and offset + array.nbytes <= slot.offset + slot.nbytes and slot.refs:
+                    return slot, offset
+        return None
+
+    def _free_offset(self, nbytes):
+        if nbytes > self.size:
+            return None
+        self._trim()
+        if not self._slots:
+            return 0
+        tail = next(iter(self._slots))
+        newest = next(reversed(self._slots))
+        if newest >= tail:
+            # Live slots are contiguous in [tail, head): free space both ends
+            if self.size - self._head >= nbytes:
+                return self._head
+            if tail >= nbytes:
+                return 0
+            return None
+        # Wrapped: the only free space is [head, tail)
+        if tail - self._head >= nbytes:
+            return self._head
+        return None
+
+    def _trim(self):
+        """Reclaim released slots from the oldest end (caller holds the lock)"""
+        while self._slots:
+            offset, slot = next(iter(self._slots.items()))
+            if slot.refs > 0:
+                break
+            del self._slots[offset]
+        if not self._slots:
+            self._head = 0
+
+    def close(self):
+        self.shm.unlink()
+        try:
+            self.shm.close()
+        except BufferError:
+            # Arrays still view the mapping; it goes away with the process
+            pass
+
+
+class RingReader:
+    """Worker-side view of rings created by web processes, attached on first use
+
+    The `max_segments` most recently used segments stay mapped; older ones,
+    such as the rings of web processes that have since restarted, are
+    closed. A closed segment is unmapped once no view of it is left.
+    """
+
+    def __init__(self, max_segments=8):
+        self.max_segments = max_segments
+        # name -> SharedMemory, least recently used first
+        self._segments = OrderedDict()
+
+    def __len__(self):
+        return len(self._segments)
+
+    def view(self, name, offset, samples):
+        """Read-only float32 array over the samples, without copying them"""
+        segment = self._segments.get(name)
+        if segment is None:
+            segment = shared_memory.SharedMemory(name=name)
+            # The creating process owns the segment; don't let this process'
+            # resource tracker unlink it on exit
+            resource_tracker.unregister(segment._name, 'shared_memory')
+            self._segments[name] = segment
+            while len(self._segments) > self.max_segments:
+                _, evicted = self._segments.popitem(last=False)
+                self._detach(evicted)
+        else:
+            self._segments.move_to_end(name)
+        array = np.ndarray(samples, dtype=PCM_DTYPE, buffer=segment.buf, offset=offset)
+        array.flags.writeable = False
+        return array
+
+    @staticmethod
+    def _detach(segment):
+        try:
+            segment.close()
+        except BufferError:
+            # A view is still alive; the mapping goes when it does
+            pass
+
+    def close(self):
+        for segment in self._segments.values():
+            self._detach(segment)
+        self._segments.clear()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Per-request sampling profiler
+A background thread samples the stack of each profiled request's thread
+and aggregates the samples into collapsed stacks (one "frame;frame;frame
+count" line per stack, the input format of flamegraph.pl and speedscope).
+Requests are profiled at random (PROFILE_SAMPLE_RATE) or when asked to;
+torch profiler traces of the Whisper stage can be captured alongside.
+"""
+
+import os
+import sys
+import time
+import hmac
+import random
+import threading
+import logging
+from pathlib import Path
+from collections import Counter, OrderedDict
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)
+
+
+class StackSampler:
+    """Samples the stacks of watched threads every `interval` seconds
+
+    The sampling thread starts on first use and sleeps while no thread is
+    watched, so an idle profiler costs nothing.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._targets = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        # code object -> frame label
+        self._labels = {}
+
+    def watch(self, ident):
+        """Start sampling thread `ident`; returns the Counter samples go into"""
+        counts = Counter()
+        with self._cond:
+            self._targets[ident] = counts
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return counts
+
+    def unwatch(self, ident):
+        with self._cond:
+            return self._targets.pop(ident, None)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._targets:
+                    self._cond.wait()
+                frames = sys._current_frames()
+                for ident, counts in self._targets.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        counts[self._collapse(frame)] += 1
+                frames = frame = None
+            time.sleep(self.interval)
+
+    def _collapse(self, frame):
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+            labels.append(label)
+            frame = frame.f_back
+        return ";".join(reversed(labels))
+
+
+def _short_path(filename):
+    """site-packages- or repository-relative path of a source file"""
+    marker = filename.rfind('site-packages' + os.sep)
+    if marker >= 0:
+        filename = filename[marker + len('site-packages') + 1:]
+    else:
+        root = str(Path(__file__).resolve().parent.parent) + os.sep
+        if filename.startswith(root):
+            filename = filename[len(root):]
+    return filename.replace(';', ':')
+
+
+class RequestProfile:
+    """Samples and torch traces collected for one request"""
+
+    active = True
+
+    def __init__(self, profiler, request_id, trigger):
+        self.profiler = profiler
+        self.request_id = request_id
+        self.trigger = trigger
+        self.started_at = time.time()
+        self.duration_ms = None
+        self.stacks = Counter()
+        # stage -> trace file name in the profile directory
+        self.torch_traces = {}
+
+    def collapsed(self):
+        """Collapsed-stack text, heaviest stacks first"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self):
+        return {
+            "request_id": self.request_id,
+            "trigger": self.trigger,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 1) if self.duration_ms is not None else None,
+            "samples": sum(self.stacks.values()),
+            "torch_traces": sorted(self.torch_traces),
+        }
+
+    def torch_stage(self, name):
+        """Record a torch profiler trace of the block, when PROFILE_TORCH is on
+
+        A no-op in processes that never loaded torch (STT in workers) and
+        while another request holds the torch profiler, which is one per
+        process.
+        """
+        torch = sys.modules.get('torch') if self.profiler.torch else None
+        if torch is None or not self.profiler._torch_lock.acquire(blocking=False):
+            return nullcontext()
+        return self._torch_trace(torch, name)
+
+    @contextmanager
+    def _torch_trace(self, torch, name):
+        try:
+            from torch.profiler import profile, ProfilerActivity
+
+            activities = [ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(ProfilerActivity.CUDA)
+            with profile(activities=activities, record_shapes=True) as prof:
+                yield
+            directory = self.profiler.directory
+            directory.mkdir(parents=True, exist_ok=True)
+            trace = f"{self.request_id}-{name}.trace.json"
+            prof.export_chrome_trace(str(directory / trace))
+            self.torch_traces[name] = trace
+        finally:
+            self.profiler._torch_lock.release()
+
+
+class _NoProfile:
+    active = False
+
+    def torch_stage(self, name):
+        return nullcontext()
+
+
+NO_PROFILE = _NoProfile()
+
+
+class RequestProfiler:
+    """Decides which requests to profile and keeps their recent profiles
+
+    Settings:
+        PROFILE_SAMPLE_RATE: fraction of requests profiled at random (default 0)
+        PROFILE_INTERVAL_MS: stack sampling interval
+        PROFILE_KEEP: profiles kept for the admin endpoints
+        PROFILE_TORCH: also capture torch profiler traces of the Whisper stage
+        PROFILE_DIR: where torch traces are written
+        ADMIN_TOKEN: required to trigger a profile or read profiles; with no
+            token set the admin routes are closed and triggers ignored
+    """
+
+    def __init__(self, sample_rate=0.0, interval=0.005, keep=50, torch=False, directory='profiles',
+                 admin_token=None):
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self.torch = torch
+        self.directory = Path(directory)
+        self.admin_token = admin_token
+        self.sampler = StackSampler(interval)
+        self._profiles = OrderedDict()
+        # Samples of every profiled request since startup
+        self._aggregate = Counter()
+        self._lock = threading.Lock()
+        self._torch_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, default_dir='profiles'):
+        return cls(
+            sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', '0')),
+            interval=float(os.getenv('PROFILE_INTERVAL_MS', '5')) / 1000,
+            keep=int(os.getenv('PROFILE_KEEP', '50')),
+            torch=os.getenv('PROFILE_TORCH', 'false').lower() == 'true',
+            directory=os.getenv('PROFILE_DIR', default_dir),
+            admin_token=os.getenv('ADMIN_TOKEN') or None,
+        )
+
+    def authorized(self, token):
+        if self.admin_token is None:
+            return False
+        # Bytes: compare_digest rejects non-ASCII str, and headers can carry any
+        return hmac.compare_digest((token or '').encode(), self.admin_token.encode())
+
+    @contextmanager
+    def profile(self, request_id, requested=False):
+        """Sample the calling thread for the block if this request is profiled
+
+        Yields a RequestProfile, or an inactive stand-in when the request
+        isn't profiled.
+        """
+        if requested:
+            trigger = "requested"
+        elif self.sample_rate and random.random() < self.sample_rate:
+            trigger = "sampled"
+        else:
+            yield NO_PROFILE
+            return
+
+        profile = RequestProfile(self, request_id, trigger)
+        ident = threading.get_ident()
+        profile.stacks = self.sampler.watch(ident)
+        start = time.perf_counter()
+        try:
+            yield profile
+        finally:
+            self.sampler.unwatch(ident)
+            profile.duration_ms = (time.perf_counter() - start) * 1000
+            self._store(profile)
+            logger.info(f"Profiled request {request_id} ({trigger}): "
+                        f"{sum(profile.stacks.values())} samples over {profile.duration_ms:.0f} ms")
+
+    def _store(self, profile):
+        with self._lock:
+            self._aggregate.update(profile.stacks)
+            self._profiles.pop(profile.request_id, None)
+            self._profiles[profile.request_id] = profile
+            while len(self._profiles) > self.keep:
+                _, evicted = self._profiles.popitem(last=False)
+                for trace in evicted.torch_traces.values():
+                    try:
+                        (self.directory / trace).unlink()
+                    except OSError:
+                        pass
+
+    def get(self, request_id):
+        with self._lock:
+            return self._profiles.get(request_id)
+
+    def recent(self):
+        """Summaries of the kept profiles, newest first"""
+        with self._lock:
+            return [profile.summary() for profile in reversed(self._profiles.values())]
+
+    def aggregate(self):
+        """Collapsed stacks summed over every profiled request"""
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self._aggregate.most_common())
+
+    def torch_trace_path(self, request_id, stage):
+        profile = self.get(request_id)
+        trace = profile.torch_traces.get(stage) if profile else None
+        return self.directory / trace if trace else None
+
+    def as_dict(self):
+        return {
+            "sample_rate": self.sample_rate,
+            "interval_ms": self.sampler.interval * 1000,
+            "keep": self.keep,
+            "torch": self.torch,
+        }
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Request replay for performance regression testing
+Feeds recorded requests (from the artifact store or a JSONL capture) back
+through AudioPipeline with the network upstreams stubbed out, at their
+original pacing, faster, or back to back, then compares transcripts and
+per-stage latencies against a baseline run
+"""
+
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from speculation import normalize_transcript, transcripts_match
+from .stages import LanguageModel, TextToSpeech
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('decode', 'stt', 'llm', 'tts', 'total')
+
+
+class ReplayRequest:
+    """One recorded request: its audio and what happened the first time"""
+
+    __slots__ = ('request_id', 'recorded_at', 'session_id', 'timestamps', 'confidence',
+                 'response_text', 'recorded', 'load_audio')
+
+    def __init__(self, request_id, recorded_at, load_audio, session_id=None, timestamps=None,
+                 confidence=False, response_text=None, recorded=None):
+        self.request_id = request_id
+        self.recorded_at = recorded_at
+        # Returns (mono float32 audio, sample_rate); called when the request runs
+        self.load_audio = load_audio
+        self.session_id = session_id
+        self.timestamps = timestamps
+        self.confidence = confidence
+        self.response_text = response_text
+        # The original transcript and timings, usable as a baseline
+        self.recorded = recorded
+
+
+def from_artifacts(store):
+    """Requests recorded in an ArtifactStore, oldest first
+
+    Audio comes from the record itself or, after compaction kept only the
+    newest copy, from another record of the same clip.
+    """
+    requests, skipped = [], 0
+    for meta, _ in store.records():
+        request_id = meta["request_id"]
+        sources = [request_id] + store.find_audio(meta.get("audio_hash"))[::-1]
+        source = next((s for s in sources if store.has_audio(s)), None)
+        if source is None:
+            skipped += 1
+            continue
+
+        def load_audio(source=source):
+            found = store.get(source, with_audio=True)
+            if found is None or found[1] is None:
+                raise ValueError(f"Audio for {source} is no longer stored")
+            return found[1], found[0].get("sample_rate", 16000)
+
+        transcript = meta.get("transcript") or {}
+        requests.append(ReplayRequest(
+            request_id, meta.get("recorded_at", 0.0), load_audio,
+            session_id=meta.get("session_id"),
+            response_text=meta.get("response_text"),
+            recorded={"request_id": request_id, "transcript": transcript.get("text", ""),
+                      "timings_ms": meta.get("timings_ms", {})},
+        ))
+    if skipped:
+        logger.warning(f"Skipped {skipped} record(s) without audio (record with ARTIFACT_AUDIO=true)")
+    return sorted(requests, key=lambda r: r.recorded_at)
+
+
+def from_capture(path, transcoder):
+    """Requests from a JSONL capture, one object per line
+
+    Each line needs "audio" (a file path, relative to the capture) and may
+    carry "request_id", "recorded_at", "session_id", "timestamps",
+    "confidence", "response_text" and the original "transcription".
+    """
+    from pathlib import Path
+
+    base = Path(path).parent
+    requests = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            audio_path = base / entry["audio"]
+
+            def load_audio(audio_path=audio_path):
+                return read_audio_file(audio_path, transcoder)
+
+            request_id = entry.get("request_id", f"line-{number}")
+            requests.append(ReplayRequest(
+                request_id, entry.get("recorded_at", float(number)), load_audio,
+                session_id=entry.get("session_id"),
+                timestamps=entry.get("timestamps"),
+                confidence=bool(entry.get("confidence")),
+                response_text=entry.get("response_text"),
+                recorded={"request_id": request_id, "transcript": entry.get("transcription", ""),
+                          "timings_ms": entry.get("timings_ms", {})} if "transcription" in entry else None,
+            ))
+    return sorted(requests, key=lambda r: r.recorded_at)
+
+
+def read_audio_file(path, transcoder):
+    """(mono float32 audio, sample_rate) for an audio file, like an upload"""
+    import numpy as np
+    from transcoder import parse_wav
+
+    with open(path, 'rb') as f:
+        decoded = parse_wav(f.read())
+    if decoded is not None:
+        audio, sample_rate = decoded
+        return np.array(audio), sample_rate
+    return transcoder.decode(str(path))
+
+
+class ReplayLLM(LanguageModel):
+    """Answers with the recorded reply instead of calling Bedrock
+
+    With `latency` the recorded LLM time is slept, so downstream load looks
+    like production; otherwise replies are instant.
+    """
+
+    name = "replay"
+    available = True
+
+    def __init__(self, latency=False):
+        self.latency = latency
+        self._current = threading.local()
+
+    def expect(self, request):
+        self._current.request = request
+
+    def generate(self, text, session_id=None, record=True):
+        request = getattr(self._current, 'request', None)
+        if request is None:
+            return "Replayed reply."
+        if self.latency and request.recorded:
+            time.sleep(request.recorded["timings_ms"].get("llm", 0) / 1000)
+        return request.response_text or "Replayed reply."
+
+
+class NullTTS(TextToSpeech):
+    """Skips synthesis; replayed replies produce no audio"""
+
+    name = "none"
+    available = True
+
+    def speech_chunks(self, text, lang='en'):
+        return iter(())
+
+    def synthesize(self, text, lang='en'):
+        import numpy as np
+        return np.zeros(0, dtype=np.int16), 16000
+
+
+class Replayer:
+    """Runs recorded requests through a pipeline and times each stage
+
+    speed=1 keeps the original gaps between requests, speed=10 plays them
+    ten times faster and speed=0 releases them all at once. Requests that
+    overlap in time run concurrently, up to `concurrency`.
+    """
+
+    def __init__(self, pipeline, speed=1.0, concurrency=4):
+        self.pipeline = pipeline
+        self.speed = speed
+        self.concurrency = concurrency
+
+    def run(self, requests):
+        """Replay `requests`; returns one result dict per request, in order"""
+        if not requests:
+            return []
+        first = requests[0].recorded_at
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="replay") as pool:
+            futures = []
+            for request in requests:
+                if self.speed > 0:
+                    due = start + (request.recorded_at - first) / self.speed
+                    delay = due - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                futures.append(pool.submit(self.replay_one, request, time.monotonic() - start))
+            return [future.result() for future in futures]
+
+    def replay_one(self, request, offset):
+        timings = {}
+        result = {"request_id": request.request_id, "offset_s": round(offset, 3)}
+        started = time.perf_counter()
+        try:
+            audio, sample_rate = request.load_audio()
+            timings["decode"] = (time.perf_counter() - started) * 1000
+            session_id = f"replay-{request.session_id}" if request.session_id else None
+
+            stage_start = time.perf_counter()
+            transcript = self.pipeline.transcribe(audio, sample_rate, session_id,
+                                                  request.timestamps, request.confidence)
+            timings["stt"] = (time.perf_counter() - stage_start) * 1000
+            result["transcript"] = transcript["text"]
+            result["language"] = transcript["language"]
+
+            if transcript["text"]:
+                if isinstance(self.pipeline.llm, ReplayLLM):
+                    self.pipeline.llm.expect(request)
+                stage_start = time.perf_counter()
+                response_text = self.pipeline.generate_response(transcript["text"], session_id)
+                timings["llm"] = (time.perf_counter() - stage_start) * 1000
+
+                lang = self.pipeline.reply_language(transcript["language"], response_text)
+                stage_start = time.perf_counter()
+                for _ in self.pipeline.speech_chunks(response_text, lang):
+                    pass
+                timings["tts"] = (time.perf_counter() - stage_start) * 1000
+        except Exception as e:
+            logger.error(f"Replay of {request.request_id} failed: {e}")
+            result["error"] = str(e)
+        timings["total"] = (time.perf_counter() - started) * 1000
+        result["timings_ms"] = {stage: round(ms, 1) for stage, ms in timings.items()}
+        return result
+
+
+def word_error_rate(reference, hypothesis):
+    """Word-level edit distance over the reference length, on normalized text"""
+    ref = normalize_transcript(reference).split()
+    hyp = normalize_transcript(hypothesis).split()
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, round(q / 100 * (len(values) - 1))))
+    return round(values[index], 1)
+
+
+def latency_summary(results):
+    """p50/p95/mean per stage over successful results"""
+    summary = {}
+    for stage in STAGES:
+        values = [r["timings_ms"][stage] for r in results if stage in r.get("timings_ms", {})]
+        if values:
+            summary[stage] = {"count": len(values), "p50": _percentile(values, 50), "p95": _percentile(values, 95),
+                              "mean": round(sum(values) / len(values), 1)}
+    return summary
+
+
+def compare(baseline, current, max_regression=0.1, max_wer=0.0, min_delta_ms=2.0):
+    """Diff a run against a baseline run (both lists of result dicts)
+
+    Returns a report with per-request transcript changes, latency summaries
+    for both runs and whether the run passes: no stage's p50 or p95 slower
+    by more than `max_regression` (fraction) and `min_delta_ms`, and mean
+    WER at most `max_wer`.
+    """
+    by_id = {r["request_id"]: r for r in baseline}
+    changes, wers, missing = [], [], []
+    for result in current:
+        before = by_id.get(result["request_id"])
+        if before is None:
+            missing.append(result["request_id"])
+            continue
+        old, new = before.get("transcript", ""), result.get("transcript", "")
+        wer = word_error_rate(old, new)
+        wers.append(wer)
+        if not transcripts_match(old, new, min_ratio=1.0):
+            changes.append({"request_id": result["request_id"], "baseline": old, "current": new,
+                            "wer": round(wer, 3)})
+
+    compared = [r for r in current if r["request_id"] in by_id]
+    before = latency_summary([by_id[r["request_id"]] for r in compared])
+    after = latency_summary(compared)
+    latency, regressions = {}, []
+    for stage in STAGES:
+        if stage not in before or stage not in after:
+            continue
+        entry = {"baseline": before[stage], "current": after[stage]}
+        for stat in ("p50", "p95"):
+            old, new = before[stage][stat], after[stage][stat]
+            change = (new - old) / old if old else 0.0
+            entry[f"{stat}_change"] = round(change, 3)
+            if change > max_regression and new - old > min_delta_ms:
+                regressions.append(f"{stage} {stat} {old} -> {new} ms ({change:+.0%})")
+        latency[stage] = entry
+
+    mean_wer = sum(wers) / len(wers) if wers else 0.0
+    return {
+        "compared": len(compared),
+        "unmatched": missing,
+        "errors": [r["request_id"] for r in current if "error" in r],
+        "transcript_changes": changes,
+        "mean_wer": round(mean_wer, 4),
+        "latency": latency,
+        "regressions": regressions,
+        "passed": not regressions and mean_wer <= max_wer,
+    }
+
+
+def save_results(path, results):
+    with open(path, 'w') as f:
+        for result in results:
+            f.write(json.dumps(result) + "\n")
+
+
+def load_results(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
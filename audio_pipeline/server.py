@@ -0,0 +1,592 @@
+#!/usr/bin/env python3
+"""
+Web server for the AI Audio Pipeline
+Flask routes and Socket.IO handlers around a single AudioPipeline that is
+built by a background warmup; the app*.py scripts are entry points to this
+"""
+
+import os
+import re
+import time
+import uuid
+import base64
+import logging
+import functools
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Load environment variables from .env file before any module reads settings
+load_dotenv()
+
+# Heavy libraries (torch, transformers, boto3, librosa, PyAV, gTTS) are
+# imported by the background warmup, so the web routes come up immediately
+from startup_profile import profiler
+
+with profiler.phase("web imports"):
+    from flask import Flask, Response, request, jsonify, render_template, send_file
+    from flask_cors import CORS
+    from flask_socketio import SocketIO, emit
+
+    from tts_engines import pcm_to_wav
+    from uploads import SpoolingRequest, decode_upload, discard_upload
+    from audio_stream import StreamingDecoder
+    from speculation import SpeculativeTurn, speculation_enabled
+    from transcript_details import parse_options as parse_transcript_options, DETAIL_KEYS
+    from .config import PipelineConfig
+    from .core import AudioPipeline
+    from .artifacts import ArtifactStore
+    from .profiling import RequestProfiler
+    from .memory import MemoryBudget
+    from tracing import tracer
+    from resampling import get_resampler, decode_rate
+
+def configure_ffmpeg():
+    """Resolve FFmpeg once and set up the shared transcoder"""
+    from transcoder import get_transcoder
+    transcoder = get_transcoder()
+    if transcoder.ffmpeg:
+        print(f"FFmpeg configured at: {transcoder.ffmpeg.path}")
+    else:
+        print("Warning: FFmpeg not found in common locations")
+    return transcoder
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# templates/ and the test pages live at the repository root
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+app = Flask(__name__, root_path=str(ROOT_DIR))
+app.config['SECRET_KEY'] = 'your-secret-key-here'
+# Reject oversized uploads up front; large ones are spooled to disk
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_UPLOAD_MB', '25')) * 1024 * 1024
+app.request_class = SpoolingRequest
+CORS(app)
+# With several front ends, Socket.IO emits fan out through a shared message
+# queue; clients still need sticky sessions (or websocket-only transport)
+socketio = SocketIO(app, cors_allowed_origins="*",
+                    message_queue=os.getenv('SOCKETIO_MESSAGE_QUEUE') or os.getenv('REDIS_URL') or None)
+
+# Settings for the pipeline the warmup builds; entry points set this
+config = None
+
+# The pipeline is built by a background warmup; routes that need it wait
+pipeline = None
+pipeline_ready = threading.Event()
+pipeline_error = None
+transcoder = None
+# Append-only record of processed requests (ARTIFACT_STORE)
+artifacts = None
+# Opt-in per-request stack sampling, served from /admin/profiles
+request_profiler = RequestProfiler.from_env(str(ROOT_DIR / 'profiles'))
+# Per-request memory accounting and admission (MEMORY_BUDGET_MB)
+memory_budget = MemoryBudget.from_env()
+# X-Request-ID values accepted from clients (stored and echoed, never a key)
+REQUEST_ID = re.compile(r'[A-Za-z0-9_-]{1,64}')
+_warmup_lock = threading.Lock()
+_warmup_thread = None
+
+def warm_up():
+    """Import heavy libraries, configure ffmpeg and load models"""
+    global pipeline, pipeline_error, transcoder, artifacts
+    try:
+        with profiler.phase("ffmpeg"):
+            transcoder = configure_ffmpeg()
+        if ArtifactStore.enabled():
+            with profiler.phase("artifact store"):
+                try:
+                    artifacts = ArtifactStore.from_env(str(ROOT_DIR / 'artifacts'))
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Artifact store disabled: {e}")
+        with profiler.phase("pipeline"):
+            pipeline = AudioPipeline(config or PipelineConfig.from_env())
+        profiler.mark_ready()
+        logger.info(f"Pipeline ready {profiler.ready_at:.2f}s after startup")
+    except Exception as e:
+        logger.error(f"Pipeline warmup failed: {e}")
+        pipeline_error = e
+    finally:
+        profiler.uninstall_import_hook()
+        pipeline_ready.set()
+
+def start_warmup(background=True):
+    """Start loading the pipeline once, in the background by default"""
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is not None or pipeline_ready.is_set():
+            return
+        if not background:
+            _warmup_thread = threading.current_thread()
+        else:
+            _warmup_thread = threading.Thread(target=warm_up, name="warmup", daemon=True)
+            _warmup_thread.start()
+            return
+    warm_up()
+
+def get_pipeline(timeout=None):
+    """Return the loaded pipeline, waiting for warmup if necessary"""
+    start_warmup()
+    if not pipeline_ready.wait(timeout):
+        return None
+    return pipeline
+
+def setup(**defaults):
+    """Configure the pipeline and start loading it
+    
+    `defaults` are PipelineConfig values this entry point prefers; the
+    environment still overrides them.
+    """
+    global config
+    config = PipelineConfig.from_env(**defaults)
+    # FAST_STARTUP=false restores the old behaviour of loading before serving
+    start_warmup(background=os.getenv('FAST_STARTUP', 'true').lower() == 'true')
+
+def client_request_id():
+    """The caller's X-Request-ID when it's a plain identifier, else None"""
+    given = request.headers.get('X-Request-ID', '')
+    return given if REQUEST_ID.fullmatch(given) else None
+
+def profile_requested(flag, token):
+    """True when a caller asked for this request to be profiled and may"""
+    return str(flag or '').lower() in ('1', 'true') and request_profiler.authorized(token)
+
+def record_artifacts(request_id, source, session_id, audio, sample_rate, transcript, response_text,
+                     timings, **extra):
+    """Queue a finished request for the artifact store, if enabled"""
+    if artifacts is None:
+        return
+    try:
+        artifacts.record(request_id, {
+            "source": source,
+            "session_id": session_id,
+            "sample_rate": sample_rate,
+            "transcript": transcript,
+            "response_text": response_text,
+            "timings_ms": {stage: round(ms, 1) for stage, ms in timings.items()},
+            **extra,
+        }, audio)
+    except Exception as e:
+        logger.warning(f"Could not record request {request_id}: {e}")
+
+@app.route('/')
+def index():
+    """Serve the main web interface"""
+    return render_template('index.html')
+
+@app.route('/health')
+def health():
+    """Health check endpoint"""
+    if not pipeline_ready.is_set():
+        return jsonify({"status": "starting", "ready": False,
+                        "uptime_s": round(profiler.elapsed(), 2)})
+    if pipeline is None:
+        return jsonify({"status": "unhealthy", "ready": False,
+                        "error": str(pipeline_error)}), 503
+    return jsonify({
+        "status": "healthy", 
+        "ready": True,
+        "device": pipeline.device,
+        "aws_available": pipeline.aws_available,
+        "tts_available": pipeline.tts_available,
+        "tts_engine": pipeline.tts_engine.name if pipeline.tts_engine else None,
+        "cpu_layout": pipeline.cpu_layout.as_dict() if pipeline.cpu_layout else None,
+        "transcoder": transcoder.as_dict() if transcoder else None,
+        "resampler": dict(get_resampler().as_dict(), in_decode=decode_rate() is not None),
+        "whisper_compiled": bool(pipeline.compiled_whisper and pipeline.compiled_whisper.compiled),
+        "stages": {"stt": pipeline.stt.as_dict(), "llm": pipeline.llm.name, "tts": pipeline.tts.name},
+        "config": pipeline.config.as_dict(),
+        "artifacts": artifacts.stats() if artifacts else None,
+        "memory": memory_budget.as_dict()
+    })
+
+@app.route('/process_audio', methods=['POST'])
+def process_audio():
+    """Process audio through the complete pipeline"""
+    # Artifacts and profiles are keyed on our own id, so one caller can't
+    # supersede another's records by reusing theirs; X-Request-ID is kept
+    # alongside it
+    request_id = uuid.uuid4().hex
+    client_id = client_request_id()
+    # X-Profile: 1 samples this request's stacks (see /admin/profiles)
+    requested = profile_requested(request.headers.get('X-Profile'), request.headers.get('X-Admin-Token'))
+    # A W3C traceparent header joins the caller's trace
+    with tracer.start_trace("POST /process_audio", request.headers.get('traceparent'), request_id=request_id,
+                            client_request_id=client_id) as span, \
+            request_profiler.profile(request_id, requested) as profile:
+        memory = admit_upload(request_id)
+        if memory is None:
+            response = (jsonify({"error": "Server is at its memory budget, try again shortly"}), 503,
+                        {"Retry-After": "5"})
+        else:
+            try:
+                response = _process_audio(request_id, client_id, profile, memory)
+            finally:
+                memory.release()
+        span.set("http.status_code", response[1] if isinstance(response, tuple) else 200)
+        return response
+
+def admit_upload(request_id):
+    """Reserve the upload's expected footprint, or None when the budget stays full"""
+    audio_file = request.files.get('audio')
+    if audio_file is None:
+        return memory_budget.admit(request_id, memory_budget.request_overhead)
+    return memory_budget.admit(request_id, memory_budget.estimate_upload(audio_file.stream, decode_rate()))
+
+def _process_audio(request_id, client_id, profile, memory):
+    try:
+        # Get audio file from request
+        if 'audio' not in request.files:
+            return jsonify({"error": "No audio file provided"}), 400
+        
+        audio_file = request.files['audio']
+        timings = {}
+        started = time.perf_counter()
+        pipeline = get_pipeline(timeout=float(os.getenv('WARMUP_WAIT_SECONDS', '120')))
+        if pipeline is None:
+            return jsonify({"error": "Server is still loading models, try again shortly"}), 503
+        # Socket.IO sid of the caller, used to keep conversation history
+        session_id = request.form.get('session_id')
+        # Optional caption data: timestamps=segment|word, confidence=true
+        try:
+            timestamps, confidence = parse_transcript_options(
+                request.form.get('timestamps'), request.form.get('confidence')
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        # Decode straight from the spooled upload (memory or temp file)
+        # without reading it into another bytes object, resampling to 16 kHz
+        # in the same pass
+        try:
+            audio_data, sample_rate = decode_upload(audio_file, transcoder, decode_rate())
+        except Exception as e:
+            logger.error(f"Error converting audio format: {e}")
+            # Fallback: try librosa directly
+            try:
+                import librosa
+                audio_file.stream.seek(0)
+                audio_data, sample_rate = librosa.load(audio_file.stream, sr=None)
+            except Exception as e2:
+                logger.error(f"Fallback also failed: {e2}")
+                return jsonify({"error": f"Could not process audio format: {str(e)}"}), 400
+        finally:
+            # Drop the spooled upload as soon as it's decoded
+            discard_upload(audio_file)
+        timings["decode"] = (time.perf_counter() - started) * 1000
+        memory.charge("audio", audio_data.nbytes)
+        memory.mark("decode")
+        
+        # Step 1: Transcribe audio to text
+        logger.info("Transcribing audio...")
+        stage_start = time.perf_counter()
+        with profile.torch_stage("stt"):
+            transcript = pipeline.transcribe(audio_data, sample_rate, session_id, timestamps, confidence)
+        timings["stt"] = (time.perf_counter() - stage_start) * 1000
+        transcription, language = transcript["text"], transcript["language"]
+        # Only the artifact store needs the recording past this point
+        recorded_audio = audio_data if artifacts is not None else None
+        del audio_data
+        memory.charge("audio", recorded_audio.nbytes if recorded_audio is not None else 0)
+        memory.mark("stt")
+        logger.info(f"Transcription: {transcription}")
+        
+        if not transcription:
+            record_artifacts(request_id, "http", session_id, recorded_audio, sample_rate, transcript, None, timings,
+                             client_request_id=client_id)
+            return jsonify({"error": "Could not transcribe audio", "request_id": request_id}), 400
+        
+        # Step 2: Generate AI response
+        logger.info("Generating response...")
+        stage_start = time.perf_counter()
+        response_text = pipeline.generate_response(transcription, session_id)
+        timings["llm"] = (time.perf_counter() - stage_start) * 1000
+        memory.mark("llm")
+        logger.info(f"Response: {response_text}")
+        
+        # Step 3: Convert response to speech
+        logger.info("Converting to speech...")
+        stage_start = time.perf_counter()
+        audio_response = pipeline.text_to_speech(response_text, pipeline.reply_language(language, response_text))
+        timings["tts"] = (time.perf_counter() - stage_start) * 1000
+        timings["total"] = (time.perf_counter() - started) * 1000
+        memory.charge("reply", len(audio_response) if audio_response else 0)
+        memory.mark("tts")
+        record_artifacts(request_id, "http", session_id, recorded_audio, sample_rate, transcript, response_text,
+                         timings, aws_used=pipeline.aws_available, client_request_id=client_id)
+        del recorded_audio
+        memory.charge("audio", 0)
+        
+        result = {
+            "request_id": request_id,
+            "transcription": transcription,
+            "language": language,
+            "response_text": response_text,
+            "audio_available": audio_response is not None,
+            "aws_used": pipeline.aws_available
+        }
+        if client_id:
+            result["client_request_id"] = client_id
+        result.update({key: transcript[key] for key in DETAIL_KEYS if key in transcript})
+        if profile.active:
+            result["profile"] = f"/admin/profiles/{request_id}"
+        if tracer.current().trace_id:
+            result["trace_id"] = tracer.current().trace_id
+        
+        if audio_response:
+            # Encode audio as base64 for JSON response
+            audio_b64 = base64.b64encode(audio_response).decode('utf-8')
+            result["audio_data"] = audio_b64
+            del audio_response
+            memory.charge("reply", len(audio_b64))
+        
+        return jsonify(result)
+    
+    except Exception as e:
+        logger.error(f"Processing error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/startup')
+def startup_report():
+    """Startup phase and import-time breakdown (IMPORT_PROFILE=true for imports)"""
+    return jsonify(profiler.report())
+
+def admin_only(view):
+    """Require X-Admin-Token on a route; closed while ADMIN_TOKEN is unset"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not request_profiler.authorized(request.headers.get('X-Admin-Token')):
+            return jsonify({"error": "Admin token required"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/admin/profiles')
+@admin_only
+def list_profiles():
+    """Recently profiled requests, newest first"""
+    return jsonify({"settings": request_profiler.as_dict(), "profiles": request_profiler.recent()})
+
+@app.route('/admin/profiles/aggregate')
+@admin_only
+def aggregate_profile():
+    """Collapsed stacks summed over every profiled request"""
+    return Response(request_profiler.aggregate(), mimetype='text/plain')
+
+@app.route('/admin/memory')
+@admin_only
+def memory_report():
+    """Memory budget, per-stage allocation figures and in-flight requests"""
+    return jsonify(memory_budget.as_dict(detail=True))
+
+@app.route('/admin/profiles/<request_id>')
+@admin_only
+def request_profile(request_id):
+    """One request's collapsed stacks (feed to flamegraph.pl or speedscope)"""
+    profile = request_profiler.get(request_id)
+    if profile is None:
+        return jsonify({"error": "No profile for this request"}), 404
+    return Response(profile.collapsed(), mimetype='text/plain')
+
+@app.route('/admin/profiles/<request_id>/torch/<stage>')
+@admin_only
+def torch_trace(request_id, stage):
+    """A request's torch profiler trace (chrome://tracing / Perfetto JSON)"""
+    path = request_profiler.torch_trace_path(request_id, stage)
+    if path is None or not path.exists():
+        return jsonify({"error": "No torch trace for this request"}), 404
+    return send_file(path, mimetype='application/json')
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    """Reject uploads over MAX_CONTENT_LENGTH"""
+    limit_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    return jsonify({"error": f"Audio file too large (limit {limit_mb} MB)"}), 413
+
+@app.route('/test_response.html')
+def test_response():
+    """Serve the test response page"""
+    return send_file('test_response.html')
+
+@socketio.on('connect')
+def handle_connect():
+    """Handle client connection"""
+    logger.info("Client connected")
+    emit('status', {'message': 'Connected to AI pipeline server'})
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    """Handle client disconnection"""
+    logger.info("Client disconnected")
+    stream = audio_streams.pop(request.sid, None)
+    if stream is not None:
+        stream["decoder"].abort()
+        stream["memory"].release()
+    if pipeline is not None:
+        pipeline.conversations.end(request.sid)
+
+# Recordings being streamed over Socket.IO, keyed by session id
+audio_streams = {}
+
+@socketio.on('audio_start')
+def handle_audio_start(data=None):
+    """Start a streamed recording; its Opus/WebM chunks are decoded as they arrive"""
+    data = data or {}
+    pipeline = get_pipeline(timeout=float(os.getenv('WARMUP_WAIT_SECONDS', '120')))
+    if pipeline is None:
+        emit('pipeline_error', {'error': "Server is still loading models, try again shortly"})
+        return
+    
+    previous = audio_streams.pop(request.sid, None)
+    if previous is not None:
+        previous["decoder"].abort()
+        previous["memory"].release()
+    # Reserve MEMORY_STREAM_SECONDS of decoded audio for the recording
+    memory = memory_budget.admit(request.sid, memory_budget.estimate_stream())
+    if memory is None:
+        emit('pipeline_error', {'error': "Server is at its memory budget, try again shortly"})
+        return
+    try:
+        timestamps, confidence = parse_transcript_options(data.get('timestamps'), data.get('confidence'))
+        # Opt-in: start the LLM call when the speaker pauses, before audio_end
+        speculation = (SpeculativeTurn(pipeline, request.sid, timestamps=timestamps, confidence=confidence)
+                       if speculation_enabled() else None)
+        audio_streams[request.sid] = {
+            "decoder": StreamingDecoder(transcoder, on_samples=speculation.on_samples if speculation else None),
+            "speculation": speculation,
+            # Browsers that can't play Ogg/Opus get WAV replies
+            "reply_format": data.get('reply_format', 'wav'),
+            "timestamps": timestamps,
+            "confidence": confidence,
+            "profile": profile_requested(data.get('profile'), data.get('admin_token')),
+            "memory": memory,
+        }
+    except Exception as e:
+        memory.release()
+        logger.error(f"Could not start audio stream: {e}")
+        emit('pipeline_error', {'error': str(e)})
+
+@socketio.on('audio_chunk')
+def handle_audio_chunk(data):
+    """Feed one binary chunk of the current recording to its decoder"""
+    stream = audio_streams.get(request.sid)
+    if stream is None:
+        return
+    if not stream["decoder"].feed(data['seq'], data['data']):
+        audio_streams.pop(request.sid, None)
+        stream["memory"].release()
+        limit_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+        emit('pipeline_error', {'error': f"Recording too large (limit {limit_mb} MB)"})
+
+@socketio.on('audio_end')
+def handle_audio_end():
+    """Finish a streamed recording and stream the spoken reply back"""
+    stream = audio_streams.pop(request.sid, None)
+    if stream is None:
+        emit('pipeline_error', {'error': "No recording in progress"})
+        return
+    
+    request_id = uuid.uuid4().hex
+    with tracer.start_trace("socketio audio_end", request_id=request_id, session_id=request.sid), \
+            request_profiler.profile(request_id, stream["profile"]) as profile:
+        try:
+            _finish_stream(stream, request_id, profile)
+        finally:
+            stream["memory"].release()
+
+def _finish_stream(stream, request_id, profile):
+    timings = {}
+    memory = stream["memory"]
+    try:
+        started = time.perf_counter()
+        # Decoded straight into the STT stage's buffer (shared memory for workers)
+        with tracer.span("decode"):
+            audio_data, sample_rate = stream["decoder"].finish(allocate=pipeline.audio_buffer)
+        timings["decode"] = (time.perf_counter() - started) * 1000
+        memory.charge("audio", audio_data.nbytes)
+        memory.mark("decode")
+        
+        logger.info("Transcribing streamed audio...")
+        stage_start = time.perf_counter()
+        speculation = stream["speculation"]
+        if speculation is not None:
+            # Includes the speculative reply when it's reused
+            with tracer.span("speculation.resolve") as span:
+                transcript, response_text, speculative_hit = speculation.resolve(audio_data)
+                span.set("hit", speculative_hit)
+        else:
+            with profile.torch_stage("stt"):
+                transcript = pipeline.transcribe(audio_data, sample_rate, request.sid,
+                                                 stream["timestamps"], stream["confidence"])
+            speculative_hit = False
+        timings["stt"] = (time.perf_counter() - stage_start) * 1000
+        transcription, language = transcript["text"], transcript["language"]
+        # Only the artifact store needs the recording past this point
+        recorded_audio = audio_data if artifacts is not None else None
+        del audio_data
+        memory.charge("audio", recorded_audio.nbytes if recorded_audio is not None else 0)
+        memory.mark("stt")
+        logger.info(f"Transcription: {transcription}")
+        if not transcription:
+            record_artifacts(request_id, "socket", request.sid, recorded_audio, sample_rate, transcript, None,
+                             timings)
+            emit('pipeline_error', {'error': "Could not transcribe audio", 'request_id': request_id})
+            return
+        
+        if speculation is None:
+            stage_start = time.perf_counter()
+            response_text = pipeline.generate_response(transcription, request.sid)
+            timings["llm"] = (time.perf_counter() - stage_start) * 1000
+            memory.mark("llm")
+        logger.info(f"Response: {response_text}")
+        result = {
+            "request_id": request_id,
+            "transcription": transcription,
+            "language": language,
+            "response_text": response_text,
+            "audio_available": pipeline.tts_available,
+            "aws_used": pipeline.aws_available,
+            "speculative_hit": speculative_hit
+        }
+        result.update({key: transcript[key] for key in DETAIL_KEYS if key in transcript})
+        if profile.active:
+            result["profile"] = f"/admin/profiles/{request_id}"
+        if tracer.current().trace_id:
+            result["trace_id"] = tracer.current().trace_id
+        emit('transcription_result', result)
+        
+        # Send each synthesized chunk as soon as it's ready, compressed
+        # to Ogg/Opus when the browser can play it
+        chunks = 0
+        stage_start = time.perf_counter()
+        for pcm, rate in pipeline.speech_chunks(response_text, pipeline.reply_language(language, response_text)):
+            payload = transcoder.encode(pcm, rate) if stream["reply_format"] == 'ogg' else None
+            mime = 'audio/ogg' if payload is not None else 'audio/wav'
+            if payload is None:
+                payload = pcm_to_wav(pcm, rate)
+            emit('reply_audio', {'seq': chunks, 'mime': mime, 'data': payload})
+            if not chunks:
+                timings["tts_first_chunk"] = (time.perf_counter() - stage_start) * 1000
+            chunks += 1
+        emit('reply_audio_end', {'chunks': chunks})
+        timings["tts"] = (time.perf_counter() - stage_start) * 1000
+        timings["total"] = (time.perf_counter() - started) * 1000
+        memory.mark("tts")
+        record_artifacts(request_id, "socket", request.sid, recorded_audio, sample_rate, transcript, response_text,
+                         timings, aws_used=pipeline.aws_available, speculative_hit=speculative_hit)
+    
+    except Exception as e:
+        logger.error(f"Streaming processing error: {e}")
+        emit('pipeline_error', {'error': str(e)})
+
+def run(host='0.0.0.0', port=5000):
+    """Serve until interrupted"""
+    # Create templates directory if it doesn't exist
+    os.makedirs(ROOT_DIR / 'templates', exist_ok=True)
+    
+    # Start the server
+    logger.info("Starting AI Pipeline Server with AWS Bedrock integration...")
+    
+    # For production use, disable Werkzeug reloader and use proper production settings
+    socketio.run(app, host=host, port=port, debug=False, 
+                 allow_unsafe_werkzeug=True, use_reloader=False)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Stage interfaces for the AI Audio Pipeline
+AudioPipeline talks to speech-to-text, the language model and
+text-to-speech only through these, so any stage can be swapped out
+"""
+
+import numpy as np
+
+
+class SpeechToText:
+    """Base class for speech-to-text stages"""
+
+    name = "base"
+
+    def buffer(self, samples):
+        """Writable mono float32 array to decode audio into before transcribe()
+
+        Stages that hand audio to other processes return shared memory here
+        so the samples are written once and never copied again.
+        """
+        return np.empty(samples, dtype=np.float32)
+
+    def transcribe(self, audio_data, sample_rate=16000, session_id=None, timestamps=None, confidence=False):
+        """Return {"text", "language"} plus any requested caption details"""
+        raise NotImplementedError
+
+    def as_dict(self):
+        return {"name": self.name}
+
+
+class FallbackReply(str):
+    """A canned (always English) reply, returned in place of the model's
+
+    It is still the reply text; the type tells reply_language() to voice
+    it in English whatever language the user spoke.
+    """
+
+
+class LanguageModel:
+    """Base class for reply-generation stages"""
+
+    name = "base"
+    # False when the stage can only produce canned replies
+    available = False
+
+    def generate(self, text, session_id=None, record=True):
+        """Return the reply to `text`; record=False leaves the history untouched"""
+        raise NotImplementedError
+
+    def record_turn(self, session_id, text, response):
+        """Add an exchange generated with record=False to the history"""
+
+
+class TextToSpeech:
+    """Base class for text-to-speech stages"""
+
+    name = "base"
+    available = False
+
+    def speech_chunks(self, text, lang='en'):
+        """Yield (pcm, sample_rate) pieces of the spoken reply in playback order"""
+        raise NotImplementedError
+
+    def synthesize(self, text, lang='en'):
+        """Return (pcm, sample_rate) for the whole reply"""
+        raise NotImplementedError
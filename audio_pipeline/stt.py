@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Whisper speech-to-text stage
+Shared or private weights, the batched mel extractor, optional
+torch.compile, language ID from the transcription's own encoder pass and
+optional timestamps/confidences from the same generate() call
+"""
+
+import os
+import logging
+
+import numpy as np
+
+from .stages import SpeechToText
+
+logger = logging.getLogger(__name__)
+
+
+class WhisperSTT(SpeechToText):
+    """Local Whisper model; `sessions` caches each session's detected language"""
+
+    name = "whisper"
+
+    def __init__(self, config, device, sessions=None):
+        self.config = config
+        self.device = device
+        self.sessions = sessions
+        self.load_model()
+
+    def load_model(self):
+        from transformers import WhisperProcessor, WhisperForConditionalGeneration
+        from whisper_compile import CompiledWhisper
+        from mel_features import LogMelExtractor
+        from shared_weights import load_shared_whisper
+        from language_id import LanguageDetector
+
+        model_name = self.config.whisper_model
+        logger.info("Loading Whisper model...")
+        self.whisper_processor = WhisperProcessor.from_pretrained(model_name)
+        self.whisper_model = None
+        if self.device == "cpu" and self.config.whisper_shared_weights:
+            # Map one shared copy of the weights instead of loading our own
+            try:
+                self.whisper_model = load_shared_whisper(model_name)
+            except Exception as e:
+                logger.warning(f"Shared weight loading failed, loading a private copy: {e}")
+        if self.whisper_model is None:
+            self.whisper_model = WhisperForConditionalGeneration.from_pretrained(model_name)
+        self.whisper_model.to(self.device)
+        self.whisper_model.eval()
+
+        # Language ID reuses the transcription's encoder pass
+        self.language_detector = None
+        if LanguageDetector.enabled() and not LanguageDetector.fixed_language():
+            detector = LanguageDetector(self.whisper_model)
+            if detector.available():
+                self.language_detector = detector
+            else:
+                logger.info(f"{model_name} is English-only; language detection disabled")
+
+        # Batched log-mel extractor, used only if it matches the HF extractor
+        self.mel_extractor = None
+        if self.config.fast_mel_features:
+            extractor = LogMelExtractor(self.whisper_processor.feature_extractor)
+            if extractor.verify(self.whisper_processor.feature_extractor):
+                self.mel_extractor = extractor
+
+        # Optional torch.compile path, compiled here so requests never pay for it
+        self.compiled_whisper = None
+        if CompiledWhisper.enabled():
+            logger.info("Compiling Whisper (WHISPER_COMPILE=true)...")
+            self.compiled_whisper = CompiledWhisper(self.whisper_model, self.whisper_processor, self.device)
+            self.compiled_whisper.warmup()
+
+    @property
+    def compiled(self):
+        return bool(self.compiled_whisper and self.compiled_whisper.compiled)
+
+    def as_dict(self):
+        return {"name": self.name, "model": self.config.whisper_model, "compiled": self.compiled,
+                "language_detection": self.language_detector is not None}
+
+    def features(self, audio_data, sample_rate=16000):
+        """Mono 16 kHz log-mel input features for `audio_data`"""
+        from resampling import get_resampler
+
+        # Uploads usually arrive at 16 kHz already (RESAMPLE_IN_DECODE)
+        audio_data = get_resampler().resample(to_mono(audio_data), sample_rate)
+
+        if self.mel_extractor is not None:
+            return self.mel_extractor.extract(audio_data, self.device)
+        return self.whisper_processor(
+            audio_data,
+            sampling_rate=16000,
+            return_tensors="pt"
+        ).input_features.to(self.device)
+
+    def transcribe(self, audio_data, sample_rate=16000, session_id=None, timestamps=None, confidence=False,
+                   language=None):
+        """Transcribe audio; returns {"text", "language"}
+
+        The spoken language is detected from the same encoder pass used for
+        decoding, then cached on the session so later turns skip detection;
+        a detected language also adds "language_probability". Passing
+        `language` skips detection. timestamps ('segment' or 'word') and
+        confidence add "segments", "words" and "confidence" from the same
+        generate() call.
+        """
+        import torch
+        from language_id import LanguageDetector
+        import transcript_details
+
+        try:
+            input_features = self.features(audio_data, sample_rate)
+
+            language = language or LanguageDetector.fixed_language()
+            if language is None and session_id and self.sessions is not None:
+                language = self.sessions.language(session_id)
+
+            # Generate transcription
+            with torch.no_grad():
+                generate_kwargs = {}
+                details = {}
+                if language is None and self.language_detector is not None:
+                    # One encoder pass serves both detection and decoding
+                    encoder_outputs = self.language_detector.encode(input_features)
+                    language, probability = self.language_detector.detect(encoder_outputs)
+                    logger.info(f"Detected language: {language} ({probability:.2f})")
+                    details["language_probability"] = round(probability, 4)
+                    if (session_id and self.sessions is not None
+                            and probability >= self.language_detector.min_cache_probability):
+                        self.sessions.set_language(session_id, language)
+                    generate_kwargs["encoder_outputs"] = encoder_outputs
+                    input_features = None
+                if language is not None:
+                    generate_kwargs.update(language=language, task="transcribe")
+                # Timestamps and scores only when the caller asked for them
+                generation_config = self.whisper_model.generation_config
+                generate_kwargs.update(transcript_details.generate_options(generation_config, timestamps, confidence))
+
+                if self.compiled:
+                    predicted_ids = self.compiled_whisper.generate(input_features, **generate_kwargs)
+                else:
+                    predicted_ids = self.whisper_model.generate(input_features, **generate_kwargs)
+                if not isinstance(predicted_ids, torch.Tensor):
+                    predicted_ids, extracted = transcript_details.extract(
+                        predicted_ids, self.whisper_processor.tokenizer, generation_config, timestamps, confidence
+                    )
+                    details.update(extracted)
+                transcription = self.whisper_processor.batch_decode(
+                    predicted_ids, skip_special_tokens=True
+                )[0]
+
+            return {"text": transcription.strip(), "language": language or "en", **details}
+
+        except Exception as e:
+            logger.error(f"Transcription error: {e}")
+            return {"text": "", "language": None}
+
+
+def load_worker_whisper(config):
+    """WhisperSTT for a dedicated worker process, with its CPU layout applied"""
+    import torch
+    from cpu_layout import CpuLayout
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    CpuLayout.detect().apply(torch)
+    return WhisperSTT(config, device)
+
+
+def to_mono(audio_data):
+    """Average (samples, channels) audio down to one float32 channel"""
+    audio_data = np.asarray(audio_data, dtype=np.float32)
+    if audio_data.ndim > 1:
+        audio_data = audio_data.mean(axis=1)
+    return audio_data
+
+
+class WorkerSTT(SpeechToText):
+    """Base for stages that hand audio to separate STT worker processes
+
+    Workers keep no sessions, so the session's cached language goes out
+    with each job and a confidently detected one is cached from the result.
+    """
+
+    def __init__(self, sessions=None):
+        self.sessions = sessions
+        self.min_cache_probability = float(os.getenv('LANGUAGE_CACHE_MIN_PROB', '0.5'))
+
+    def transcribe(self, audio_data, sample_rate=16000, session_id=None, timestamps=None, confidence=False):
+        language = None
+        if session_id and self.sessions is not None:
+            language = self.sessions.language(session_id)
+
+        result = self.run_job(to_mono(audio_data), sample_rate, language, timestamps, confidence)
+
+        probability = result.get("language_probability")
+        if (session_id and self.sessions is not None and probability is not None
+                and probability >= self.min_cache_probability):
+            self.sessions.set_language(session_id, result["language"])
+        return result
+
+    def run_job(self, audio, sample_rate, language, timestamps, confidence):
+        """Transcribe mono float32 `audio` on a worker; same result as transcribe()"""
+        raise NotImplementedError
+
+
+def _queue_stt(config, device, sessions):
+    from .distributed import RemoteSTT
+    return RemoteSTT(config, sessions)
+
+
+def _socket_stt(config, device, sessions):
+    from .stt_rpc import SocketSTT
+    return SocketSTT(config, sessions)
+
+
+# Speech-to-text stages selectable with STT_BACKEND
+STT_BACKENDS = {
+    'whisper': WhisperSTT,
+    'socket': _socket_stt,
+    'queue': _queue_stt,
+}
+
+
+def create_stt(config, device, sessions=None):
+    """Create the stage selected by config.stt_backend"""
+    name = config.stt_backend.lower()
+    if name not in STT_BACKENDS:
+        raise ValueError(f"Unknown STT backend '{name}'. Choose from: {', '.join(STT_BACKENDS)}")
+    return STT_BACKENDS[name](config, device, sessions)
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Local STT worker service
+Whisper runs in separate worker processes behind a Unix socket, so the web
+process only orchestrates and inference never competes with Flask,
+Socket.IO or the Bedrock/TTS I/O for the GIL. The wire format is fixed
+binary headers followed by raw little-endian float32 PCM, or just a slot
+reference when the PCM is already in the shared-memory ring; there is no
+JSON or base64 in either direction.
+"""
+
+import os
+import math
+import atexit
+import signal
+import socket
+import struct
+import logging
+
+import numpy as np
+
+from tracing import tracer, CLIENT
+from .stt import WorkerSTT
+from .pcm_ring import PcmRing, RingReader, PCM_DTYPE
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'STT1'
+# 2^28 samples is over 4 hours at 16 kHz; anything bigger is a bad frame
+MAX_SAMPLES = 1 << 28
+
+# magic, sample rate, sample count, timestamps level, request flags, language
+REQUEST = struct.Struct('<4sIIBB8s')
+# With TRACE_CONTEXT, follows the header: the caller's W3C traceparent
+TRACEPARENT = struct.Struct('<55s')
+# With SHARED_PCM, replaces the inline samples: ring name, byte offset
+SHARED_REF = struct.Struct('<32sQ')
+# flags, language, language probability, confidence, avg logprob,
+# text length, segment count, word count
+RESPONSE = struct.Struct('<B8sfffIHH')
+# start, end, confidence, text length; followed by the UTF-8 text
+ITEM = struct.Struct('<fffH')
+
+TIMESTAMP_LEVELS = (None, 'segment', 'word')
+
+# Request flags
+WANT_CONFIDENCE = 1
+SHARED_PCM = 2
+TRACE_CONTEXT = 4
+
+# Response flags
+HAS_LANGUAGE_PROBABILITY = 1
+HAS_CONFIDENCE = 2
+HAS_SEGMENTS = 4
+HAS_WORDS = 8
+ERROR = 128
+
+
+def _recv_into(sock, view):
+    """Fill `view` from the socket, however the stream is split"""
+    while len(view):
+        received = sock.recv_into(view)
+        if not received:
+            raise ConnectionError("STT socket closed mid-frame")
+        view = view[received:]
+
+
+def _recv(sock, size):
+    buffer = bytearray(size)
+    _recv_into(sock, memoryview(buffer))
+    return bytes(buffer)
+
+
+def _float(value):
+    return math.nan if value is None else float(value)
+
+
+def _optional(value, digits):
+    return None if math.isnan(value) else round(value, digits)
+
+
+def send_request(sock, audio, sample_rate, language=None, timestamps=None, confidence=False, shared=None,
+                 traceparent=None):
+    """Send one transcription request for mono PCM
+
+    With `shared` = (ring name, byte offset) the worker reads `audio` from
+    the shared-memory ring and only the reference is sent. A `traceparent`
+    makes the worker's spans part of the caller's trace.
+    """
+    audio = np.ascontiguousarray(audio, dtype=PCM_DTYPE)
+    flags = ((WANT_CONFIDENCE if confidence else 0) | (SHARED_PCM if shared else 0)
+             | (TRACE_CONTEXT if traceparent else 0))
+    header = REQUEST.pack(MAGIC, sample_rate, len(audio), TIMESTAMP_LEVELS.index(timestamps),
+                          flags, (language or '').encode())
+    if traceparent:
+        header += TRACEPARENT.pack(traceparent.encode('ascii'))
+    if shared:
+        sock.sendall(header + SHARED_REF.pack(shared[0].encode(), shared[1]))
+        return
+    sock.sendall(header)
+    # Straight from the array's buffer, no intermediate bytes copy
+    sock.sendall(memoryview(audio).cast('B'))
+
+
+def read_request(sock, rings=None):
+    """Return (options, audio) for the next request on `sock`
+
+    Shared-memory requests come back as read-only views from `rings`.
+    """
+    magic, sample_rate, samples, level, flags, language = REQUEST.unpack(_recv(sock, REQUEST.size))
+    if magic != MAGIC or samples > MAX_SAMPLES or level >= len(TIMESTAMP_LEVELS):
+        raise ValueError("Malformed STT request")
+    traceparent = None
+    if flags & TRACE_CONTEXT:
+        traceparent = TRACEPARENT.unpack(_recv(sock, TRACEPARENT.size))[0].rstrip(b'\0').decode('ascii', 'replace')
+    if flags & SHARED_PCM:
+        if rings is None:
+            raise ValueError("Shared-memory PCM not supported here")
+        name, offset = SHARED_REF.unpack(_recv(sock, SHARED_REF.size))
+        try:
+            audio = rings.view(name.rstrip(b'\0').decode(), offset, samples)
+        except (OSError, ValueError, TypeError) as e:
+            raise ValueError(f"Cannot map shared PCM: {e}")
+    else:
+        audio = np.empty(samples, dtype=PCM_DTYPE)
+        _recv_into(sock, memoryview(audio).cast('B'))
+    options = {"sample_rate": sample_rate, "timestamps": TIMESTAMP_LEVELS[level],
+               "confidence": bool(flags & WANT_CONFIDENCE), "language": language.rstrip(b'\0').decode() or None,
+               "traceparent": traceparent}
+    return options, audio
+
+
+def _pack_items(items, text_key, confidence):
+    parts = []
+    for item in items:
+        text = item[text_key].encode()[:0xFFFF]
+        parts.append(ITEM.pack(item["start"], item["end"],
+                               _float(item.get("confidence")) if confidence else math.nan, len(text)))
+        parts.append(text)
+    return parts
+
+
+def encode_response(result, error=False):
+    """Binary form of a transcribe() result"""
+    flags = ERROR if error else 0
+    if "language_probability" in result:
+        flags |= HAS_LANGUAGE_PROBABILITY
+    confidence = "confidence" in result
+    if confidence:
+        flags |= HAS_CONFIDENCE
+    segments = result.get("segments")
+    words = result.get("words")
+    if segments is not None:
+        flags |= HAS_SEGMENTS
+    if words is not None:
+        flags |= HAS_WORDS
+    text = result.get("text", "").encode()
+    parts = [
+        RESPONSE.pack(flags, (result.get("language") or '').encode(),
+                      _float(result.get("language_probability")), _float(result.get("confidence")),
+                      _float(result.get("avg_logprob")), len(text), len(segments or ()), len(words or ())),
+        text,
+    ]
+    parts += _pack_items(segments or (), "text", confidence)
+    parts += _pack_items(words or (), "word", confidence)
+    return b''.join(parts)
+
+
+def _read_items(sock, count, text_key, confidence):
+    items = []
+    for _ in range(count):
+        start, end, item_confidence, length = ITEM.unpack(_recv(sock, ITEM.size))
+        item = {text_key: _recv(sock, length).decode(), "start": round(start, 3), "end": round(end, 3)}
+        if confidence:
+            item["confidence"] = _optional(item_confidence, 4)
+        items.append(item)
+    return items
+
+
+def read_response(sock):
+    """Read one response; returns (result, error)"""
+    (flags, language, language_probability, confidence, avg_logprob,
+     text_length, segment_count, word_count) = RESPONSE.unpack(_recv(sock, RESPONSE.size))
+    result = {"text": _recv(sock, text_length).decode(), "language": language.rstrip(b'\0').decode() or None}
+    if flags & HAS_LANGUAGE_PROBABILITY:
+        result["language_probability"] = _optional(language_probability, 4)
+    if flags & HAS_CONFIDENCE:
+        result["confidence"] = _optional(confidence, 4)
+        result["avg_logprob"] = _optional(avg_logprob, 4)
+    has_confidence = bool(flags & HAS_CONFIDENCE)
+    if flags & HAS_SEGMENTS:
+        result["segments"] = _read_items(sock, segment_count, "text", has_confidence)
+    if flags & HAS_WORDS:
+        result["words"] = _read_items(sock, word_count, "word", has_confidence)
+    return result, bool(flags & ERROR)
+
+
+class SocketSTT(WorkerSTT):
+    """Speech-to-text served by STT worker processes on a local Unix socket
+
+    Audio goes through a shared-memory PcmRing when possible: buffer()
+    hands out arrays in the ring to decode into, and anything else is
+    copied into a slot once. Workers read the slot in place.
+
+    Settings:
+      STT_SOCKET          socket path shared with stt_worker.py
+      STT_RPC_TIMEOUT     seconds to wait for a transcription
+      STT_SHARED_MEMORY   hand PCM over in shared memory (true/false)
+      STT_RING_MB         size of the shared-memory ring
+    """
+
+    name = "socket"
+
+    def __init__(self, config, sessions=None):
+        super().__init__(sessions)
+        self.path = config.stt_socket
+        self.timeout = float(os.getenv('STT_RPC_TIMEOUT', '60'))
+        self.ring = None
+        if os.getenv('STT_SHARED_MEMORY', 'true').lower() == 'true':
+            try:
+                self.ring = PcmRing(int(float(os.getenv('STT_RING_MB', '64')) * 1024 * 1024))
+                atexit.register(self.ring.close)
+            except OSError as e:
+                logger.warning(f"Shared-memory PCM ring unavailable, sending audio inline: {e}")
+        if not os.path.exists(self.path):
+            logger.warning(f"No STT worker listening on {self.path} yet; start stt_worker.py")
+
+    def as_dict(self):
+        return {"name": self.name, "socket": self.path, "listening": os.path.exists(self.path),
+                "shared_memory": self.ring is not None}
+
+    def buffer(self, samples):
+        if self.ring is not None:
+            array = self.ring.allocate(samples)
+            if array is not None:
+                return array
+        return super().buffer(samples)
+
+    def run_job(self, audio, sample_rate, language, timestamps, confidence):
+        ring = self.ring
+        shared = ring.find(audio) if ring is not None else None
+        if shared is None and ring is not None:
+            # Copy into the ring once; the worker reads it from there
+            array = ring.allocate(len(audio))
+            if array is not None:
+                array[:] = audio
+                audio = array
+                shared = ring.find(audio)
+        if shared is None:
+            return self._request(audio, sample_rate, language, timestamps, confidence)
+
+        slot, offset = shared
+        # The in-flight request holds its own reference until the worker answers
+        slot.retain()
+        try:
+            result = self._request(audio, sample_rate, language, timestamps, confidence, (ring.name, offset))
+        finally:
+            slot.release()
+        if result is None:
+            # The worker couldn't map the ring (e.g. another container)
+            logger.warning("STT worker cannot read shared memory; sending audio inline from now on")
+            self.ring = None
+            result = self._request(audio, sample_rate, language, timestamps, confidence)
+        return result
+
+    def _request(self, audio, sample_rate, language, timestamps, confidence, shared=None):
+        """One round trip; None if the worker rejected a shared-memory request"""
+        # One connection per request: the kernel's accept queue hands it to
+        # whichever worker process is free
+        with tracer.span("stt.socket", kind=CLIENT, shared_memory=shared is not None) as span:
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    sock.settimeout(self.timeout)
+                    sock.connect(self.path)
+                    send_request(sock, audio, sample_rate, language, timestamps, confidence, shared,
+                                 span.traceparent)
+                    result, error = read_response(sock)
+            except (OSError, ValueError, struct.error) as e:
+                logger.error(f"STT worker request failed: {e}")
+                span.record_error(e)
+                return {"text": "", "language": None}
+            if error:
+                logger.error(f"STT worker rejected the request: {result['text']}")
+                span.set("rejected", result['text'])
+                return None if shared else {"text": "", "language": None}
+            return result
+
+
+class STTSocketServer:
+    """Serves transcription requests on a Unix socket from pre-forked workers
+
+    The socket is bound once and each worker process accepts from it,
+    loading its own stage after the fork; dead workers are replaced.
+    """
+
+    def __init__(self, path, load_stt, workers=1):
+        self.path = path
+        self.load_stt = load_stt
+        self.workers = max(1, workers)
+        self.children = {}
+        self.rings = RingReader()
+        self.listener = None
+        self.stopping = False
+
+    def bind(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.path)
+        self.listener.listen(64)
+        logger.info(f"STT worker service listening on {self.path} with {self.workers} worker(s)")
+
+    def handle(self, conn, stt):
+        """Answer the single request on `conn`"""
+        try:
+            options, audio = read_request(conn, self.rings)
+        except (ValueError, struct.error) as e:
+            conn.sendall(encode_response({"text": str(e), "language": None}, error=True))
+            return
+        # Joins the front end's trace, as queue workers do
+        with tracer.start_trace("stt.worker", options["traceparent"], worker=os.getpid(),
+                                audio_s=round(len(audio) / max(1, options["sample_rate"]), 2)):
+            result = stt.transcribe(audio, options["sample_rate"], None, options["timestamps"],
+                                    options["confidence"], language=options["language"])
+        conn.sendall(encode_response(result))
+
+    def serve(self, stt):
+        """Accept and answer requests in this process until stopped"""
+        while not self.stopping:
+            try:
+                conn, _ = self.listener.accept()
+            except InterruptedError:
+                continue
+            except OSError:
+                if self.stopping:
+                    break
+                raise
+            with conn:
+                try:
+                    self.handle(conn, stt)
+                except (OSError, ConnectionError) as e:
+                    logger.warning(f"STT client went away: {e}")
+
+    def _spawn(self, index):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = index
+            return
+        # Child: take this worker's slice of the cores, then load the model
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        os.environ['WORKER_COUNT'] = str(self.workers)
+        os.environ['WORKER_INDEX'] = str(index)
+        code = 0
+        try:
+            self.serve(self.load_stt())
+        except Exception as e:
+            logger.error(f"STT worker {index} failed: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def serve_forever(self):
+        self.bind()
+        try:
+            if self.workers == 1:
+                self.serve(self.load_stt())
+                return
+            signal.signal(signal.SIGTERM, self._stop)
+            signal.signal(signal.SIGINT, self._stop)
+            for index in range(self.workers):
+                self._spawn(index)
+            while self.children:
+                try:
+                    pid, status = os.wait()
+                except ChildProcessError:
+                    break
+                except InterruptedError:
+                    continue
+                index = self.children.pop(pid, None)
+                if index is not None and not self.stopping:
+                    logger.warning(f"STT worker {index} exited ({status}); restarting")
+                    self._spawn(index)
+        finally:
+            self.rings.close()
+            self.listener.close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+
+def run_socket_server(config):
+    """Serve STT_WORKERS Whisper processes on config.stt_socket"""
+    from .stt import load_worker_whisper
+
+    workers = int(os.getenv('STT_WORKERS', '1'))
+    STTSocketServer(config.stt_socket, lambda: load_worker_whisper(config), workers).serve_forever()
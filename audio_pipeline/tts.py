@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Text-to-speech stage
+A TTS engine behind the sentence-chunked parallel synthesizer, with the
+canned fallback replies served from pre-rendered audio
+"""
+
+import logging
+
+from tts_engines import create_tts_engine, ChunkedSynthesizer
+from fallback_responses import FallbackAudioCache
+from .stages import TextToSpeech
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkedTTS(TextToSpeech):
+    """TTS_ENGINE engine (gtts, espeak or auto) with chunked synthesis"""
+
+    def __init__(self, config):
+        self.engine = None
+        self.synthesizer = None
+        self.fallback_audio = None
+        self.available = False
+        logger.info("Loading TTS model...")
+        try:
+            self.engine = create_tts_engine(config.tts_engine)
+            self.available = self.engine.available()
+            # Long replies are split at sentence boundaries and synthesized in parallel
+            self.synthesizer = ChunkedSynthesizer(self.engine)
+            # Canned fallback replies are rendered once, off the startup path
+            self.fallback_audio = FallbackAudioCache(self.synthesizer)
+            if self.available:
+                self.fallback_audio.warm()
+                logger.info(f"TTS engine '{self.engine.name}' initialized successfully!")
+            else:
+                logger.warning(f"TTS engine '{self.engine.name}' is not available. TTS will be disabled.")
+        except Exception as e:
+            logger.warning(f"Could not initialize TTS: {e}. TTS will be disabled.")
+            self.engine = None
+            self.available = False
+
+    @property
+    def name(self):
+        return self.engine.name if self.engine else None
+
+    def speech_chunks(self, text, lang='en'):
+        if not self.available:
+            return
+        # Canned replies come from the pre-rendered table
+        cached = self.fallback_audio.lookup(text, lang) if self.fallback_audio else None
+        if cached is not None:
+            yield cached
+            return
+        yield from self.synthesizer.iter_chunks(text, lang)
+
+    def synthesize(self, text, lang='en'):
+        cached = self.fallback_audio.lookup(text, lang) if self.fallback_audio else None
+        if cached is not None:
+            return cached
+        return self.synthesizer.synthesize(text, lang)
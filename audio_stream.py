@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Incremental decoding of audio streamed over Socket.IO
+The browser sends Opus/WebM chunks while it records; they are decoded to
+16 kHz mono float32 as they arrive, so little work is left once recording stops
+"""
+
+import os
+import threading
+import subprocess
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAX_STREAM_BYTES = int(os.getenv('MAX_UPLOAD_MB', '25')) * 1024 * 1024
+
+
+class _ChunkPipe:
+    """Non-seekable file object whose read() blocks until data or EOF"""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def write(self, data):
+        with self._cond:
+            self._chunks.append(memoryview(data))
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def read(self, size=-1):
+        with self._cond:
+            while not self._chunks and not self._closed:
+                self._cond.wait()
+            if not self._chunks:
+                return b''
+            chunk = self._chunks[0]
+            if size < 0 or size >= len(chunk) - self._offset:
+                data = chunk[self._offset:]
+                self._chunks.pop(0)
+                self._offset = 0
+            else:
+                data = chunk[self._offset:self._offset + size]
+                self._offset += size
+            return bytes(data)
+
+
+class StreamingDecoder:
+    """Decodes one recording as its chunks arrive
+
+    Chunks carry a sequence number because Socket.IO may dispatch events on
+    separate threads; out-of-order chunks are held until the gap is filled.
+    """
+
+    def __init__(self, transcoder, sample_rate=16000, max_bytes=MAX_STREAM_BYTES, on_samples=None):
+        self.transcoder = transcoder
+        self.on_samples = on_samples
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.received = 0
+        self.error = None
+        self._next_seq = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._samples = []
+        self._process = None
+
+        if transcoder.backend == 'pyav':
+            self._pipe = _ChunkPipe()
+            self._thread = threading.Thread(target=self._decode_pyav, name="stream-decode", daemon=True)
+        else:
+            if transcoder.ffmpeg is None:
+                raise RuntimeError("Streaming decode needs PyAV or ffmpeg")
+            self._process = subprocess.Popen(
+                [transcoder.ffmpeg.path, '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0',
+                 '-vn', '-ac', '1', '-ar', str(sample_rate), '-f', 'f32le', 'pipe:1'],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+            )
+            self._pipe = self._process.stdin
+            self._thread = threading.Thread(target=self._read_ffmpeg, name="stream-decode", daemon=True)
+        self._thread.start()
+
+    def feed(self, seq, data):
+        """Queue chunk number `seq`; returns False once the size limit is hit"""
+        with self._lock:
+            self.received += len(data)
+            if self.received > self.max_bytes:
+                self.abort()
+                return False
+            self._pending[seq] = data
+            while self._next_seq in self._pending:
+                self._pipe.write(self._pending.pop(self._next_seq))
+                self._next_seq += 1
+        return True
+
+    def finish(self, timeout=30, allocate=None):
+        """Flush, wait for the decoder and return (audio, sample_rate)
+
+        allocate(samples) may supply the output array, e.g. a slot in the
+        STT worker's shared-memory ring, so the chunks are joined straight
+        into it.
+        """
+        with self._lock:
+            if self._pending:
+                logger.warning(f"Audio stream ended with {len(self._pending)} chunk(s) missing before them")
+                for seq in sorted(self._pending):
+                    self._pipe.write(self._pending.pop(seq))
+            self._pipe.close()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            self.abort()
+            raise TimeoutError("Audio stream decode timed out")
+        if self.error is not None:
+            raise self.error
+        if not self._samples:
+            raise ValueError("No audio decoded from stream")
+        out = allocate(sum(len(chunk) for chunk in self._samples)) if allocate else None
+        return np.concatenate(self._samples, out=out), self.sample_rate
+
+    def abort(self):
+        try:
+            self._pipe.close()
+        except (OSError, ValueError):
+            pass
+        if self._process is not None:
+            self._process.kill()
+
+    def _append(self, chunk):
+        self._samples.append(chunk)
+        if self.on_samples is not None:
+            try:
+                self.on_samples(chunk)
+            except Exception as e:
+                logger.warning(f"Decoded-samples callback failed: {e}")
+
+    def _decode_pyav(self):
+        try:
+            for chunk, _ in self.transcoder.iter_decode(self._pipe, self.sample_rate):
+                self._append(chunk)
+        except Exception as e:
+            self.error = e
+
+    def _read_ffmpeg(self):
+        try:
+            while True:
+                data = self._process.stdout.read(16 * 1024)
+                if not data:
+                    break
+                # Keep whole float32 samples; ffmpeg writes in sample multiples
+                self._append(np.frombuffer(data[:len(data) - len(data) % 4], dtype=np.float32))
+            if self._process.wait() != 0:
+                self.error = RuntimeError("ffmpeg failed to decode the audio stream")
+        except Exception as e:
+            self.error = e
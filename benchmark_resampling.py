@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark the resampling paths to Whisper's 16 kHz
+Times librosa.resample (the previous STT-stage path, soxr_hq) against each
+engine and quality of resampling.Resampler for common browser rates,
+measures passband accuracy and alias rejection, and compares decoding
+Ogg/Opus at the native rate and then resampling with decoding straight to
+16 kHz
+
+    python3 benchmark_resampling.py --seconds 30 --repeat 5
+"""
+
+import time
+import argparse
+
+import numpy as np
+
+from resampling import Resampler, QUALITIES, WHISPER_RATE, _soxr_available
+
+RATES = (48000, 44100, 24000, 22050, 8000)
+# Passband test tones (Hz), all below 16 kHz's 8 kHz Nyquist
+TONES = (220.0, 1000.0, 3150.0, 6500.0)
+# Above Nyquist after resampling; whatever survives is aliasing
+ALIAS_TONE = 11000.0
+
+
+def tones(rate, seconds, frequencies):
+    t = np.arange(int(rate * seconds)) / rate
+    return (sum(np.sin(2 * np.pi * f * t) for f in frequencies) / (2 * len(frequencies))).astype(np.float32)
+
+
+def best_time(fn, repeat):
+    fn()  # filter design and imports happen on the first call
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def db(signal, error):
+    return 10 * np.log10(np.mean(signal ** 2) / max(np.mean(error ** 2), 1e-20))
+
+
+def librosa_resample(audio, rate):
+    import librosa
+    return librosa.resample(audio, orig_sr=rate, target_sr=WHISPER_RATE, res_type='soxr_hq')
+
+
+def candidates():
+    """(label, resample function) for the previous path and every engine/quality"""
+    yield "librosa soxr_hq", librosa_resample
+    for engine in (('soxr', 'polyphase') if _soxr_available() else ('polyphase',)):
+        for quality in QUALITIES:
+            resampler = Resampler(quality, engine)
+            yield f"{engine} {quality}", lambda audio, rate, r=resampler: r.resample(audio, rate)
+
+
+def benchmark_resamplers(seconds, repeat):
+    print(f"Resampling {seconds:g} s to {WHISPER_RATE} Hz (best of {repeat})")
+    print(f"{'rate':>6} {'resampler':<20} {'ms':>8} {'x realtime':>11} {'SNR dB':>7} {'alias dB':>9}")
+    # Edges are excluded from the accuracy figures (filter start-up)
+    edge = WHISPER_RATE // 10
+    for rate in RATES:
+        passband = tones(rate, seconds, [f for f in TONES if f < rate / 2])
+        alias = tones(rate, seconds, [ALIAS_TONE]) if ALIAS_TONE < rate / 2 else None
+        for label, resample in candidates():
+            ms = best_time(lambda: resample(passband, rate), repeat)
+            out = resample(passband, rate)[edge:-edge]
+            expected = tones(WHISPER_RATE, seconds, [f for f in TONES if f < rate / 2])[edge:-edge]
+            snr = db(expected, out[:len(expected)] - expected)
+            rejection = (f"{-db(alias, resample(alias, rate)[edge:-edge]):9.1f}" if alias is not None
+                         else f"{'-':>9}")
+            print(f"{rate:>6} {label:<20} {ms:8.2f} {seconds * 1000 / ms:11.0f} {snr:7.1f} {rejection}")
+
+
+def benchmark_decode(seconds, repeat):
+    from transcoder import get_transcoder
+
+    transcoder = get_transcoder()
+    pcm = (tones(48000, seconds, TONES) * 32767).astype(np.int16)
+    encoded = transcoder.encode(pcm, 48000)
+    if encoded is None:
+        print("\nNo Opus encoder available; skipping the decode comparison")
+        return
+    resampler = Resampler()
+
+    def native_then_librosa():
+        audio, rate = transcoder.decode(encoded)
+        return librosa_resample(audio, rate)
+
+    def native_then_resampler():
+        audio, rate = transcoder.decode(encoded)
+        return resampler.resample(audio, rate)
+
+    def fused():
+        return transcoder.decode(encoded, WHISPER_RATE)[0]
+
+    print(f"\nDecoding {seconds:g} s of 48 kHz Ogg/Opus ({len(encoded) // 1024} KB) to 16 kHz "
+          f"({transcoder.as_dict().get('backend', 'transcoder')}); SNR against the previous path")
+    reference = native_then_librosa()
+    for name, fn in (("decode 48k + librosa soxr_hq", native_then_librosa),
+                     (f"decode 48k + {resampler.engine} balanced", native_then_resampler),
+                     ("decode straight to 16k", fused)):
+        out = fn()
+        n = min(len(out), len(reference))
+        print(f"  {name:<30} {best_time(fn, repeat):8.2f} ms {db(reference[:n], out[:n] - reference[:n]):7.1f} dB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark resampling to 16 kHz")
+    parser.add_argument('--seconds', type=float, default=10.0, help="clip length")
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per case (best is reported)")
+    args = parser.parse_args()
+    benchmark_resamplers(args.seconds, args.repeat)
+    benchmark_decode(args.seconds, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
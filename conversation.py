@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Conversation state for multi-turn voice sessions
+Keeps a bounded, token-aware message history per Socket.IO session
+and evicts sessions that have gone idle; RedisConversationStore shares
+the same state between front ends in distributed mode
+"""
+
+import os
+import json
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio for Claude-family tokenizers. Good enough
+# for budgeting history; Bedrock reports the exact counts in `usage`.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """Cheap token estimate used for history budgeting"""
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+class ConversationSession:
+    """History and running summary for a single session"""
+
+    __slots__ = ('messages', 'summary', 'tokens', 'last_active', 'language')
+
+    def __init__(self):
+        self.messages = []
+        self.summary = ""
+        self.tokens = 0
+        # Spoken language detected on an earlier turn, if any
+        self.language = None
+        self.last_active = time.monotonic()
+
+
+class ConversationStore:
+    """In-memory store of conversation sessions with idle eviction"""
+
+    def __init__(self, max_history_tokens=None, max_summary_tokens=None,
+                 idle_timeout=None, max_sessions=None):
+        self.max_history_tokens = max_history_tokens or int(os.getenv('CONVERSATION_MAX_TOKENS', '2000'))
+        self.max_summary_tokens = max_summary_tokens or int(os.getenv('CONVERSATION_SUMMARY_TOKENS', '200'))
+        self.idle_timeout = idle_timeout or float(os.getenv('CONVERSATION_IDLE_TIMEOUT', '900'))
+        self.max_sessions = max_sessions or int(os.getenv('CONVERSATION_MAX_SESSIONS', '1000'))
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, session_id):
+        """Return the session for `session_id`, creating it if needed"""
+        now = time.monotonic()
+        with self._lock:
+            self._maybe_sweep(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                if len(self._sessions) >= self.max_sessions:
+                    self._evict_oldest()
+                session = ConversationSession()
+                self._sessions[session_id] = session
+            session.last_active = now
+            return session
+
+    def history(self, session_id):
+        """Return (summary, messages) to prepend to the next request"""
+        session = self.get(session_id)
+        with self._lock:
+            return session.summary, list(session.messages)
+
+    def append_turn(self, session_id, user_text, assistant_text):
+        """Record a completed user/assistant exchange and enforce the budget"""
+        session = self.get(session_id)
+        with self._lock:
+            session.messages.append({"role": "user", "content": user_text})
+            session.messages.append({"role": "assistant", "content": assistant_text})
+            session.tokens += estimate_tokens(user_text) + estimate_tokens(assistant_text)
+            self._truncate(session)
+
+    def language(self, session_id):
+        """Language detected earlier in this session, or None"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return session.language if session is not None else None
+
+    def set_language(self, session_id, language):
+        session = self.get(session_id)
+        with self._lock:
+            session.language = language
+
+    def end(self, session_id):
+        """Drop a session, e.g. when its socket disconnects"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _truncate(self, session):
+        """Fold the oldest exchanges into the summary until under budget"""
+        # Always keep at least the latest exchange verbatim, and drop whole
+        # user/assistant pairs so the history keeps alternating roles.
+        while session.tokens > self.max_history_tokens and len(session.messages) > 2:
+            user_msg = session.messages.pop(0)
+            assistant_msg = session.messages.pop(0)
+            session.tokens -= estimate_tokens(user_msg["content"]) + estimate_tokens(assistant_msg["content"])
+            self._summarize(session, user_msg["content"], assistant_msg["content"])
+
+    def _summarize(self, session, user_text, assistant_text):
+        """Extractive summary: keep the gist of dropped turns, newest last"""
+        line = f"User said: {_first_sentence(user_text)} Assistant replied: {_first_sentence(assistant_text)}"
+        summary = f"{session.summary}\n{line}" if session.summary else line
+        max_chars = self.max_summary_tokens * CHARS_PER_TOKEN
+        if len(summary) > max_chars:
+            # Drop the oldest summary lines first
+            lines = summary.split("\n")
+            while len(lines) > 1 and sum(len(l) + 1 for l in lines) > max_chars:
+                lines.pop(0)
+            summary = "\n".join(lines)[-max_chars:]
+        session.summary = summary
+
+    def _maybe_sweep(self, now):
+        """Evict idle sessions, at most once per minute"""
+        if now - self._last_sweep < 60:
+            return
+        self._last_sweep = now
+        expired = [sid for sid, s in self._sessions.items() if now - s.last_active > self.idle_timeout]
+        for sid in expired:
+            del self._sessions[sid]
+        if expired:
+            logger.info(f"Evicted {len(expired)} idle conversation session(s)")
+
+    def _evict_oldest(self):
+        oldest = min(self._sessions, key=lambda sid: self._sessions[sid].last_active)
+        del self._sessions[oldest]
+
+
+class RedisConversationStore(ConversationStore):
+    """ConversationStore kept in Redis so any front end can serve a session
+
+    Each session is one JSON value that expires after the idle timeout;
+    updates are WATCH/MULTI transactions, so concurrent turns never lose
+    each other's messages.
+    """
+
+    KEY_PREFIX = "conversation:"
+
+    def __init__(self, client, **kwargs):
+        super().__init__(**kwargs)
+        self.client = client
+        self.ttl = max(1, int(self.idle_timeout))
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(match=f"{self.KEY_PREFIX}*"))
+
+    def _key(self, session_id):
+        return f"{self.KEY_PREFIX}{session_id}"
+
+    def _load(self, session_id, client=None):
+        raw = (client or self.client).get(self._key(session_id))
+        session = ConversationSession()
+        if raw:
+            data = json.loads(raw)
+            session.messages = data["messages"]
+            session.summary = data["summary"]
+            session.tokens = data["tokens"]
+            session.language = data["language"]
+        return session
+
+    def _save(self, session_id, session, client=None):
+        data = {"messages": session.messages, "summary": session.summary,
+                "tokens": session.tokens, "language": session.language}
+        (client or self.client).set(self._key(session_id), json.dumps(data), ex=self.ttl)
+
+    def _update(self, session_id, change):
+        """Apply change(session) atomically and refresh the idle timeout"""
+        def apply(pipe):
+            session = self._load(session_id, pipe)
+            change(session)
+            pipe.multi()
+            self._save(session_id, session, pipe)
+        self.client.transaction(apply, self._key(session_id))
+
+    def get(self, session_id):
+        """A snapshot of the session; changes go through _update()"""
+        session = self._load(session_id)
+        self.client.expire(self._key(session_id), self.ttl)
+        return session
+
+    def history(self, session_id):
+        session = self.get(session_id)
+        return session.summary, list(session.messages)
+
+    def append_turn(self, session_id, user_text, assistant_text):
+        def change(session):
+            session.messages.append({"role": "user", "content": user_text})
+            session.messages.append({"role": "assistant", "content": assistant_text})
+            session.tokens += estimate_tokens(user_text) + estimate_tokens(assistant_text)
+            self._truncate(session)
+        self._update(session_id, change)
+
+    def language(self, session_id):
+        return self._load(session_id).language
+
+    def set_language(self, session_id, language):
+        def change(session):
+            session.language = language
+        self._update(session_id, change)
+
+    def end(self, session_id):
+        self.client.delete(self._key(session_id))
+
+
+def _first_sentence(text, limit=160):
+    text = " ".join(text.split())
+    for end in ('. ', '? ', '! '):
+        idx = text.find(end)
+        if 0 <= idx < limit:
+            return text[:idx + 1]
+    return text[:limit]
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+CPU partitioning for pipeline workers
+Splits the cores available to this container across worker processes and
+pipeline stages, and pins torch's thread pools so workers don't oversubscribe
+"""
+
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def available_cpus():
+    """CPUs this process may run on, honouring affinity masks"""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        # sched_getaffinity is Linux-only
+        return list(range(os.cpu_count() or 1))
+
+
+def cgroup_cpu_limit():
+    """CPU quota from cgroups (e.g. docker --cpus), or None if unlimited"""
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            return max(1, int(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read())
+        if quota > 0:
+            return max(1, quota // period)
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _env_int(name, default=None):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+class CpuLayout:
+    """Core allocation for one worker process
+
+    Settings (all optional, auto-detected when unset):
+      WORKER_COUNT / WEB_CONCURRENCY  number of workers sharing the host
+      WORKER_INDEX                    this worker's slot, 0-based
+      TORCH_INTRA_OP_THREADS          threads for Whisper ops
+      TORCH_INTEROP_THREADS           threads for torch inter-op parallelism
+      PIN_WORKER_CPUS                 pin this worker to its core slice
+    """
+
+    def __init__(self, cpus, worker_count, worker_index, intra_op_threads,
+                 interop_threads, io_threads, pinned):
+        self.cpus = cpus
+        self.worker_count = worker_count
+        self.worker_index = worker_index
+        self.intra_op_threads = intra_op_threads
+        self.interop_threads = interop_threads
+        self.io_threads = io_threads
+        self.pinned = pinned
+
+    @classmethod
+    def detect(cls):
+        host_cpus = available_cpus()
+        limit = cgroup_cpu_limit()
+        usable = min(len(host_cpus), limit) if limit else len(host_cpus)
+
+        worker_count = max(1, _env_int('WORKER_COUNT', _env_int('WEB_CONCURRENCY', 1)))
+        worker_index = _env_int('WORKER_INDEX', 0) % worker_count
+
+        # Contiguous slice of cores for this worker; workers beyond the core
+        # count share cores round-robin
+        per_worker = max(1, usable // worker_count)
+        start = (worker_index * per_worker) % max(1, len(host_cpus))
+        cpus = (host_cpus + host_cpus)[start:start + per_worker]
+
+        # Leave a core for Flask/Socket.IO, Bedrock and TTS I/O when there's room
+        io_threads = 1 if per_worker > 2 else 0
+        intra = _env_int('TORCH_INTRA_OP_THREADS', max(1, per_worker - io_threads))
+        interop = _env_int('TORCH_INTEROP_THREADS', 1)
+        pinned = os.getenv('PIN_WORKER_CPUS', 'false').lower() == 'true'
+        return cls(cpus, worker_count, worker_index, intra, interop, io_threads, pinned)
+
+    def apply(self, torch):
+        """Pin torch thread pools (and optionally CPU affinity) for this worker"""
+        if self.pinned and hasattr(os, 'sched_setaffinity'):
+            try:
+                os.sched_setaffinity(0, self.cpus)
+            except OSError as e:
+                logger.warning(f"Could not pin worker to CPUs {self.cpus}: {e}")
+                self.pinned = False
+
+        torch.set_num_threads(self.intra_op_threads)
+        try:
+            torch.set_num_interop_threads(self.interop_threads)
+        except RuntimeError as e:
+            # Only settable before any inter-op work has started
+            logger.warning(f"Could not set torch inter-op threads: {e}")
+        self.interop_threads = torch.get_num_interop_threads()
+        self.intra_op_threads = torch.get_num_threads()
+
+        logger.info(
+            f"Worker {self.worker_index + 1}/{self.worker_count}: "
+            f"{self.intra_op_threads} intra-op / {self.interop_threads} inter-op torch threads "
+            f"on CPUs {self.cpus}{' (pinned)' if self.pinned else ''}"
+        )
+
+    def as_dict(self):
+        return {
+            "worker_index": self.worker_index,
+            "worker_count": self.worker_count,
+            "cpus": self.cpus,
+            "pinned": self.pinned,
+            "torch_intra_op_threads": self.intra_op_threads,
+            "torch_interop_threads": self.interop_threads,
+            "io_threads": self.io_threads,
+        }
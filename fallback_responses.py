@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Canned responses used when AWS Bedrock is unavailable
+The fixed parts are rendered to audio once, so fallback replies cost
+little or no TTS work per request
+"""
+
+import threading
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Static replies, keyed by intent
+STATIC_RESPONSES = {
+    'greeting': "Hello! How can I help you today?",
+    'wellbeing': "I'm doing well, thank you for asking! How can I assist you?",
+    'thanks': "You're welcome! Is there anything else I can help you with?",
+    'weather': "I don't have access to current weather data, but you might want to check a weather app or website for the most accurate forecast.",
+}
+
+# Replies that quote the transcript: (prefix, suffix) around '{text}'
+TEMPLATE_RESPONSES = {
+    'question': (
+        "That's an interesting question about '",
+        "'. I'd be happy to help, but I'm currently running in fallback mode. For more detailed responses, AWS Bedrock integration would be needed."
+    ),
+    'default': (
+        "I understand you mentioned '",
+        "'. I'm currently running in a simple fallback mode. For more intelligent responses, please configure AWS Bedrock credentials."
+    ),
+}
+
+
+def classify(text):
+    """Pick the canned response intent for a transcript"""
+    text_lower = text.lower()
+    if any(greeting in text_lower for greeting in ['hello', 'hi', 'hey', 'good morning', 'good afternoon']):
+        return 'greeting'
+    elif any(question in text_lower for question in ['how are you', 'how do you do']):
+        return 'wellbeing'
+    elif any(thanks in text_lower for thanks in ['thank you', 'thanks', 'appreciate']):
+        return 'thanks'
+    elif 'weather' in text_lower:
+        return 'weather'
+    elif any(question_word in text_lower for question_word in ['what', 'how', 'why', 'when', 'where', 'who']):
+        return 'question'
+    return 'default'
+
+
+def fallback_response(text):
+    """Return the canned reply text for a transcript"""
+    intent = classify(text)
+    if intent in STATIC_RESPONSES:
+        return STATIC_RESPONSES[intent]
+    prefix, suffix = TEMPLATE_RESPONSES[intent]
+    return f"{prefix}{text}{suffix}"
+
+
+def _spoken(fragment):
+    """Text actually sent to TTS for a template fragment (quotes aren't voiced)"""
+    return fragment.strip(" '")
+
+
+class FallbackAudioCache:
+    """Pre-rendered PCM for the canned responses
+
+    Static replies are served straight from the table; templated replies
+    only synthesize the quoted transcript between the cached prefix and suffix.
+    """
+
+    def __init__(self, synthesizer, lang='en'):
+        self.synthesizer = synthesizer
+        self.lang = lang
+        self.sample_rate = None
+        self._static = {}
+        self._templates = {}
+        self._ready = threading.Event()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def warm(self, background=True):
+        """Render all canned audio, by default on a background thread"""
+        if background:
+            threading.Thread(target=self.warm, args=(False,), name="fallback-audio", daemon=True).start()
+            return
+        try:
+            for text in STATIC_RESPONSES.values():
+                self._static[text] = self._render(text)
+            for intent, (prefix, suffix) in TEMPLATE_RESPONSES.items():
+                self._templates[intent] = (prefix, suffix, self._render(_spoken(prefix)), self._render(_spoken(suffix)))
+            self._ready.set()
+            size = sum(p.nbytes for p in self._static.values()) + sum(t[2].nbytes + t[3].nbytes for t in self._templates.values())
+            logger.info(f"Pre-rendered {len(self._static) + 2 * len(self._templates)} fallback audio clips ({size / 1024:.0f} KiB)")
+        except Exception as e:
+            logger.warning(f"Could not pre-render fallback audio: {e}")
+
+    def _render(self, text):
+        pcm, sample_rate = self.synthesizer.synthesize(text, self.lang)
+        if self.sample_rate is None:
+            self.sample_rate = sample_rate
+        return np.ascontiguousarray(pcm, dtype=np.int16)
+
+    def lookup(self, text, lang='en'):
+        """Return (pcm, sample_rate) for a canned reply, or None if not canned"""
+        if not self.ready or lang != self.lang:
+            return None
+        pcm = self._static.get(text)
+        if pcm is not None:
+            return pcm, self.sample_rate
+        for prefix, suffix, prefix_pcm, suffix_pcm in self._templates.values():
+            if text.startswith(prefix) and text.endswith(suffix) and len(text) > len(prefix) + len(suffix):
+                middle = text[len(prefix):len(text) - len(suffix)]
+                middle_pcm, sample_rate = self.synthesizer.synthesize(middle, self.lang)
+                if sample_rate != self.sample_rate:
+                    return None
+                return np.concatenate([prefix_pcm, middle_pcm, suffix_pcm]), self.sample_rate
+        return None
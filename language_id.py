@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Spoken-language identification for Whisper
+Scores Whisper's language tokens from one encoder pass; the same encoder
+output is then handed to generate(), so detection costs a single decoder step
+"""
+
+import os
+import logging
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+class LanguageDetector:
+    """Picks the most likely language token after <|startoftranscript|>
+
+    Settings:
+      LANGUAGE_DETECTION        detect the spoken language (true/false)
+      WHISPER_LANGUAGE          fixed language code; skips detection
+      LANGUAGE_CACHE_MIN_PROB   confidence needed to reuse a session's language
+    """
+
+    def __init__(self, model):
+        self.model = model
+        generation_config = model.generation_config
+        lang_to_id = getattr(generation_config, 'lang_to_id', None) or {}
+        # "<|en|>" -> "en"
+        self.codes = [token[2:-2] for token in lang_to_id]
+        self.token_ids = list(lang_to_id.values())
+        self.start_token_id = generation_config.decoder_start_token_id
+        self.min_cache_probability = float(os.getenv('LANGUAGE_CACHE_MIN_PROB', '0.5'))
+
+    @staticmethod
+    def enabled():
+        return os.getenv('LANGUAGE_DETECTION', 'true').lower() == 'true'
+
+    @staticmethod
+    def fixed_language():
+        return os.getenv('WHISPER_LANGUAGE') or None
+
+    def available(self):
+        """English-only checkpoints have no language tokens to score"""
+        return bool(self.token_ids) and getattr(self.model.generation_config, 'is_multilingual', True)
+
+    def encode(self, input_features):
+        """Run the encoder once; the result is reused for decoding"""
+        return self.model.get_encoder()(input_features)
+
+    def detect(self, encoder_outputs):
+        """Return (language_code, probability) for the first item of the batch"""
+        batch_size = encoder_outputs.last_hidden_state.shape[0]
+        decoder_input_ids = torch.full(
+            (batch_size, 1), self.start_token_id, dtype=torch.long,
+            device=encoder_outputs.last_hidden_state.device
+        )
+        with torch.no_grad():
+            logits = self.model(encoder_outputs=encoder_outputs, decoder_input_ids=decoder_input_ids,
+                                use_cache=False).logits[:, -1]
+        probabilities = logits[:, self.token_ids].float().softmax(dim=-1)
+        probability, index = probabilities[0].max(dim=0)
+        return self.codes[index.item()], probability.item()
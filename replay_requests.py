@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Replay recorded requests for performance regression testing
+Runs artifact-store records (or a JSONL capture) through AudioPipeline with
+Bedrock and TTS stubbed out, then diffs transcripts and per-stage latencies
+against a baseline: a saved run, or what was recorded originally.
+
+    python3 replay_requests.py --artifacts artifacts --speed 10 --output before.jsonl
+    # ... change quantization, batching, etc. ...
+    python3 replay_requests.py --artifacts artifacts --speed 10 --baseline before.jsonl
+"""
+
+import sys
+import json
+import argparse
+import logging
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from audio_pipeline import AudioPipeline, PipelineConfig
+from audio_pipeline.artifacts import ArtifactStore
+from audio_pipeline.replay import (
+    Replayer, ReplayLLM, NullTTS, from_artifacts, from_capture, compare, latency_summary,
+    save_results, load_results,
+)
+
+logging.basicConfig(level=logging.INFO)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--artifacts', metavar='DIR', help="artifact store directory (ARTIFACT_AUDIO=true records)")
+    source.add_argument('--capture', metavar='FILE', help="JSONL capture with an 'audio' path per line")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="1 = original pacing, 10 = ten times faster, 0 = all at once")
+    parser.add_argument('--concurrency', type=int, default=4, help="requests in flight at most")
+    parser.add_argument('--limit', type=int, help="replay only the first N requests")
+    parser.add_argument('--real-llm', action='store_true', help="call the configured LLM instead of the recorded reply")
+    parser.add_argument('--real-tts', action='store_true', help="synthesize replies with the configured engine")
+    parser.add_argument('--llm-latency', action='store_true', help="sleep for each recorded LLM time")
+    parser.add_argument('--output', metavar='FILE', help="save this run's results (JSONL) for later comparison")
+    parser.add_argument('--baseline', metavar='FILE', help="results of an earlier run; default: the recorded values")
+    parser.add_argument('--report', metavar='FILE', help="write the comparison report as JSON")
+    parser.add_argument('--max-regression', type=float, default=0.1,
+                        help="allowed p50/p95 slowdown per stage, as a fraction")
+    parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                        help="ignore slowdowns smaller than this, in milliseconds")
+    parser.add_argument('--max-wer', type=float, default=0.0, help="allowed mean word error rate vs the baseline")
+    return parser.parse_args()
+
+
+def print_report(report):
+    print(f"\nCompared {report['compared']} request(s); mean WER {report['mean_wer']:.2%}")
+    print(f"{'stage':<8} {'p50 before':>11} {'p50 now':>9} {'change':>8} {'p95 before':>11} {'p95 now':>9} {'change':>8}")
+    for stage, entry in report["latency"].items():
+        before, now = entry["baseline"], entry["current"]
+        print(f"{stage:<8} {before['p50']:>11} {now['p50']:>9} {entry['p50_change']:>+8.0%} "
+              f"{before['p95']:>11} {now['p95']:>9} {entry['p95_change']:>+8.0%}")
+    for change in report["transcript_changes"]:
+        print(f"\n{change['request_id']} (WER {change['wer']:.0%})\n  - {change['baseline']}\n  + {change['current']}")
+    if report["errors"]:
+        print(f"\nFailed: {', '.join(report['errors'])}")
+    for regression in report["regressions"]:
+        print(f"REGRESSION: {regression}")
+    print("PASSED" if report["passed"] else "FAILED")
+
+
+def main():
+    args = parse_args()
+
+    if args.artifacts:
+        requests = from_artifacts(ArtifactStore(args.artifacts, read_only=True))
+    else:
+        from transcoder import get_transcoder
+        requests = from_capture(args.capture, get_transcoder())
+    if args.limit:
+        requests = requests[:args.limit]
+    if not requests:
+        print("Nothing to replay")
+        return 1
+
+    pipeline = AudioPipeline(
+        PipelineConfig.from_env(),
+        llm=None if args.real_llm else ReplayLLM(latency=args.llm_latency),
+        tts=None if args.real_tts else NullTTS(),
+    )
+    print(f"Replaying {len(requests)} request(s) at speed {args.speed:g}...")
+    results = Replayer(pipeline, speed=args.speed, concurrency=args.concurrency).run(requests)
+    if args.output:
+        save_results(args.output, results)
+
+    if args.baseline:
+        baseline = load_results(args.baseline)
+    else:
+        baseline = [request.recorded for request in requests if request.recorded]
+    if not baseline:
+        print(json.dumps(latency_summary(results), indent=2))
+        return 0
+
+    report = compare(baseline, results, args.max_regression, args.max_wer, args.min_delta_ms)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    print_report(report)
+    return 0 if report["passed"] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
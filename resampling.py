@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Resampling for the AI Audio Pipeline
+One entry point for every rate conversion to Whisper's 16 kHz, with a
+selectable quality. soxr (the library behind librosa's soxr_hq) is called
+directly when installed; otherwise a polyphase FIR resampler is used whose
+filters are designed once per rate pair. Browser rates reduce to small
+ratios (48 kHz is an exact 3:1, 44.1 kHz is 160:441).
+"""
+
+import os
+import math
+import importlib.util
+import threading
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Whisper's input rate
+WHISPER_RATE = 16000
+
+QUALITIES = ('fast', 'balanced', 'high')
+# soxr presets: 'high' is what librosa.resample used (soxr_hq); 'balanced'
+# is soxr's 16-bit medium quality, well past what the mel features resolve
+SOXR_QUALITY = {'fast': 'LQ', 'balanced': 'MQ', 'high': 'HQ'}
+# Polyphase filter half-length (in multiples of the larger of up/down) and
+# Kaiser beta. 'balanced' is scipy.signal.resample_poly's default design.
+POLYPHASE_FILTERS = {'fast': (6, 5.0), 'balanced': (10, 5.0), 'high': (24, 8.6)}
+
+
+def _soxr_available():
+    return importlib.util.find_spec('soxr') is not None
+
+
+class Resampler:
+    """Resamples mono float32 audio at a fixed quality
+
+    Settings:
+        RESAMPLE_ENGINE: auto (soxr when installed, else polyphase), soxr or polyphase
+        RESAMPLE_QUALITY: fast, balanced (default) or high
+    """
+
+    def __init__(self, quality='balanced', engine='auto'):
+        if quality not in QUALITIES:
+            raise ValueError(f"Unknown resample quality '{quality}'. Choose from: {', '.join(QUALITIES)}")
+        if engine == 'auto':
+            engine = 'soxr' if _soxr_available() else 'polyphase'
+        if engine not in ('soxr', 'polyphase'):
+            raise ValueError(f"Unknown resample engine '{engine}'. Choose from: auto, soxr, polyphase")
+        self.quality = quality
+        self.engine = engine
+        self._filters = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.getenv('RESAMPLE_QUALITY', 'balanced').lower(), os.getenv('RESAMPLE_ENGINE', 'auto').lower())
+
+    @staticmethod
+    def ratio(orig_sr, target_sr):
+        """(up, down) in lowest terms"""
+        orig_sr, target_sr = int(orig_sr), int(target_sr)
+        g = math.gcd(orig_sr, target_sr)
+        return target_sr // g, orig_sr // g
+
+    def filter(self, up, down):
+        """Polyphase anti-aliasing FIR for an up/down ratio, designed on first use"""
+        key = (up, down)
+        taps = self._filters.get(key)
+        if taps is None:
+            from scipy.signal import firwin
+
+            half_len, beta = POLYPHASE_FILTERS[self.quality]
+            max_rate = max(up, down)
+            taps = firwin(2 * half_len * max_rate + 1, 1.0 / max_rate, window=('kaiser', beta)).astype(np.float32)
+            with self._lock:
+                taps = self._filters.setdefault(key, taps)
+        return taps
+
+    def resample(self, audio, orig_sr, target_sr=WHISPER_RATE):
+        """`audio` (mono float32) at `target_sr`; returned as-is if already there"""
+        audio = np.asarray(audio, dtype=np.float32)
+        if int(orig_sr) == int(target_sr) or not len(audio):
+            return audio
+        if self.engine == 'soxr':
+            import soxr
+            return soxr.resample(audio, orig_sr, target_sr, quality=SOXR_QUALITY[self.quality])
+
+        from scipy.signal import resample_poly
+
+        up, down = self.ratio(orig_sr, target_sr)
+        # resample_poly scales a copy of the filter by `up` and runs it polyphase
+        return resample_poly(audio, up, down, window=self.filter(up, down))
+
+    def as_dict(self):
+        with self._lock:
+            ratios = [f"{up}:{down}" for up, down in self._filters]
+        return {"engine": self.engine, "quality": self.quality, "cached_filters": ratios}
+
+
+_resampler = None
+_resampler_lock = threading.Lock()
+
+
+def get_resampler():
+    """Process-wide Resampler, created on first use"""
+    global _resampler
+    if _resampler is None:
+        with _resampler_lock:
+            if _resampler is None:
+                _resampler = Resampler.from_env()
+    return _resampler
+
+
+def decode_rate():
+    """Rate uploads are decoded to, or None to keep the file's own rate
+
+    With RESAMPLE_IN_DECODE (the default) decoders output Whisper's 16 kHz
+    directly, so the STT stage has nothing left to resample.
+    """
+    return WHISPER_RATE if os.getenv('RESAMPLE_IN_DECODE', 'true').lower() == 'true' else None
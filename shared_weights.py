@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Shared, memory-mapped Whisper weights
+The first process converts the checkpoint into a torch state dict file;
+every process then maps that file instead of loading its own copy, so
+workers on one host share a single physical copy through the page cache
+"""
+
+import os
+import time
+import logging
+from pathlib import Path
+
+import torch
+from transformers import WhisperConfig, WhisperForConditionalGeneration, GenerationConfig
+
+logger = logging.getLogger(__name__)
+
+WEIGHTS_CACHE_DIR = Path(os.getenv('SHARED_WEIGHTS_DIR', Path.home() / '.cache' / 'hf-audio-pipeline'))
+
+
+def shared_weights_path(model_name):
+    return WEIGHTS_CACHE_DIR / f"{model_name.replace('/', '--')}.pt"
+
+
+def export_shared_weights(model_name):
+    """Write the mappable state dict for `model_name` if it isn't there yet"""
+    path = shared_weights_path(model_name)
+    if path.exists():
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    logger.info(f"Exporting shared weights for {model_name} to {path}")
+    model = WhisperForConditionalGeneration.from_pretrained(model_name)
+    # Write to a per-process temp name and rename, so concurrent workers
+    # never map a half-written file
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    torch.save(model.state_dict(), tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_shared_whisper(model_name):
+    """Build Whisper with parameters backed by a read-only shared mapping
+
+    The model skeleton is created on the meta device (no allocation), then
+    the mapped tensors are assigned in place of parameters. Pages are only
+    read, so they stay shared with every other process mapping the file.
+    """
+    start = time.perf_counter()
+    path = export_shared_weights(model_name)
+
+    config = WhisperConfig.from_pretrained(model_name)
+    with torch.device('meta'):
+        model = WhisperForConditionalGeneration(config)
+    state_dict = torch.load(path, mmap=True, weights_only=True)
+    model.load_state_dict(state_dict, assign=True)
+    model.tie_weights()
+    model.generation_config = GenerationConfig.from_pretrained(model_name)
+    model.eval()
+
+    remaining = [name for name, t in list(model.named_parameters()) + list(model.named_buffers()) if t.is_meta]
+    if remaining:
+        raise RuntimeError(f"Shared weights missing tensors: {remaining[:5]}")
+
+    logger.info(f"Mapped shared Whisper weights from {path} in {time.perf_counter() - start:.2f}s")
+    return model
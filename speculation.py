@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Speculative response generation for streamed recordings
+When voice activity detection sees the speaker stop, the audio so far is
+transcribed and the LLM call is started before the recording ends; the
+result is used if the final transcript matches, and discarded otherwise
+"""
+
+import os
+import re
+import difflib
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def speculation_enabled():
+    return os.getenv('SPECULATIVE_LLM', 'false').lower() == 'true'
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv('SPECULATIVE_WORKERS', '2')), thread_name_prefix="speculate"
+            )
+        return _executor
+
+
+def normalize_transcript(text):
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
+
+
+def transcripts_match(a, b, min_ratio=None):
+    """True if two transcripts differ only immaterially"""
+    min_ratio = min_ratio if min_ratio is not None else float(os.getenv('SPECULATIVE_MATCH_RATIO', '0.9'))
+    a, b = normalize_transcript(a), normalize_transcript(b)
+    if a == b:
+        return True
+    return difflib.SequenceMatcher(None, a, b).ratio() >= min_ratio
+
+
+class EnergyVAD:
+    """Frame-energy voice activity detector with an adaptive noise floor"""
+
+    def __init__(self, sample_rate=16000, frame_ms=30, silence_ms=None, threshold=None):
+        self.frame = sample_rate * frame_ms // 1000
+        self.silence_frames = (silence_ms or int(os.getenv('VAD_SILENCE_MS', '600'))) // frame_ms
+        self.threshold = threshold or float(os.getenv('VAD_THRESHOLD', '0.015'))
+        self.noise_floor = 0.0
+        self.samples_seen = 0
+        self.speech_seen = False
+        self.speech_end = 0
+        self.trailing_silence = 0
+        self._remainder = np.zeros(0, dtype=np.float32)
+
+    def process(self, samples):
+        """Consume 16 kHz float samples; returns True when speech has just ended"""
+        samples = np.concatenate([self._remainder, samples]) if self._remainder.size else samples
+        usable = samples.shape[0] - samples.shape[0] % self.frame
+        self._remainder = samples[usable:].copy()
+        if usable == 0:
+            return False
+
+        rms = np.sqrt(np.mean(np.square(samples[:usable].reshape(-1, self.frame)), axis=1))
+        ended = False
+        for energy in rms:
+            self.samples_seen += self.frame
+            # The floor follows quiet frames down at once and rises slowly,
+            # so steady background noise stops counting as speech
+            if energy < self.noise_floor:
+                self.noise_floor = energy
+            else:
+                self.noise_floor += 0.01 * (energy - self.noise_floor)
+            if energy > max(self.threshold, 3 * self.noise_floor):
+                self.speech_seen = True
+                self.speech_end = self.samples_seen
+                self.trailing_silence = 0
+            else:
+                self.trailing_silence += 1
+                if self.speech_seen and self.trailing_silence == self.silence_frames:
+                    ended = True
+        return ended
+
+
+class SpeculativeTurn:
+    """Speculation state for one streamed recording"""
+
+    def __init__(self, pipeline, session_id, sample_rate=16000, timestamps=None, confidence=False):
+        self.pipeline = pipeline
+        self.session_id = session_id
+        # Caption options for the final transcript; partials only need text
+        self.transcribe_options = {"timestamps": timestamps, "confidence": confidence}
+        self.vad = EnergyVAD(sample_rate)
+        self.partial = None
+        self.partial_speech_end = 0
+        self.response_future = None
+        self.launches = 0
+        self._samples = []
+        self._transcribe_future = None
+        self._lock = threading.Lock()
+
+    def on_samples(self, chunk):
+        """Decoder callback; runs on the decode thread"""
+        self._samples.append(chunk)
+        if self.vad.process(chunk):
+            audio = np.concatenate(self._samples)
+            speech_end = self.vad.speech_end
+            with self._lock:
+                self._transcribe_future = _get_executor().submit(self._speculate, audio, speech_end)
+
+    def _speculate(self, audio, speech_end):
+        partial = self.pipeline.transcribe(audio, 16000, self.session_id)["text"]
+        if not partial:
+            return
+        with self._lock:
+            if speech_end < self.partial_speech_end:
+                return  # an earlier pause finished transcribing late
+            if self.partial is not None and transcripts_match(partial, self.partial, 1.0):
+                self.partial_speech_end = speech_end
+                return
+            # The speaker said more since the last guess: restart the call
+            if self.response_future is not None:
+                self.response_future.cancel()
+            self.partial = partial
+            self.partial_speech_end = speech_end
+            self.launches += 1
+            self.response_future = _get_executor().submit(
+                self.pipeline.generate_response, partial, self.session_id, False
+            )
+        logger.info(f"Speculative LLM call launched for partial transcript: {partial}")
+
+    def resolve(self, audio):
+        """Return (transcript, response_text, speculation_used) for the full recording"""
+        with self._lock:
+            pending = self._transcribe_future
+        if pending is not None:
+            pending.result()
+
+        with self._lock:
+            partial, response_future = self.partial, self.response_future
+
+        # Always transcribe the whole recording: the energy VAD can miss quiet
+        # trailing words, so a partial is never taken as the final transcript
+        transcript = self.pipeline.transcribe(audio, 16000, self.session_id, **self.transcribe_options)
+        transcription = transcript["text"]
+        if not transcription:
+            return transcript, None, False
+
+        if response_future is not None and transcripts_match(transcription, partial):
+            response_text = response_future.result()
+            self.pipeline.record_turn(self.session_id, transcription, response_text)
+            logger.info("Speculative LLM response used")
+            return transcript, response_text, True
+
+        if response_future is not None:
+            response_future.cancel()
+            logger.info("Speculative LLM response discarded: final transcript differs")
+        return transcript, self.pipeline.generate_response(transcription, self.session_id), False
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Startup profiling for the AI Audio Pipeline
+Times named startup phases and, optionally, every first-time import
+(a runtime equivalent of `python -X importtime`), attributed to the
+phase that triggered it
+"""
+
+import os
+import sys
+import time
+import builtins
+import threading
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfiler:
+    """Collects phase timings and import times for the /startup report"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []
+        self.imports = []
+        self.ready_at = None
+        self._phase = threading.local()
+        self._import_stack = threading.local()
+        self._original_import = None
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @contextmanager
+    def phase(self, name):
+        """Time a named startup phase"""
+        previous = getattr(self._phase, 'name', None)
+        self._phase.name = name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.phases.append({
+                "phase": name,
+                "start_s": round(start - self.started, 4),
+                "duration_s": round(duration, 4),
+                "thread": threading.current_thread().name,
+            })
+            self._phase.name = previous
+            logger.info(f"Startup phase '{name}' took {duration:.3f}s")
+
+    def mark_ready(self):
+        self.ready_at = self.elapsed()
+
+    def install_import_hook(self):
+        """Record cumulative and self time of each first-time import"""
+        if self._original_import is not None:
+            return
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def uninstall_import_hook(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original_import
+        if level or name in sys.modules:
+            return original(name, globals, locals, fromlist, level)
+
+        stack = getattr(self._import_stack, 'frames', None)
+        if stack is None:
+            stack = self._import_stack.frames = []
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            cumulative = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += cumulative
+            self.imports.append((name, cumulative, cumulative - children, len(stack),
+                                 getattr(self._phase, 'name', None)))
+
+    def report(self, top=25):
+        """Phase timings plus the slowest imports, as a JSON-able dict"""
+        top_level = [r for r in self.imports if r[3] == 0]
+        by_phase = {}
+        for name, cumulative, _, depth, phase in top_level:
+            by_phase[phase or "module import"] = by_phase.get(phase or "module import", 0.0) + cumulative
+
+        def rows(records, key):
+            return [
+                {"module": name, "cumulative_s": round(cumulative, 4), "self_s": round(self_time, 4),
+                 "depth": depth, "phase": phase}
+                for name, cumulative, self_time, depth, phase in sorted(records, key=key, reverse=True)[:top]
+            ]
+
+        return {
+            "ready": self.ready_at is not None,
+            "ready_after_s": round(self.ready_at, 4) if self.ready_at is not None else None,
+            "uptime_s": round(self.elapsed(), 4),
+            "phases": self.phases,
+            "import_profiling": self._original_import is not None or bool(self.imports),
+            "import_time_by_phase_s": {k: round(v, 4) for k, v in by_phase.items()},
+            "slowest_imports": rows(top_level, key=lambda r: r[1]),
+            "slowest_imports_self": rows(self.imports, key=lambda r: r[2]),
+        }
+
+
+profiler = StartupProfiler()
+if os.getenv('IMPORT_PROFILE', 'false').lower() == 'true':
+    profiler.install_import_hook()
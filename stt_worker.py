@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+STT worker service
+Loads Whisper in processes of its own so web servers only orchestrate.
+Pulls jobs from the shared Redis queue at REDIS_URL (distributed mode)
+whenever REDIS_URL is set, unless STT_BACKEND=socket; otherwise serves
+STT_WORKERS processes on the Unix socket at STT_SOCKET for front ends with
+STT_BACKEND=socket
+"""
+
+import logging
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from audio_pipeline import PipelineConfig
+from audio_pipeline.distributed import run_stt_worker
+from audio_pipeline.stt_rpc import run_socket_server
+
+logging.basicConfig(level=logging.INFO)
+
+if __name__ == '__main__':
+    config = PipelineConfig.from_env()
+    backend = config.stt_backend.lower()
+    if backend == 'queue' or (config.redis_url and backend != 'socket'):
+        run_stt_worker(config)
+    else:
+        run_socket_server(config)
@@ -0,0 +1,45 @@
+"""
+ArtifactStore recovery from damaged segment files
+"""
+
+import numpy as np
+
+from audio_pipeline.artifacts import ArtifactStore
+
+
+def write_records(directory, count):
+    store = ArtifactStore(directory, store_audio=True)
+    for i in range(count):
+        store.record(f"r{i}", {"sample_rate": 16000}, np.full(100, i, np.float32))
+    store.flush()
+    return store._path(1)
+
+
+def corrupt(path, position):
+    data = bytearray(path.read_bytes())
+    data[position] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+
+def test_corrupt_audio_stops_the_scan(tmp_path):
+    path = write_records(tmp_path, 3)
+    size = path.stat().st_size
+    # Inside the second record's audio
+    corrupt(path, size // 2)
+
+    reader = ArtifactStore(tmp_path, read_only=True)
+    assert [meta["request_id"] for meta, _ in reader.records()] == ["r0"]
+    assert path.stat().st_size == size
+
+    store = ArtifactStore(tmp_path)
+    assert len(store) == 1
+    assert path.stat().st_size < size
+    meta, audio = store.get("r0", with_audio=True)
+    assert audio[0] == 0
+
+
+def test_corrupt_metadata_does_not_raise(tmp_path):
+    path = write_records(tmp_path, 2)
+    # The first record's JSON starts right after its 16-byte header
+    corrupt(path, 16)
+    assert len(ArtifactStore(tmp_path)) == 0
@@ -0,0 +1,176 @@
+"""
+Distributed mode against fakeredis: the STT job queue (RemoteSTT and
+STTWorker) and the shared conversation store
+
+    pip install -r requirements-dev.txt
+    python -m pytest tests
+"""
+
+import json
+import time
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from audio_pipeline.distributed import (RemoteSTT, STTWorker, JOB_QUEUE, RESULT_PREFIX, WORKER_PREFIX,
+                                        HEARTBEAT_TTL, encode_job, decode_job)
+from conversation import RedisConversationStore, estimate_tokens
+
+
+class EchoSTT:
+    """Stands in for Whisper on the worker and records what it was given"""
+
+    name = "echo"
+
+    def __init__(self):
+        self.calls = []
+
+    def transcribe(self, audio, sample_rate, session_id, timestamps, confidence, language=None):
+        self.calls.append((len(audio), sample_rate, language))
+        return {"text": f"{len(audio)} samples", "language": language or "fr", "language_probability": 0.9}
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def client(server):
+    return fakeredis.FakeRedis(server=server)
+
+
+def serve_one(worker):
+    """Handle the next queued job on a background thread"""
+    def run():
+        _, payload = worker.client.brpop(JOB_QUEUE, timeout=5)
+        worker.handle(payload)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_job_encoding_round_trip():
+    audio = np.linspace(-1, 1, 1000, dtype=np.float32)
+    header, decoded = decode_job(encode_job({"id": "x", "sample_rate": 16000}, audio))
+    assert header == {"id": "x", "sample_rate": 16000}
+    np.testing.assert_array_equal(decoded, audio)
+
+
+def test_remote_stt_round_trip(server, monkeypatch):
+    monkeypatch.setenv("STT_QUEUE_TIMEOUT", "5")
+    sessions = RedisConversationStore(client(server))
+    remote = RemoteSTT(SimpleNamespace(redis_url=None), sessions, client=client(server))
+    stt = EchoSTT()
+    worker = STTWorker(stt, client(server))
+
+    thread = serve_one(worker)
+    result = remote.transcribe(np.zeros(16000, np.float32), 16000, session_id="s1")
+    thread.join(5)
+    assert result["text"] == "16000 samples"
+    assert stt.calls == [(16000, 16000, None)]
+    # A confident detection is cached and sent with the session's next job
+    assert sessions.language("s1") == "fr"
+
+    thread = serve_one(worker)
+    remote.transcribe(np.zeros(8000, np.float32), 16000, session_id="s1")
+    thread.join(5)
+    assert stt.calls[-1] == (8000, 16000, "fr")
+
+
+def test_result_expires(server, monkeypatch):
+    monkeypatch.setenv("STT_QUEUE_TIMEOUT", "5")
+    worker = STTWorker(EchoSTT(), client(server))
+    header = {"id": "job1", "sample_rate": 16000, "deadline": time.time() + 5}
+    worker.handle(encode_job(header, np.zeros(160, np.float32)))
+    redis = client(server)
+    assert json.loads(redis.lpop(RESULT_PREFIX + "job1"))["text"] == "160 samples"
+    worker.handle(encode_job(header, np.zeros(160, np.float32)))
+    assert 0 < redis.ttl(RESULT_PREFIX + "job1") <= 5 + HEARTBEAT_TTL
+
+
+def test_expired_job_is_dropped(server):
+    stt = EchoSTT()
+    worker = STTWorker(stt, client(server))
+    header = {"id": "late", "sample_rate": 16000, "deadline": time.time() - 1}
+    assert worker.handle(encode_job(header, np.zeros(160, np.float32))) is None
+    assert stt.calls == []
+    assert not client(server).exists(RESULT_PREFIX + "late")
+
+
+def test_remote_stt_times_out_without_workers(server, monkeypatch):
+    monkeypatch.setenv("STT_QUEUE_TIMEOUT", "1")
+    remote = RemoteSTT(SimpleNamespace(redis_url=None), client=client(server))
+    assert remote.transcribe(np.zeros(160, np.float32), 16000) == {"text": "", "language": None}
+
+
+def test_heartbeat(server):
+    worker = STTWorker(EchoSTT(), client(server))
+    remote = RemoteSTT(SimpleNamespace(redis_url=None), client=client(server))
+    assert remote.worker_count() == 0
+
+    worker.heartbeat()
+    redis = client(server)
+    assert redis.get(worker.worker_key) == b"echo"
+    assert 0 < redis.ttl(worker.worker_key) <= HEARTBEAT_TTL
+    assert worker.worker_key.startswith(WORKER_PREFIX)
+    assert remote.worker_count() == 1
+    assert remote.as_dict() == {"name": "queue", "workers": 1}
+
+    # A stopped worker removes its key on the way out
+    handle = worker.handle
+    worker.handle = lambda payload: (worker.stop(), handle(payload))
+    worker.client.lpush(JOB_QUEUE, encode_job({"id": "j", "sample_rate": 16000}, np.zeros(16, np.float32)))
+    worker.run()
+    assert remote.worker_count() == 0
+
+
+def test_conversation_append_and_history(server):
+    store = RedisConversationStore(client(server), max_history_tokens=1000)
+    store.append_turn("s1", "Hello there.", "Hi! How can I help?")
+    summary, messages = store.history("s1")
+    assert summary == ""
+    assert messages == [{"role": "user", "content": "Hello there."},
+                        {"role": "assistant", "content": "Hi! How can I help?"}]
+
+    # Another front end sees the same session
+    other = RedisConversationStore(client(server), max_history_tokens=1000)
+    assert other.history("s1")[1] == messages
+    assert len(other) == 1
+    other.end("s1")
+    assert store.history("s1") == ("", [])
+
+
+def test_conversation_truncates_into_summary(server):
+    turn = "word " * 40
+    store = RedisConversationStore(client(server), max_history_tokens=3 * 2 * estimate_tokens(turn))
+    for i in range(5):
+        store.append_turn("s1", f"Question {i}. {turn}", f"Answer {i}. {turn}")
+    summary, messages = store.history("s1")
+    assert len(messages) < 10 and len(messages) % 2 == 0
+    assert messages[-1]["content"].startswith("Answer 4.")
+    assert "User said: Question 0." in summary
+
+
+def test_conversation_language(server):
+    store = RedisConversationStore(client(server))
+    assert store.language("s1") is None
+    store.set_language("s1", "de")
+    assert store.language("s1") == "de"
+    store.append_turn("s1", "Hallo.", "Hallo!")
+    assert store.language("s1") == "de"
+
+
+def test_conversation_ttl(server):
+    store = RedisConversationStore(client(server), idle_timeout=120)
+    store.append_turn("s1", "Hello.", "Hi!")
+    redis = client(server)
+    key = store._key("s1")
+    assert 0 < redis.ttl(key) <= 120
+    # Reading the session refreshes its idle timeout
+    redis.expire(key, 5)
+    store.history("s1")
+    assert redis.ttl(key) > 5
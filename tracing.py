@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Request tracing for the AI Audio Pipeline
+Each /process_audio call or Socket.IO turn opens a trace; the stages and
+outbound calls inside it (ffmpeg/PyAV, Whisper workers, Bedrock, gTTS)
+add child spans. Finished spans are batched by a background thread and
+written to a JSONL file or posted to an OpenTelemetry collector as
+OTLP/HTTP JSON. W3C traceparent headers join traces started upstream.
+"""
+
+import os
+import json
+import time
+import queue
+import random
+import threading
+import contextvars
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# OTLP span kinds
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+
+_current = contextvars.ContextVar('current_span', default=None)
+
+
+def _new_id(nbytes):
+    return os.urandom(nbytes).hex()
+
+
+class Span:
+    """One timed operation within a trace"""
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'kind', 'attributes', 'start_ns', 'end_ns',
+                 'error')
+
+    recording = True
+
+    def __init__(self, trace_id, parent_id, name, kind=INTERNAL, attributes=None):
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = {k: v for k, v in (attributes or {}).items() if v is not None}
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set(self, key, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def record_error(self, error):
+        self.error = f"{type(error).__name__}: {error}"
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def as_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start_ns / 1e9,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NullSpan:
+    recording = False
+    trace_id = None
+    traceparent = None
+
+    def set(self, key, value):
+        pass
+
+    def record_error(self, error):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+def parse_traceparent(header):
+    """(trace_id, parent span_id, sampled) from a W3C traceparent, or None"""
+    parts = (header or '').strip().split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    if parts[1] == '0' * 32 or parts[2] == '0' * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+class FileExporter:
+    """Appends one JSON object per span to a file"""
+
+    def __init__(self, path, service_name):
+        self.path = path
+        self.service_name = service_name
+
+    def export(self, spans):
+        with open(self.path, 'a') as f:
+            for span in spans:
+                f.write(json.dumps(dict(span.as_dict(), service=self.service_name)) + "\n")
+
+
+class OTLPExporter:
+    """Posts spans to an OpenTelemetry collector (OTLP/HTTP, JSON encoding)"""
+
+    def __init__(self, endpoint, service_name, timeout=5.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    @staticmethod
+    def _value(value):
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def _span(self, span):
+        encoded = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": span.kind,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": k, "value": self._value(v)} for k, v in span.attributes.items()],
+        }
+        if span.parent_id:
+            encoded["parentSpanId"] = span.parent_id
+        if span.error:
+            encoded["status"] = {"code": 2, "message": span.error}
+        return encoded
+
+    def export(self, spans):
+        import requests
+
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "hf-audio-pipeline"}, "spans": [self._span(s) for s in spans]}],
+        }]}
+        response = requests.post(self.endpoint, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+
+
+class Tracer:
+    """Creates spans and hands finished ones to the exporter
+
+    Settings:
+        TRACE_EXPORTER: none (default), file or otlp
+        TRACE_FILE: JSONL file for the file exporter
+        TRACE_OTLP_ENDPOINT: collector URL for the otlp exporter
+        TRACE_SAMPLE_RATE: fraction of new traces recorded (upstream
+            traceparent sampling decisions are kept)
+        TRACE_SERVICE_NAME: service.name of exported spans
+    """
+
+    def __init__(self, exporter=None, sample_rate=1.0, batch_size=256, flush_interval=1.0, queue_size=10000):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+        self._env_pending = False
+
+    @classmethod
+    def from_env(cls):
+        """A Tracer that reads TRACE_* on first use
+
+        The module-level tracer is created when the package is imported,
+        before entry points call load_dotenv(), so settings from .env are
+        only read once the first trace starts.
+        """
+        tracer = cls()
+        tracer._env_pending = True
+        return tracer
+
+    def _load_env(self):
+        kind = os.getenv('TRACE_EXPORTER', 'none').lower()
+        service = os.getenv('TRACE_SERVICE_NAME', 'hf-audio-pipeline')
+        if kind == 'file':
+            exporter = FileExporter(os.getenv('TRACE_FILE', 'traces.jsonl'), service)
+        elif kind == 'otlp':
+            exporter = OTLPExporter(os.getenv('TRACE_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces'), service)
+        else:
+            if kind != 'none':
+                logger.warning(f"Unknown TRACE_EXPORTER '{kind}', tracing disabled")
+            exporter = None
+        self.sample_rate = float(os.getenv('TRACE_SAMPLE_RATE', '1.0'))
+        self.exporter = exporter
+
+    @property
+    def enabled(self):
+        if self._env_pending:
+            with self._lock:
+                if self._env_pending:
+                    self._load_env()
+                    self._env_pending = False
+        return self.exporter is not None
+
+    @contextmanager
+    def start_trace(self, name, traceparent=None, kind=SERVER, **attributes):
+        """Root span of a request, continuing an upstream trace when given one
+
+        Yields NULL_SPAN when tracing is off or the trace isn't sampled, so
+        every span opened inside it is free.
+        """
+        if not self.enabled:
+            yield NULL_SPAN
+            return
+        parent = parse_traceparent(traceparent)
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id = _new_id(16), None
+            sampled = random.random() < self.sample_rate
+        if not sampled:
+            yield NULL_SPAN
+            return
+        with self._activate(Span(trace_id, parent_id, name, kind, attributes)) as span:
+            yield span
+
+    @contextmanager
+    def span(self, name, kind=INTERNAL, **attributes):
+        """Child span of the current span; a no-op outside a recorded trace"""
+        parent = _current.get()
+        if parent is None:
+            yield NULL_SPAN
+            return
+        with self._activate(Span(parent.trace_id, parent.span_id, name, kind, attributes)) as span:
+            yield span
+
+    @contextmanager
+    def _activate(self, span):
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            try:
+                _current.reset(token)
+            except ValueError:
+                # A generator holding the span was closed from another context
+                pass
+            span.end_ns = time.time_ns()
+            self._export(span)
+
+    def current(self):
+        return _current.get() or NULL_SPAN
+
+    def propagate(self, fn):
+        """`fn` bound to the caller's trace context, for running on another thread"""
+        if _current.get() is None:
+            return fn
+        context = contextvars.copy_context()
+        return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+    def _export(self, span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self.exporter.export(batch)
+            except Exception as e:
+                logger.warning(f"Could not export {len(batch)} span(s): {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self):
+        """Block until every finished span has been exported"""
+        if self._thread is not None:
+            self._queue.join()
+
+
+tracer = Tracer.from_env()
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Audio transcoding for the AI Audio Pipeline
+FFmpeg is located and probed once (the probe result is cached on disk per
+binary), and decoding runs in-process through PyAV when it's installed so
+requests don't spawn an ffmpeg process each; the ffmpeg CLI is the fallback
+"""
+
+import os
+import io
+import json
+import struct
+import shutil
+import threading
+import subprocess
+import functools
+import logging
+from pathlib import Path
+
+import numpy as np
+
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Common Windows FFmpeg install locations, checked when ffmpeg isn't on PATH
+WINDOWS_FFMPEG_PATHS = [
+    "C:\\Users\\Jake\\AppData\\Local\\Microsoft\\WinGet\\Packages\\Gyan.FFmpeg_Microsoft.Winget.Source_8wekyb3d8bbwe\\ffmpeg-7.1.1-full_build\\bin\\ffmpeg.exe",
+    "C:\\ffmpeg\\bin\\ffmpeg.exe",
+    "C:\\Program Files\\ffmpeg\\bin\\ffmpeg.exe",
+    "C:\\Program Files (x86)\\ffmpeg\\bin\\ffmpeg.exe"
+]
+
+FFMPEG_CACHE_FILE = Path(os.getenv('FFMPEG_CACHE_FILE', Path.home() / '.cache' / 'hf-audio-pipeline' / 'ffmpeg.json'))
+
+# (format tag, bits per sample) -> (numpy dtype, scale to [-1, 1])
+_WAV_FORMATS = {
+    (1, 8): (np.dtype('u1'), 1 / 128.0),
+    (1, 16): (np.dtype('<i2'), 1 / 32768.0),
+    (1, 32): (np.dtype('<i4'), 1 / 2147483648.0),
+    (3, 32): (np.dtype('<f4'), None),
+}
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def parse_wav(buffer):
+    """Decode a PCM/float WAV held in `buffer` to mono float32, or None
+
+    Samples are read through a view of `buffer`; the only allocation is the
+    float32 output (none at all for mono float32 data, which is returned as
+    a read-only view). Streamed WAVs with an unknown data size are accepted.
+    """
+    view = memoryview(buffer)
+    if len(view) < 12 or view[0:4] != b'RIFF' or view[8:12] != b'WAVE':
+        return None
+
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(view):
+        chunk_id = bytes(view[pos:pos + 4])
+        size = struct.unpack_from('<I', view, pos + 4)[0]
+        body = pos + 8
+        if chunk_id == b'fmt ':
+            tag, channels, sample_rate, _, _, bits = struct.unpack_from('<HHIIHH', view, body)
+            if tag == _WAVE_FORMAT_EXTENSIBLE and size >= 26:
+                tag = struct.unpack_from('<H', view, body + 24)[0]
+            fmt = (tag, channels, sample_rate, bits)
+        elif chunk_id == b'data':
+            if fmt is None:
+                return None
+            tag, channels, sample_rate, bits = fmt
+            if (tag, bits) not in _WAV_FORMATS or channels < 1:
+                return None
+            dtype, scale = _WAV_FORMATS[(tag, bits)]
+            end = len(view) if size in (0, 0xFFFFFFFF) or body + size > len(view) else body + size
+            frame_bytes = dtype.itemsize * channels
+            frames = (end - body) // frame_bytes
+            samples = np.frombuffer(view[body:body + frames * frame_bytes], dtype=dtype)
+            return _to_mono_float(samples, channels, scale, dtype), sample_rate
+        pos = body + size + (size & 1)
+    return None
+
+
+def _to_mono_float(samples, channels, scale, dtype):
+    if channels > 1:
+        samples = samples.reshape(-1, channels)
+        audio = samples.mean(axis=1, dtype=np.float32)
+    elif scale is None:
+        return samples
+    else:
+        audio = samples.astype(np.float32)
+    if dtype == np.uint8:
+        audio -= 128.0
+    if scale is not None:
+        audio *= scale
+    return audio
+
+
+class FFmpegInfo:
+    """Location and capabilities of the ffmpeg binary"""
+
+    def __init__(self, path, version, configuration, decoders, encoders):
+        self.path = path
+        self.version = version
+        self.configuration = configuration
+        self.decoders = frozenset(decoders)
+        self.encoders = frozenset(encoders)
+
+    @property
+    def ffprobe(self):
+        if "ffmpeg.exe" in self.path:
+            return self.path.replace("ffmpeg.exe", "ffprobe.exe")
+        return self.path.replace("ffmpeg", "ffprobe")
+
+    def has_decoder(self, name):
+        return name in self.decoders
+
+    def has_encoder(self, name):
+        return name in self.encoders
+
+    def has_library(self, name):
+        """e.g. has_library('soxr') for --enable-libsoxr builds"""
+        return f"--enable-lib{name}" in self.configuration
+
+    def as_dict(self):
+        return {
+            "path": self.path,
+            "version": self.version,
+            "configuration": self.configuration,
+            "decoders": sorted(self.decoders),
+            "encoders": sorted(self.encoders),
+        }
+
+
+def _locate_ffmpeg():
+    ffmpeg_path = shutil.which("ffmpeg")
+    if ffmpeg_path:
+        return ffmpeg_path
+    for path in WINDOWS_FFMPEG_PATHS:
+        if os.path.exists(path):
+            # Put it on PATH for anything else that shells out to ffmpeg
+            os.environ["PATH"] = os.path.dirname(path) + os.pathsep + os.environ.get("PATH", "")
+            return path
+    return None
+
+
+def _list_codecs(path, kind):
+    """Audio codec names from `ffmpeg -decoders` / `-encoders`"""
+    output = subprocess.run(
+        [path, '-hide_banner', f'-{kind}'], capture_output=True, text=True, timeout=30
+    ).stdout
+    names = set()
+    for line in output.splitlines():
+        parts = line.split()
+        # Capability flags come first, e.g. " A....D opus   Opus"
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] == 'A':
+            names.add(parts[1])
+    return names
+
+
+def _probe_ffmpeg(path):
+    version_output = subprocess.run(
+        [path, '-hide_banner', '-version'], capture_output=True, text=True, timeout=30
+    ).stdout.splitlines()
+    version = version_output[0] if version_output else "unknown"
+    configuration = next((l.split(':', 1)[1].strip() for l in version_output if l.startswith('configuration:')), "")
+    return FFmpegInfo(path, version, configuration, _list_codecs(path, 'decoders'), _list_codecs(path, 'encoders'))
+
+
+@functools.lru_cache(maxsize=1)
+def find_ffmpeg():
+    """Locate and probe ffmpeg once per process, or None if it isn't installed
+
+    Probe results are cached on disk keyed by the binary's path, size and
+    mtime, so only the first worker after an ffmpeg upgrade pays for it.
+    """
+    path = _locate_ffmpeg()
+    if not path:
+        return None
+    stat = os.stat(path)
+    key = f"{path}:{stat.st_size}:{int(stat.st_mtime)}"
+
+    try:
+        cached = json.loads(FFMPEG_CACHE_FILE.read_text())
+        if cached.get("key") == key:
+            info = cached["info"]
+            return FFmpegInfo(path, info["version"], info["configuration"], info["decoders"], info["encoders"])
+    except (OSError, ValueError, KeyError):
+        pass
+
+    info = _probe_ffmpeg(path)
+    try:
+        FFMPEG_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = FFMPEG_CACHE_FILE.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps({"key": key, "info": info.as_dict()}))
+        os.replace(tmp_path, FFMPEG_CACHE_FILE)
+    except OSError as e:
+        logger.warning(f"Could not cache ffmpeg capabilities: {e}")
+    return info
+
+
+class Transcoder:
+    """Decodes audio to mono float32, in-process via PyAV when available
+
+    TRANSCODER=ffmpeg forces the CLI backend; the default (auto) uses PyAV
+    if it imports and falls back to ffmpeg per call if PyAV can't decode.
+    """
+
+    def __init__(self, backend=None):
+        self.ffmpeg = find_ffmpeg()
+        backend = (backend or os.getenv('TRANSCODER', 'auto')).lower()
+        self._av = None
+        if backend in ('auto', 'pyav'):
+            try:
+                import av
+                self._av = av
+            except ImportError:
+                if backend == 'pyav':
+                    raise
+        self.backend = 'pyav' if self._av is not None else 'ffmpeg'
+        if self.backend == 'ffmpeg' and self.ffmpeg is None:
+            logger.warning("Neither PyAV nor ffmpeg is available; only WAV input can be decoded")
+
+    def decode(self, source, sample_rate=None):
+        """Return (mono float32 audio, sample_rate) for `source`
+
+        `source` is a file path, a binary file object or a bytes-like
+        buffer. With `sample_rate` set the decoder resamples as it goes.
+        """
+        with tracer.span("transcode.decode", resample_to=sample_rate) as span:
+            if self._av is not None:
+                try:
+                    span.set("backend", "pyav")
+                    return self._decode_pyav(source, sample_rate)
+                except Exception as e:
+                    if self.ffmpeg is None:
+                        raise
+                    logger.warning(f"PyAV decode failed, retrying with ffmpeg: {e}")
+            span.set("backend", "ffmpeg")
+            return self._decode_ffmpeg(source, sample_rate)
+
+    def _decode_pyav(self, source, sample_rate):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        elif hasattr(source, 'seek'):
+            source.seek(0)
+        rate = None
+        chunks = []
+        for chunk, rate in self.iter_decode(source, sample_rate):
+            chunks.append(chunk)
+        if not chunks:
+            raise ValueError("No audio decoded")
+        return np.concatenate(chunks) if len(chunks) > 1 else chunks[0], rate
+
+    def iter_decode(self, source, sample_rate=None):
+        """Yield (mono float32 chunk, rate) as PyAV decodes `source`
+
+        `source` may be a non-seekable file object whose read() blocks until
+        more data arrives, which is how streamed uploads are decoded.
+        """
+        av = self._av
+        if av is None:
+            raise RuntimeError("PyAV is not installed")
+        with av.open(source, mode='r') as container:
+            stream = container.streams.audio[0]
+            rate = sample_rate or stream.codec_context.sample_rate
+            resampler = av.AudioResampler(format='flt', layout='mono', rate=rate)
+            for frame in container.decode(stream):
+                for out in resampler.resample(frame):
+                    yield out.to_ndarray().reshape(-1), rate
+            for out in resampler.resample(None):
+                yield out.to_ndarray().reshape(-1), rate
+
+    def _decode_ffmpeg(self, source, sample_rate):
+        if self.ffmpeg is None:
+            raise RuntimeError("ffmpeg is not installed")
+        path = source if isinstance(source, (str, os.PathLike)) else None
+        data = None
+        if path is None:
+            data = source.getbuffer() if isinstance(source, io.BytesIO) else source
+        command = [self.ffmpeg.path, '-hide_banner', '-loglevel', 'error', '-i', str(path) if path else 'pipe:0', '-vn', '-ac', '1']
+        if sample_rate:
+            command += ['-ar', str(sample_rate)]
+        command += ['-c:a', 'pcm_f32le', '-f', 'wav', 'pipe:1']
+        result = subprocess.run(
+            command, input=data,
+            stdin=subprocess.DEVNULL if path else None,
+            capture_output=True, check=True, timeout=120
+        )
+        decoded = parse_wav(result.stdout)
+        if decoded is None:
+            raise ValueError("ffmpeg produced no audio")
+        return decoded
+
+    def encode(self, pcm, sample_rate, container='ogg', codec='libopus', bitrate=32000):
+        """Compress mono int16 PCM, e.g. to Ogg/Opus; returns bytes or None
+
+        None means no encoder is available and callers should send WAV.
+        """
+        pcm = np.ascontiguousarray(pcm, dtype=np.int16)
+        with tracer.span("transcode.encode", codec=codec) as span:
+            if self._av is not None:
+                try:
+                    span.set("backend", "pyav")
+                    return self._encode_pyav(pcm, sample_rate, container, codec, bitrate)
+                except Exception as e:
+                    logger.warning(f"PyAV encode failed, trying ffmpeg: {e}")
+            if self.ffmpeg is None or not self.ffmpeg.has_encoder(codec):
+                return None
+            span.set("backend", "ffmpeg")
+            result = subprocess.run(
+                [self.ffmpeg.path, '-hide_banner', '-loglevel', 'error',
+                 '-f', 's16le', '-ar', str(sample_rate), '-ac', '1', '-i', 'pipe:0',
+                 '-c:a', codec, '-b:a', str(bitrate), '-f', container, 'pipe:1'],
+                input=pcm.tobytes(), capture_output=True, check=True, timeout=60
+            )
+            return result.stdout
+
+    def _encode_pyav(self, pcm, sample_rate, container, codec, bitrate):
+        av = self._av
+        buffer = io.BytesIO()
+        with av.open(buffer, mode='w', format=container) as output:
+            # Opus only runs at 48 kHz; PyAV resamples and reframes the input
+            rate = 48000 if codec == 'libopus' else sample_rate
+            stream = output.add_stream(codec, rate=rate)
+            stream.layout = 'mono'
+            stream.bit_rate = bitrate
+            frame = av.AudioFrame.from_ndarray(pcm.reshape(1, -1), format='s16', layout='mono')
+            frame.sample_rate = sample_rate
+            for packet in stream.encode(frame):
+                output.mux(packet)
+            for packet in stream.encode(None):
+                output.mux(packet)
+        return buffer.getvalue()
+
+    def as_dict(self):
+        return {
+            "backend": self.backend,
+            "pyav_version": getattr(self._av, '__version__', None),
+            "ffmpeg": self.ffmpeg.path if self.ffmpeg else None,
+            "ffmpeg_version": self.ffmpeg.version if self.ffmpeg else None,
+        }
+
+
+_transcoder = None
+_transcoder_lock = threading.Lock()
+
+
+def get_transcoder():
+    """Process-wide Transcoder, created on first use"""
+    global _transcoder
+    with _transcoder_lock:
+        if _transcoder is None:
+            _transcoder = Transcoder()
+            logger.info(f"Transcoder backend: {_transcoder.backend}")
+        return _transcoder
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Timestamps and confidences for Whisper transcripts
+Both come out of the transcription's own generate() call (timestamp tokens,
+cross-attention alignment and the output scores), so no second pass or
+external aligner is needed; nothing extra is computed unless requested
+"""
+
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_LEVELS = ('segment', 'word')
+# Keys extract() may add to a transcript
+DETAIL_KEYS = ('segments', 'words', 'confidence', 'avg_logprob')
+
+
+def parse_options(timestamps=None, confidence=None):
+    """Validate request options; returns (timestamps, confidence)"""
+    timestamps = (timestamps or '').strip().lower() or None
+    if timestamps not in (None,) + TIMESTAMP_LEVELS:
+        raise ValueError(f"timestamps must be one of {', '.join(TIMESTAMP_LEVELS)}")
+    if isinstance(confidence, str):
+        confidence = confidence.strip().lower() in ('1', 'true', 'yes')
+    return timestamps, bool(confidence)
+
+
+def generate_options(generation_config, timestamps=None, confidence=False):
+    """Extra generate() kwargs for the requested details (empty if none)"""
+    if timestamps is None and not confidence:
+        return {}
+    options = {"return_dict_in_generate": True}
+    if timestamps in TIMESTAMP_LEVELS:
+        options["return_timestamps"] = True
+    if timestamps == 'word':
+        if getattr(generation_config, 'alignment_heads', None):
+            options["return_token_timestamps"] = True
+        else:
+            logger.warning("Checkpoint has no alignment heads; returning segment timestamps only")
+    if confidence:
+        options["output_scores"] = True
+    return options
+
+
+def _round(value):
+    return round(float(value), 3)
+
+
+def _probability(logprobs):
+    """Mean token probability, Whisper's usual confidence measure"""
+    logprobs = [lp for lp in logprobs if lp is not None]
+    if not logprobs:
+        return None
+    return round(sum(math.exp(lp) for lp in logprobs) / len(logprobs), 4)
+
+
+def _logprob(scores, token):
+    import torch
+
+    logprob = torch.log_softmax(scores.float(), dim=-1)[token].item()
+    # A fully masked step (e.g. a forced token) carries no confidence
+    return logprob if math.isfinite(logprob) else None
+
+
+def _segment_logprobs(segments):
+    """Log-probs for the concatenated tokens of all segments"""
+    logprobs = []
+    for segment in segments:
+        result = segment['result']
+        scores = result.get('scores')
+        tokens = segment['tokens'].tolist()
+        if not scores:
+            logprobs.extend([None] * len(tokens))
+            continue
+        # Scores cover the generated tail of the (prompt + tokens) sequence
+        prompt_length = len(result['sequences']) - len(scores)
+        start = segment['idxs'][0]
+        for j, token in enumerate(tokens):
+            logprobs.append(_logprob(scores[start + j - prompt_length], token))
+    return logprobs
+
+
+def extract(outputs, tokenizer, generation_config, timestamps=None, confidence=False):
+    """Build the sequences tensor plus the requested details from generate() output
+
+    Returns (sequences, details); details holds "segments", "words",
+    "confidence" and "avg_logprob" as requested.
+    """
+    sequences = outputs['sequences']
+    token_ids = sequences[0].tolist()
+    segments = outputs.get('segments')
+    segments = segments[0] if segments else None
+
+    logprobs = [None] * len(token_ids)
+    if confidence:
+        if segments is not None:
+            logprobs = _segment_logprobs(segments)
+        elif outputs.get('scores'):
+            scores = outputs['scores']
+            # Without segments the sequence still starts with the decoder prompt
+            offset = len(token_ids) - len(scores)
+            logprobs = [None] * offset + [
+                _logprob(step[0], token) for step, token in zip(scores, token_ids[offset:])
+            ]
+
+    token_times = None
+    if outputs.get('token_timestamps') is not None:
+        token_times = outputs['token_timestamps'][0].tolist()
+
+    # Everything from <|endoftext|> up is a special or timestamp token
+    special_start = generation_config.eos_token_id
+
+    def is_text(token):
+        return token < special_start
+
+    text_indices = [i for i, token in enumerate(token_ids) if is_text(token)]
+    details = {}
+
+    if confidence:
+        text_logprobs = [logprobs[i] for i in text_indices if logprobs[i] is not None]
+        details["confidence"] = _probability(text_logprobs)
+        details["avg_logprob"] = round(sum(text_logprobs) / len(text_logprobs), 4) if text_logprobs else None
+
+    if timestamps and segments is not None:
+        details["segments"] = []
+        position = 0
+        for segment in segments:
+            tokens = segment['tokens'].tolist()
+            text_tokens = [t for t in tokens if is_text(t)]
+            entry = {
+                "start": _round(segment['start']),
+                "end": _round(segment['end']),
+                "text": tokenizer.decode(text_tokens, skip_special_tokens=True).strip(),
+            }
+            if confidence:
+                entry["confidence"] = _probability(
+                    [logprobs[position + j] for j, t in enumerate(tokens) if is_text(t)]
+                )
+            details["segments"].append(entry)
+            position += len(tokens)
+
+    if timestamps == 'word' and token_times is not None:
+        words = []
+        for i in text_indices:
+            piece = tokenizer.decode([token_ids[i]])
+            # A leading space starts a new word; anything else continues it
+            if not words or piece.startswith(' '):
+                words.append({"indices": [], "word": ""})
+            words[-1]["indices"].append(i)
+            words[-1]["word"] += piece
+        details["words"] = []
+        for word in words:
+            first, last = word["indices"][0], word["indices"][-1]
+            entry = {
+                "word": word["word"].strip(),
+                "start": _round(token_times[first]),
+                # A token ends where the next one starts
+                "end": _round(token_times[last + 1] if last + 1 < len(token_times) else token_times[last]),
+            }
+            if confidence:
+                entry["confidence"] = _probability([logprobs[i] for i in word["indices"]])
+            details["words"].append(entry)
+
+    return sequences, details
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Pluggable text-to-speech backends for the AI Audio Pipeline
+Every engine returns mono int16 PCM plus its sample rate, so callers can
+encode, concatenate or stream the audio without another decode step
+"""
+
+import os
+import io
+import re
+import wave
+import shutil
+import ctypes
+import ctypes.util
+import threading
+import subprocess
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from tracing import tracer, CLIENT
+
+logger = logging.getLogger(__name__)
+
+
+def pcm_to_wav(pcm, sample_rate):
+    """Wrap mono int16 PCM in a WAV container"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(np.ascontiguousarray(pcm, dtype=np.int16).tobytes())
+    return buffer.getvalue()
+
+
+def float_to_pcm(audio):
+    """Convert float audio in [-1, 1] to int16 PCM"""
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+def wav_to_pcm(wav_bytes):
+    """Read a 16-bit WAV into mono int16 PCM and its sample rate"""
+    with wave.open(io.BytesIO(wav_bytes), 'rb') as wav_file:
+        channels = wav_file.getnchannels()
+        sample_rate = wav_file.getframerate()
+        frames = wav_file.readframes(wav_file.getnframes())
+    pcm = np.frombuffer(frames, dtype=np.int16)
+    if channels > 1:
+        pcm = pcm.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return pcm, sample_rate
+
+
+class TTSEngine:
+    """Base class for text-to-speech backends"""
+
+    name = "base"
+    # Whether synthesize() may be called from several threads at once
+    concurrent = True
+
+    def available(self):
+        """Return True if the engine can synthesize speech on this host"""
+        raise NotImplementedError
+
+    def synthesize(self, text, lang='en'):
+        """Return (pcm, sample_rate) for `text`, pcm being mono int16"""
+        raise NotImplementedError
+
+
+class GTTSEngine(TTSEngine):
+    """Google Text-to-Speech (network round trip per request)"""
+
+    name = "gtts"
+    # Whisper language codes that gTTS spells differently
+    LANGUAGE_ALIASES = {'he': 'iw'}
+
+    def voice_for(self, lang):
+        from gtts.lang import tts_langs
+
+        lang = self.LANGUAGE_ALIASES.get(lang, lang)
+        if lang not in _gtts_languages(tts_langs):
+            logger.warning(f"gTTS has no voice for '{lang}', speaking English")
+            return 'en'
+        return lang
+
+    def available(self):
+        try:
+            from gtts import gTTS
+            gTTS(text="test", lang='en')
+            return True
+        except Exception as e:
+            logger.warning(f"Could not initialize gTTS: {e}")
+            return False
+
+    def synthesize(self, text, lang='en'):
+        from gtts import gTTS
+        from transcoder import get_transcoder
+
+        mp3_data = io.BytesIO()
+        voice = self.voice_for(lang)
+        with tracer.span("gtts.request", kind=CLIENT, lang=voice, chars=len(text)):
+            gTTS(text=text, lang=voice, slow=False).write_to_fp(mp3_data)
+
+        # Decoded in-process when PyAV is available, no ffmpeg spawn per chunk
+        audio, sample_rate = get_transcoder().decode(mp3_data)
+        return float_to_pcm(audio), sample_rate
+
+
+class EspeakEngine(TTSEngine):
+    """Local espeak-ng synthesis, in-process through libespeak-ng when present"""
+
+    name = "espeak"
+
+    # Constants from speak_lib.h
+    AUDIO_OUTPUT_SYNCHRONOUS = 2
+    POS_CHARACTER = 1
+    ESPEAK_CHARS_UTF8 = 1
+    ESPEAK_RATE = 1
+    # Whisper language codes whose espeak-ng voice has another name
+    LANGUAGE_ALIASES = {'zh': 'cmn', 'jw': 'jv'}
+
+    def __init__(self, rate=None):
+        self.rate = rate or int(os.getenv('ESPEAK_RATE', '175'))
+        self._lock = threading.Lock()
+        self._lib = None
+        self._callback = None
+        self._chunks = []
+        self._voice = None
+        self.sample_rate = 22050
+        self._load_library()
+
+    def _load_library(self):
+        """Bind libespeak-ng; falls back to the CLI if it can't be loaded"""
+        lib_name = ctypes.util.find_library('espeak-ng')
+        if not lib_name:
+            return
+        try:
+            lib = ctypes.CDLL(lib_name)
+            callback_type = ctypes.CFUNCTYPE(
+                ctypes.c_int, ctypes.POINTER(ctypes.c_short), ctypes.c_int, ctypes.c_void_p
+            )
+            self._declare_prototypes(lib, callback_type)
+            sample_rate = lib.espeak_Initialize(self.AUDIO_OUTPUT_SYNCHRONOUS, 0, None, 0)
+            if sample_rate <= 0:
+                raise RuntimeError("espeak_Initialize failed")
+
+            # Keep a reference so the callback isn't garbage collected
+            self._callback = callback_type(self._on_samples)
+            lib.espeak_SetSynthCallback(self._callback)
+            lib.espeak_SetParameter(self.ESPEAK_RATE, self.rate, 0)
+
+            self._lib = lib
+            self.sample_rate = sample_rate
+            logger.info(f"libespeak-ng loaded ({sample_rate} Hz)")
+        except Exception as e:
+            logger.warning(f"Could not load libespeak-ng, using espeak-ng CLI: {e}")
+            self._lib = None
+
+    @staticmethod
+    def _declare_prototypes(lib, callback_type):
+        """Signatures from speak_lib.h, so size_t and pointers pass at full width"""
+        c_int, c_uint = ctypes.c_int, ctypes.c_uint
+        lib.espeak_Initialize.argtypes = [c_int, c_int, ctypes.c_char_p, c_int]
+        lib.espeak_Initialize.restype = c_int
+        lib.espeak_SetSynthCallback.argtypes = [callback_type]
+        lib.espeak_SetSynthCallback.restype = None
+        lib.espeak_SetParameter.argtypes = [c_int, c_int, c_int]
+        lib.espeak_SetParameter.restype = c_int
+        lib.espeak_SetVoiceByName.argtypes = [ctypes.c_char_p]
+        lib.espeak_SetVoiceByName.restype = c_int
+        lib.espeak_Synth.argtypes = [ctypes.c_void_p, ctypes.c_size_t, c_uint, c_int, c_uint, c_uint,
+                                     ctypes.POINTER(c_uint), ctypes.c_void_p]
+        lib.espeak_Synth.restype = c_int
+
+    @property
+    def concurrent(self):
+        # libespeak-ng is serialized behind a lock; CLI processes are not
+        return self._lib is None
+
+    def _on_samples(self, wav, num_samples, events):
+        if wav and num_samples > 0:
+            self._chunks.append(ctypes.string_at(wav, num_samples * 2))
+        return 0
+
+    def available(self):
+        return self._lib is not None or shutil.which("espeak-ng") is not None
+
+    def synthesize(self, text, lang='en'):
+        lang = self.LANGUAGE_ALIASES.get(lang, lang)
+        if self._lib is None:
+            return self._synthesize_cli(text, lang)
+
+        encoded = text.encode('utf-8') + b'\0'
+        # libespeak-ng keeps global state, so synthesis is serialized
+        with self._lock:
+            if lang != self._voice:
+                if self._lib.espeak_SetVoiceByName(lang.encode('ascii')) != 0:
+                    logger.warning(f"espeak-ng has no voice for '{lang}', speaking English")
+                    self._lib.espeak_SetVoiceByName(b'en')
+                self._voice = lang
+            self._chunks = []
+            self._lib.espeak_Synth(
+                encoded, len(encoded), 0, self.POS_CHARACTER, 0,
+                self.ESPEAK_CHARS_UTF8, None, None
+            )
+            pcm = np.frombuffer(b''.join(self._chunks), dtype=np.int16)
+            self._chunks = []
+        return pcm, self.sample_rate
+
+    def _synthesize_cli(self, text, lang):
+        result = subprocess.run(
+            ["espeak-ng", "--stdout", "-v", lang, "-s", str(self.rate), text],
+            capture_output=True, timeout=30
+        )
+        if result.returncode != 0 and lang != 'en':
+            logger.warning(f"espeak-ng has no voice for '{lang}', speaking English")
+            return self._synthesize_cli(text, 'en')
+        result.check_returncode()
+        return wav_to_pcm(result.stdout)
+
+
+_gtts_language_cache = None
+
+
+def _gtts_languages(tts_langs):
+    """gTTS's supported language table, built once"""
+    global _gtts_language_cache
+    if _gtts_language_cache is None:
+        _gtts_language_cache = set(tts_langs())
+    return _gtts_language_cache
+
+
+_SENTENCE_END = re.compile(r'(?<=[.!?;:])\s+')
+
+
+def split_sentences(text, max_chars=200):
+    """Split text at sentence boundaries into chunks of at most ~max_chars
+
+    Short sentences are merged so each chunk is worth a synthesis call;
+    a single overlong sentence is split at the last space before the limit.
+    """
+    chunks = []
+    current = ""
+    for sentence in _SENTENCE_END.split(text.strip()):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if not sentence:
+            continue
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class ChunkedSynthesizer:
+    """Synthesize long text as sentence chunks on a worker pool
+
+    Chunks are submitted together and joined in order, so a long reply
+    costs roughly one chunk's latency when the engine allows concurrency.
+    """
+
+    def __init__(self, engine, max_workers=None, max_chunk_chars=None):
+        self.engine = engine
+        self.max_chunk_chars = max_chunk_chars or int(os.getenv('TTS_CHUNK_CHARS', '200'))
+        self.max_workers = max_workers or int(os.getenv('TTS_WORKERS', '4'))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tts")
+
+    def iter_chunks(self, text, lang='en'):
+        """Yield (pcm, sample_rate) per chunk, in order, as each completes"""
+        chunks = split_sentences(text, self.max_chunk_chars)
+        if len(chunks) <= 1 or not self.engine.concurrent:
+            for chunk in chunks:
+                yield self._synthesize_chunk(chunk, lang)
+            return
+        futures = [self._executor.submit(tracer.propagate(self._synthesize_chunk), chunk, lang)
+                   for chunk in chunks]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def _synthesize_chunk(self, chunk, lang):
+        with tracer.span("tts.chunk", engine=self.engine.name, lang=lang, chars=len(chunk)):
+            return self.engine.synthesize(chunk, lang)
+
+    def synthesize(self, text, lang='en'):
+        """Return (pcm, sample_rate) for the whole text"""
+        pieces = []
+        sample_rate = None
+        for pcm, rate in self.iter_chunks(text, lang):
+            if sample_rate is not None and rate != sample_rate:
+                raise ValueError(f"TTS chunks returned mixed sample rates ({sample_rate} vs {rate})")
+            sample_rate = rate
+            pieces.append(pcm)
+        if not pieces:
+            return np.zeros(0, dtype=np.int16), sample_rate or 16000
+        return np.concatenate(pieces), sample_rate
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+TTS_ENGINES = {
+    GTTSEngine.name: GTTSEngine,
+    EspeakEngine.name: EspeakEngine,
+}
+
+
+def create_tts_engine(name=None):
+    """Create the engine selected by `name` or the TTS_ENGINE setting
+
+    'auto' prefers the local engine and falls back to gTTS.
+    """
+    name = (name or os.getenv('TTS_ENGINE', 'gtts')).lower()
+    if name == 'auto':
+        local = EspeakEngine()
+        return local if local.available() else GTTSEngine()
+    if name not in TTS_ENGINES:
+        raise ValueError(f"Unknown TTS engine '{name}'. Choose from: auto, {', '.join(TTS_ENGINES)}")
+    return TTS_ENGINES[name]()
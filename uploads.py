@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Upload spooling and low-copy audio decoding
+Small uploads stay in memory, large ones are spooled to a named temp file;
+decoding reads WAV data straight from the buffer or a memory map and hands
+everything else to the transcoder, so the upload is never duplicated in Python
+"""
+
+import os
+import io
+import mmap
+import tempfile
+import logging
+
+import numpy as np
+from flask import Request
+
+from transcoder import parse_wav
+from resampling import get_resampler
+
+logger = logging.getLogger(__name__)
+
+# Uploads up to this size are kept in memory, larger ones go to disk
+SPOOL_THRESHOLD = int(os.getenv('UPLOAD_SPOOL_KB', '512')) * 1024
+UPLOAD_TMP_DIR = os.getenv('UPLOAD_TMP_DIR') or None
+
+
+class SpoolingRequest(Request):
+    """Flask request that spools large file parts to a named temp file"""
+
+    _spooled = None
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is not None and total_content_length <= SPOOL_THRESHOLD:
+            return io.BytesIO()
+        # Named, so ffmpeg and mmap can read it in place. Windows can't reopen
+        # a file that deletes itself on close, so it's removed in close() below
+        spooled = tempfile.NamedTemporaryFile(mode='w+b', prefix='upload-', dir=UPLOAD_TMP_DIR, delete=False)
+        if self._spooled is None:
+            self._spooled = []
+        self._spooled.append(spooled.name)
+        return spooled
+
+    def close(self):
+        """Close the uploaded files and delete the spooled ones
+
+        Flask calls this when the request context ends.
+        """
+        try:
+            super().close()
+        finally:
+            for path in self._spooled or ():
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"Could not remove spooled upload {path}: {e}")
+            self._spooled = None
+
+
+def discard_upload(file_storage):
+    """Close an upload and delete its spool file now, not at the end of the request"""
+    file_storage.close()
+    path = getattr(file_storage.stream, 'name', None)
+    if isinstance(path, str):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def decode_upload(file_storage, transcoder, sample_rate=None):
+    """Return (mono float32 audio, sample_rate) for an uploaded file
+
+    With `sample_rate` set, compressed uploads are resampled by the decoder
+    as it decodes and WAVs by the polyphase resampler.
+    """
+    stream = file_storage.stream
+    if isinstance(stream, io.BytesIO):
+        # In-memory upload: read it through a zero-copy buffer view
+        data = stream.getbuffer()
+        try:
+            decoded = parse_wav(data)
+        finally:
+            del data
+        if decoded is None:
+            return transcoder.decode(stream, sample_rate)
+        audio, rate = decoded
+        del decoded
+        if sample_rate and rate != sample_rate:
+            return get_resampler().resample(audio, rate, sample_rate), sample_rate
+        # A view would pin the BytesIO buffer, which Flask closes later
+        if not audio.flags.owndata:
+            audio = np.array(audio)
+        return audio, rate
+
+    # Spooled to disk: map WAVs, let the transcoder read anything else by path
+    stream.flush()
+    path = stream.name
+    if os.path.getsize(path) == 0:
+        raise ValueError("Empty upload")
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        decoded = parse_wav(mapped)
+        if decoded is not None:
+            audio, rate = decoded
+            del decoded
+            if sample_rate and rate != sample_rate:
+                return get_resampler().resample(audio, rate, sample_rate), sample_rate
+            # Views into the map must be copied before it closes
+            if not audio.flags.owndata:
+                audio = np.array(audio)
+            return audio, rate
+    return transcoder.decode(path, sample_rate)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Compiled Whisper inference
+torch.compile for the encoder plus a static-KV-cache decoder, with batch
+sizes rounded up to a few buckets so requests reuse precompiled graphs
+"""
+
+import os
+import time
+import logging
+
+import torch
+from transformers.modeling_outputs import BaseModelOutput
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_buckets(value):
+    return sorted({int(b) for b in value.split(',') if b.strip()})
+
+
+class CompiledWhisper:
+    """Wraps a Whisper model so generate() runs through compiled graphs
+
+    Settings:
+      WHISPER_COMPILE          enable the compiled path (true/false)
+      WHISPER_COMPILE_MODE     torch.compile mode, default reduce-overhead
+      WHISPER_BATCH_BUCKETS    batch sizes to precompile, default 1 (clips are
+                               transcribed one at a time; larger is opt-in)
+      WHISPER_MAX_NEW_TOKENS   decoder length the static cache is sized for
+    """
+
+    def __init__(self, model, processor, device, mode=None, buckets=None, max_new_tokens=None):
+        self.model = model
+        self.processor = processor
+        self.device = device
+        self.mode = mode or os.getenv('WHISPER_COMPILE_MODE', 'reduce-overhead')
+        self.buckets = buckets or _parse_buckets(os.getenv('WHISPER_BATCH_BUCKETS', '1'))
+        self.max_new_tokens = max_new_tokens or int(os.getenv('WHISPER_MAX_NEW_TOKENS', '128'))
+        self.compiled = False
+        self.compile_seconds = None
+
+    @staticmethod
+    def enabled():
+        return os.getenv('WHISPER_COMPILE', 'false').lower() == 'true'
+
+    def compile(self):
+        """Swap in compiled encoder/decoder forwards and a static cache"""
+        try:
+            # Static KV cache keeps decoder shapes fixed across steps, so the
+            # decoder compiles to one graph per batch bucket
+            self.model.generation_config.cache_implementation = "static"
+            self.model.generation_config.max_new_tokens = self.max_new_tokens
+
+            encoder = self.model.get_encoder()
+            encoder.forward = torch.compile(encoder.forward, mode=self.mode, fullgraph=True)
+            self.model.forward = torch.compile(self.model.forward, mode=self.mode)
+            self.compiled = True
+        except Exception as e:
+            logger.warning(f"torch.compile unavailable, using eager Whisper: {e}")
+            self.compiled = False
+        return self.compiled
+
+    def bucket_for(self, batch_size):
+        for bucket in self.buckets:
+            if batch_size <= bucket:
+                return bucket
+        return batch_size
+
+    def generate(self, input_features=None, **kwargs):
+        """generate() with the batch padded up to the nearest bucket
+
+        Accepts precomputed `encoder_outputs` in place of input_features.
+        """
+        encoder_outputs = kwargs.get('encoder_outputs')
+        reference = input_features if input_features is not None else encoder_outputs.last_hidden_state
+        batch_size = reference.shape[0]
+        bucket = self.bucket_for(batch_size)
+        if self.compiled and bucket != batch_size:
+            padding = reference.new_zeros((bucket - batch_size,) + tuple(reference.shape[1:]))
+            if input_features is not None:
+                input_features = torch.cat([input_features, padding])
+            else:
+                kwargs['encoder_outputs'] = BaseModelOutput(
+                    last_hidden_state=torch.cat([reference, padding])
+                )
+        kwargs.setdefault('max_new_tokens', self.max_new_tokens)
+        outputs = self.model.generate(input_features, **kwargs)
+        if self.compiled and bucket != batch_size:
+            if isinstance(outputs, torch.Tensor):
+                outputs = outputs[:batch_size]
+            else:
+                outputs.sequences = outputs.sequences[:batch_size]
+        return outputs
+
+    def warmup(self):
+        """Compile and capture every bucket's graphs before serving traffic"""
+        if not self.compile():
+            return
+        start = time.perf_counter()
+        feature_size = self.processor.feature_extractor.feature_size
+        frames = self.processor.feature_extractor.nb_max_frames
+        try:
+            for bucket in self.buckets:
+                features = torch.zeros((bucket, feature_size, frames), dtype=self.model.dtype, device=self.device)
+                with torch.no_grad():
+                    # Two passes: the first compiles, the second records
+                    # CUDA graphs / settles guards for reduce-overhead mode
+                    self.model.generate(features, max_new_tokens=self.max_new_tokens)
+                    self.model.generate(features, max_new_tokens=self.max_new_tokens)
+            self.compile_seconds = time.perf_counter() - start
+            logger.info(f"Compiled Whisper for batch buckets {self.buckets} in {self.compile_seconds:.1f}s")
+        except Exception as e:
+            logger.warning(f"Whisper compile warmup failed, reverting to eager: {e}")
+            self.revert()
+
+    def revert(self):
+        """Drop the compiled forwards and go back to eager decoding"""
+        encoder = self.model.get_encoder()
+        encoder.__dict__.pop('forward', None)
+        self.model.__dict__.pop('forward', None)
+        self.model.generation_config.cache_implementation = None
+        self.compiled = False